@@ -0,0 +1,411 @@
+"""
+The cache of the reporting functions.
+
+Entries are kept in the Django cache past their freshness so that an expired
+value can still be served while a single refresh runs. Refreshes and first
+computations take a lock with cache.add(), which coalesces them across worker
+processes as long as the cache backend is shared between them (memcached,
+redis or the database cache, not the local memory cache). A registry of keys
+bounds the number of entries, evicting the least recently used ones, and lets
+the reporting_cache command list them. It is a single cache value, so it is
+only updated under a lock of its own, and only when an entry is stored; it
+holds a short label of each entry's parameters rather than their full SQL.
+The last use of each entry is stamped under a key of its own, so cache hits
+never read the registry.
+
+Every cached function declares how its parameters map to a cache key made of
+primitive values, so that equivalent calls share an entry however their
+QuerySet, model instance or date arguments were built.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, timezone as dt_timezone
+from functools import wraps
+import hashlib
+import inspect
+import threading
+import time
+
+from dateutil.parser import parse
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import connections
+from django.db.models import Model, QuerySet
+
+from utils.logger import get_logger
+
+from plugins.reporting import instrumentation, routers
+
+logger = get_logger(__name__)
+
+PREFIX = 'reporting:cache'
+REGISTRY_KEY = '{}:registry'.format(PREFIX)
+# How often, in seconds, reading an entry updates its last use
+TOUCH_INTERVAL = 60
+# How often, in seconds, a caller waiting on another's computation checks
+WAIT_INTERVAL = 0.1
+# The longest label of an entry's parameters kept in the registry
+LABEL_LENGTH = 120
+# How long, in seconds, the registry lock is held and waited for at most
+REGISTRY_LOCK_SECONDS = 10
+
+
+def setting(name, default):
+    return getattr(settings, 'REPORTING_CACHE_{}'.format(name), default)
+
+
+# The cached functions by name, filled in as they are decorated
+FUNCTIONS = {}
+
+
+def normalize(value):
+    """ Converts a parameter into primitive values for a cache key"""
+    if isinstance(value, QuerySet):
+        return queryset_key(value)
+    if isinstance(value, Model):
+        return (value._meta.label_lower, value.pk)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(normalize(item) for item in value)
+    return value
+
+
+def queryset_key(queryset):
+    """ The model, SQL and parameters of a QuerySet, without running it"""
+    sql, params = queryset.query.sql_with_params()
+    return (queryset.model._meta.label_lower, sql, normalize(params))
+
+
+def instance_key(instance):
+    return instance.pk if instance is not None else None
+
+
+def date_key(value):
+    """ An ISO date, or datetime when it is not midnight, of a date argument
+    '2024-01-01', date(2024, 1, 1) and datetime(2024, 1, 1) share a key.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, date):
+        try:
+            value = parse(str(value))
+        except (ValueError, OverflowError):
+            return str(value)
+    if isinstance(value, datetime) and value.time() == datetime.min.time() \
+            and value.tzinfo is None:
+        value = value.date()
+    return value.isoformat()
+
+
+def month_parts_key(date_parts):
+    return tuple(
+        int(date_parts[part]) for part in (
+            'start_month_y', 'start_month_m', 'end_month_y', 'end_month_m',
+        )
+    )
+
+
+def make_key(name, parameters):
+    digest = hashlib.sha1(repr(parameters).encode('utf-8')).hexdigest()
+    return '{}:{}:{}'.format(PREFIX, name, digest)
+
+
+def stats_key(name, outcome):
+    return '{}:stats:{}:{}'.format(PREFIX, name, outcome)
+
+
+def count(name, outcome):
+    """ Counts a hit or miss of a function, for the reporting_cache command"""
+    key = stats_key(name, outcome)
+    try:
+        django_cache.incr(key)
+    except ValueError:
+        django_cache.add(key, 1, None)
+
+
+def stats():
+    """ Returns {function name: (hits, misses)}"""
+    keys = {
+        name: (stats_key(name, 'hits'), stats_key(name, 'misses'))
+        for name in FUNCTIONS
+    }
+    values = django_cache.get_many(
+        [key for pair in keys.values() for key in pair],
+    )
+    return {
+        name: (values.get(hits, 0), values.get(misses, 0))
+        for name, (hits, misses) in sorted(keys.items())
+    }
+
+
+def used_key(key):
+    return '{}:used'.format(key)
+
+
+def label(parameters):
+    """ A short description of the parameters of an entry, for listings"""
+    text = repr(parameters)
+    if len(text) > LABEL_LENGTH:
+        return '{}...'.format(text[:LABEL_LENGTH])
+    return text
+
+
+def stored_entries():
+    """ The registry as stored: {key: {'function', 'parameters'}}"""
+    return django_cache.get(REGISTRY_KEY) or {}
+
+
+def last_used(keys):
+    """ Returns {key: when it was last used} of the entries stamped"""
+    stamps = django_cache.get_many([used_key(key) for key in keys])
+    return {
+        key: stamps[used_key(key)] for key in keys if used_key(key) in stamps
+    }
+
+
+def registry():
+    """ Returns {key: {'used', 'function', 'parameters'}} of known entries"""
+    entries = stored_entries()
+    used = last_used(list(entries))
+    return {
+        key: dict(entry, used=used.get(key, 0))
+        for key, entry in entries.items()
+    }
+
+
+def delete_entries(keys):
+    django_cache.delete_many(
+        list(keys) + [used_key(key) for key in keys],
+    )
+
+
+def flush(function=None):
+    """ Deletes the entries of a function, or of all reporting functions
+    :return: the number of entries deleted
+    """
+    with registry_lock() as locked:
+        entries = stored_entries()
+        flushed = [
+            key for key, entry in entries.items()
+            if function is None or entry['function'] == function
+        ]
+        delete_entries(flushed)
+        if not locked:
+            logger.warning('Could not lock the cache registry to flush it')
+            return len(flushed)
+        for key in flushed:
+            del entries[key]
+        django_cache.set(REGISTRY_KEY, entries, None)
+    return len(flushed)
+
+
+def lock_key(key):
+    return '{}:lock'.format(key)
+
+
+def acquire(key):
+    return django_cache.add(lock_key(key), 1, setting('LOCK_SECONDS', 300))
+
+
+def release(key):
+    django_cache.delete(lock_key(key))
+
+
+@contextmanager
+def registry_lock(wait=True):
+    """ Serialises the read-modify-write updates of the registry
+    :param wait: whether to wait for another process holding the lock
+    :return: yields whether the lock was taken
+    """
+    deadline = time.monotonic() + REGISTRY_LOCK_SECONDS
+    while not django_cache.add(
+        lock_key(REGISTRY_KEY), 1, REGISTRY_LOCK_SECONDS,
+    ):
+        if not wait or time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(WAIT_INTERVAL)
+    try:
+        yield True
+    finally:
+        release(REGISTRY_KEY)
+
+
+def touch(key, now):
+    """ Stamps the last use of an entry, at most every TOUCH_INTERVAL"""
+    stamp = django_cache.get(used_key(key))
+    if stamp is None or now - stamp >= TOUCH_INTERVAL:
+        django_cache.set(used_key(key), now, None)
+
+
+def register(key, now, name, parameters):
+    """ Records a stored entry and evicts the least recently used"""
+    django_cache.set(used_key(key), now, None)
+    with registry_lock() as locked:
+        if not locked:
+            logger.warning('Could not lock the cache registry for %s', key)
+            return
+        entries = stored_entries()
+        entries[key] = {'function': name, 'parameters': label(parameters)}
+        excess = len(entries) - setting('MAX_ENTRIES', 1000)
+        if excess > 0:
+            used = last_used(list(entries))
+            evicted = sorted(entries, key=lambda k: used.get(k, 0))[:excess]
+            delete_entries(evicted)
+            for evicted_key in evicted:
+                del entries[evicted_key]
+        django_cache.set(REGISTRY_KEY, entries, None)
+
+
+class Call(object):
+    """ A call of a cached function, with its key"""
+
+    def __init__(self, name, seconds, func, args, kwargs, parameters):
+        self.name = name
+        self.seconds = seconds
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.parameters = parameters
+        self.key = make_key(name, parameters)
+
+    def compute(self):
+        return self.func(*self.args, **self.kwargs)
+
+
+def store(call):
+    value = call.compute()
+    now = time.time()
+    django_cache.set(
+        call.key,
+        (now + call.seconds, value),
+        call.seconds + setting('STALE_SECONDS', 86400),
+    )
+    register(call.key, now, call.name, call.parameters)
+    return value
+
+
+def refresh(call):
+    """ Recomputes a stale entry, in a thread unless configured otherwise
+    The caller must hold the lock of the key, which is released once done.
+    """
+    def run():
+        try:
+            with routers.reading():
+                store(call)
+        except Exception:
+            logger.exception('Could not refresh %s', call.key)
+        finally:
+            release(call.key)
+
+    if not setting('BACKGROUND_REFRESH', True):
+        run()
+        return
+
+    def run_in_thread():
+        try:
+            run()
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run_in_thread, daemon=True).start()
+
+
+def wait_for(key):
+    """ Waits for another process computing a key, returns its entry"""
+    deadline = time.monotonic() + setting('LOCK_WAIT_SECONDS', 30)
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = django_cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def record_entry(call, entry):
+    """ Notes when the value of a served entry was computed"""
+    instrumentation.record_precomputed(call.key, datetime.fromtimestamp(
+        entry[0] - call.seconds, tz=dt_timezone.utc,
+    ))
+
+
+def get_or_compute(call):
+    now = time.time()
+    entry = django_cache.get(call.key)
+    if entry is not None:
+        fresh_until, value = entry
+        record_entry(call, entry)
+        instrumentation.record_cache(hit=True)
+        count(call.name, 'hits')
+        if fresh_until <= now and acquire(call.key):
+            refresh(call)
+        else:
+            touch(call.key, now)
+        return value
+
+    instrumentation.record_cache(hit=False)
+    count(call.name, 'misses')
+    if not acquire(call.key):
+        entry = wait_for(call.key)
+        if entry is not None:
+            record_entry(call, entry)
+            return entry[1]
+        # The other computation is taking too long, do not queue behind it
+        return call.compute()
+    try:
+        return store(call)
+    finally:
+        release(call.key)
+
+
+def cached(seconds, key=None):
+    """ Caches a reporting function for seconds, then serves it stale while
+    a single caller refreshes it
+    :param seconds: int, how long a result is fresh for
+    :param key: optional callable taking the arguments of the function and
+        returning the primitive values its results depend on. By default all
+        arguments are normalized.
+    """
+    def decorator(func):
+        name = '{}.{}'.format(func.__module__, func.__name__)
+        signature = inspect.signature(func)
+
+        def make_call(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if key:
+                parameters = key(*bound.args, **bound.kwargs)
+            else:
+                parameters = normalize(tuple(bound.arguments.items()))
+            return Call(name, seconds, func, args, kwargs, parameters)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_or_compute(make_call(args, kwargs))
+
+        def warm(*args, **kwargs):
+            """ Computes and stores a result, fresh or not
+            :return: False when another process is already computing it
+            """
+            call = make_call(args, kwargs)
+            if not acquire(call.key):
+                return False
+            try:
+                store(call)
+            finally:
+                release(call.key)
+            return True
+
+        def has_entry(*args, **kwargs):
+            """ Whether a result, fresh or stale, is cached for arguments"""
+            return django_cache.get(make_call(args, kwargs).key) is not None
+
+        wrapper.warm = warm
+        wrapper.has_entry = has_entry
+        FUNCTIONS[name] = wrapper
+        return wrapper
+
+    return decorator
@@ -0,0 +1,317 @@
+"""
+A columnar Parquet archive of the access log, for offline analysis.
+
+export() appends the ArticleAccess and PreprintAccess rows added since the
+last export to Parquet files partitioned by the UTC month of the access:
+
+    <directory>/article_access/month=2024-01/part-<first id>.parquet
+    <directory>/preprint_access/month=2024-01/part-<first id>.parquet
+
+Rows are exported in order of access time, up to REPORTING_ARCHIVE_LAG_SECONDS
+ago, and the time and id of the last row exported from each table are kept in
+state.json, so each run only reads new rows. Ids are not a safe watermark on
+their own: a transaction that commits late can add rows below ids already
+exported. Visitor identifiers are not exported.
+
+Raw article accesses are deleted by compact_article_accesses --delete, so the
+export must run before it. An archive that falls behind the compacted days is
+refused rather than left with a silent gap.
+
+Archive answers the usage reports from such a directory, such as a local
+copy, without a database: only the columns a report needs are read, through
+memory maps, and the month partitions outside its range are skipped.
+
+pyarrow is only needed here, and is not installed with the plugin.
+"""
+from datetime import timezone as dt_timezone
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from dateutil.parser import parse
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from metrics import models as mm
+from repository import models as repository_models
+
+from plugins.reporting import months, rollups
+
+STATE_FILE = 'state.json'
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def available():
+    return pa is not None
+
+
+def require():
+    if not available():
+        raise ArchiveError(
+            'The Parquet archive needs pyarrow: pip install pyarrow'
+        )
+
+
+def tables():
+    """ The exported tables: {name: (model, [(column, field, arrow type)])}"""
+    timestamp = pa.timestamp('us', tz='UTC')
+    return {
+        'article_access': (mm.ArticleAccess, [
+            ('id', 'id', pa.int64()),
+            ('article_id', 'article_id', pa.int64()),
+            ('journal_id', 'article__journal_id', pa.int64()),
+            ('type', 'type', pa.string()),
+            ('galley_type', 'galley_type', pa.string()),
+            ('country_id', 'country_id', pa.int64()),
+            ('country', 'country__name', pa.string()),
+            ('accessed', 'accessed', timestamp),
+        ]),
+        'preprint_access': (repository_models.PreprintAccess, [
+            ('id', 'id', pa.int64()),
+            ('preprint_id', 'preprint_id', pa.int64()),
+            ('repository_id', 'preprint__repository_id', pa.int64()),
+            ('file_id', 'file_id', pa.int64()),
+            ('country_id', 'country_id', pa.int64()),
+            ('country', 'country__name', pa.string()),
+            ('accessed', 'accessed', timestamp),
+        ]),
+    }
+
+
+def read_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(path + '.tmp', path)
+
+
+def lag_seconds():
+    return getattr(settings, 'REPORTING_ARCHIVE_LAG_SECONDS', 3600)
+
+
+def start_position(name, position, log):
+    """ The position to export from, checked against compaction
+    :param position: the stored (accessed, id) of the last row exported
+    :return: (accessed, id) or None to export from the first row
+    """
+    boundary = rollups.compacted_before() if name == 'article_access' else None
+    if boundary is None:
+        return position
+    compacted = rollups.day_start(boundary)
+    if position is None:
+        log('Raw accesses before {} were compacted, the archive starts '
+            'there'.format(boundary))
+        return compacted, 0
+    if position[0] < compacted:
+        raise ArchiveError(
+            'Raw accesses from {} to {} were deleted by '
+            'compact_article_accesses before they were exported; run '
+            'export_access_archive before it, and start a new archive '
+            'directory'.format(position[0].date(), boundary)
+        )
+    return position
+
+
+def write_batch(directory, name, columns, rows):
+    """ Writes a batch of rows to one new file per month they fall in
+    Files are named after their first id, so a batch exported again after an
+    interrupted run replaces its files rather than duplicating them.
+    """
+    by_month = {}
+    accessed = len(columns) - 1
+    for row in rows:
+        month = row[accessed].astimezone(dt_timezone.utc).strftime('%Y-%m')
+        by_month.setdefault(month, []).append(row)
+
+    schema = pa.schema([
+        (column, arrow_type) for column, _, arrow_type in columns
+    ])
+    for month, month_rows in by_month.items():
+        partition = os.path.join(directory, name, 'month={}'.format(month))
+        os.makedirs(partition, exist_ok=True)
+        table = pa.Table.from_arrays([
+            pa.array([row[index] for row in month_rows], type=arrow_type)
+            for index, (_, _, arrow_type) in enumerate(columns)
+        ], schema=schema)
+        pq.write_table(table, os.path.join(
+            partition, 'part-{}.parquet'.format(month_rows[0][0]),
+        ))
+
+
+def export(directory, batch_size=100000, log=None):
+    """ Appends the accesses added since the last export to the archive
+    :param directory: the archive directory
+    :param batch_size: int, rows read and written at a time
+    :param log: optional callable receiving progress messages
+    :return: {table name: number of rows exported}
+    """
+    require()
+    log = log or (lambda message: None)
+    state = read_state(directory)
+    until = timezone.now() - timezone.timedelta(seconds=lag_seconds())
+    exported = {}
+    for name, (model, columns) in tables().items():
+        exported[name] = 0
+        position = None
+        if name in state:
+            position = (parse(state[name]['accessed']), state[name]['id'])
+        position = start_position(name, position, log)
+        while True:
+            rows = model.objects.filter(accessed__lt=until)
+            if position is not None:
+                accessed, last_id = position
+                rows = rows.filter(
+                    Q(accessed__gt=accessed)
+                    | Q(accessed=accessed, id__gt=last_id)
+                )
+            rows = list(rows.order_by('accessed', 'id').values_list(
+                *[field for _, field, _ in columns]
+            )[:batch_size])
+            if not rows:
+                break
+            write_batch(directory, name, columns, rows)
+            position = (rows[-1][-1], rows[-1][0])
+            state[name] = {
+                'accessed': position[0].isoformat(),
+                'id': position[1],
+            }
+            write_state(directory, state)
+            exported[name] += len(rows)
+            log('Exported {} {} rows accessed up to {}'.format(
+                exported[name], name, state[name]['accessed'],
+            ))
+    return exported
+
+
+class Archive(object):
+    """ Answers the usage reports from an exported archive
+    Ranges include both ends, like the reports. Each method returns a list of
+    dicts of the grouped columns and a total, like the values() and
+    annotate() rows of the reports.
+    """
+
+    def __init__(self, directory):
+        require()
+        self.directory = directory
+
+    def read(self, name, columns, start_date, end_date, **equals):
+        """ Reads the columns of the accesses of a table within a range
+        :param equals: {column: value} filters
+        """
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(path):
+            raise ArchiveError('{} has not been exported'.format(path))
+        start = rollups.to_local_datetime(start_date)
+        end = rollups.to_local_datetime(end_date)
+        first_month, last_month = (
+            value.astimezone(dt_timezone.utc).strftime('%Y-%m')
+            for value in (start, end)
+        )
+        filters = [
+            ('month', '>=', first_month),
+            ('month', '<=', last_month),
+            ('accessed', '>=', start),
+            ('accessed', '<=', end),
+        ] + [(column, '=', value) for column, value in equals.items()]
+        return pq.read_table(
+            path,
+            columns=sorted(set(columns) | {'accessed'}),
+            filters=filters,
+            memory_map=True,
+            partitioning='hive',
+        )
+
+    def usage(self, name, groups, start_date, end_date, **equals):
+        table = self.read(name, groups, start_date, end_date, **equals)
+        rows = table.group_by(groups).aggregate([
+            ('accessed', 'count'),
+        ]).to_pylist()
+        for row in rows:
+            row['total'] = row.pop('accessed_count')
+        return rows
+
+    def article_usage(self, start_date, end_date, journal_id=None):
+        """ Accesses by article, type and galley type"""
+        equals = {'journal_id': journal_id} if journal_id else {}
+        return self.usage(
+            'article_access', ['article_id', 'type', 'galley_type'],
+            start_date, end_date, **equals
+        )
+
+    def journal_usage(self, start_date, end_date):
+        """ Accesses by journal and type"""
+        return self.usage(
+            'article_access', ['journal_id', 'type'], start_date, end_date,
+        )
+
+    def country_usage(self, start_date, end_date, journal_id=None):
+        """ Accesses by country"""
+        equals = {'journal_id': journal_id} if journal_id else {}
+        return self.usage(
+            'article_access', ['country_id', 'country'],
+            start_date, end_date, **equals
+        )
+
+    def monthly_usage(self, first_month, last_month, tz_name=None):
+        """ Accesses by journal, month and type, bucketed in a timezone
+        :param first_month: a date, the first day of the first month
+        :param last_month: a date, the first day of the last month
+        :param tz_name: the timezone name, by default REPORTING_TIMEZONE
+        """
+        tz_name = tz_name or months.timezone_name()
+        starts = months.boundaries(
+            first_month, last_month, months.get_timezone(tz_name),
+        )
+        table = self.read(
+            'article_access', ['journal_id', 'type'], starts[0], starts[-1],
+        )
+        table = table.filter(pc.less(
+            table['accessed'], pa.scalar(starts[-1], table['accessed'].type),
+        ))
+        local = table['accessed'].cast(pa.timestamp('us', tz=tz_name))
+        table = table.append_column(
+            'month', pc.strftime(local, format='%Y-%m'),
+        )
+        rows = table.group_by(['journal_id', 'month', 'type']).aggregate([
+            ('accessed', 'count'),
+        ]).to_pylist()
+        for row in rows:
+            row['total'] = row.pop('accessed_count')
+            row['month'] = parse(row['month'] + '-01').date()
+        return sorted(rows, key=lambda row: (row['journal_id'], row['month']))
+
+    def preprint_usage(self, start_date, end_date, repository_id=None):
+        """ Accesses by preprint, split into abstract views and downloads"""
+        equals = {'repository_id': repository_id} if repository_id else {}
+        table = self.read(
+            'preprint_access', ['preprint_id', 'file_id'],
+            start_date, end_date, **equals
+        )
+        table = table.append_column(
+            'download', pc.is_valid(table['file_id']),
+        )
+        rows = table.group_by(['preprint_id', 'download']).aggregate([
+            ('accessed', 'count'),
+        ]).to_pylist()
+        for row in rows:
+            row['total'] = row.pop('accessed_count')
+        return rows
@@ -0,0 +1,132 @@
+"""
+Pre-flight cost estimates and statement timeouts for reports.
+
+Before running the press and article reports live, the number of article
+accesses their range covers is estimated from the query planner, without
+reading them. Above REPORTING_OFFLOAD_ROWS the views offer to run the report
+in the background instead, and above REPORTING_REFUSE_ROWS they ask for a
+shorter range. Report views, and the streams of CSV and COUNTER reports they
+return, also run their queries under REPORTING_STATEMENT_TIMEOUT, so a single
+query cannot hold a connection for longer than that.
+"""
+from contextlib import contextmanager
+import json
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from metrics import models as mm
+from utils.logger import get_logger
+
+from plugins.reporting import routers
+
+logger = get_logger(__name__)
+
+OFFLOAD = 'offload'
+REFUSE = 'refuse'
+
+TIMEOUT_STATEMENTS = {
+    'postgresql': (
+        'SET statement_timeout = {:d}',
+        'RESET statement_timeout',
+    ),
+    'mysql': (
+        'SET SESSION max_execution_time = {:d}',
+        'SET SESSION max_execution_time = DEFAULT',
+    ),
+}
+
+
+def estimate_rows(queryset):
+    """ The planner's estimate of the rows of a queryset, without running it
+    :return: an int, or None when the database gives no estimate
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]['Plan']['Plan Rows'])
+            if connection.vendor == 'mysql':
+                cursor.execute('EXPLAIN ' + sql, params)
+                columns = [column[0] for column in cursor.description]
+                # The first row is the table the scan is driven from
+                return int(cursor.fetchone()[columns.index('rows')])
+    except DatabaseError as e:
+        logger.error('Could not estimate the cost of a report: %s', e)
+    return None
+
+
+def estimate_accesses(start_date, end_date, journal=None):
+    """ Estimates the raw article accesses between two dates
+    Compacted days are read from their rollups and are not counted.
+    """
+    accesses = mm.ArticleAccess.objects.filter(
+        accessed__gte=start_date,
+        accessed__lte=end_date,
+    )
+    if journal is not None:
+        accesses = accesses.filter(article__journal=journal)
+    return estimate_rows(accesses)
+
+
+class Estimate(object):
+    def __init__(self, rows, verdict):
+        self.rows = rows
+        self.verdict = verdict
+
+    @property
+    def refused(self):
+        return self.verdict == REFUSE
+
+
+def check(start_date, end_date, journal=None):
+    """ Compares the estimated cost of a report with the thresholds
+    :return: an Estimate when the report should not run live, otherwise None
+    """
+    offload = getattr(settings, 'REPORTING_OFFLOAD_ROWS', None)
+    refuse = getattr(settings, 'REPORTING_REFUSE_ROWS', None)
+    if offload is None and refuse is None:
+        return None
+    with routers.reading():
+        rows = estimate_accesses(start_date, end_date, journal)
+    if rows is None:
+        return None
+    if refuse is not None and rows > refuse:
+        return Estimate(rows, REFUSE)
+    if offload is not None and rows > offload:
+        return Estimate(rows, OFFLOAD)
+    return None
+
+
+@contextmanager
+def statement_timeout():
+    """ Applies REPORTING_STATEMENT_TIMEOUT to the reporting connections"""
+    seconds = getattr(settings, 'REPORTING_STATEMENT_TIMEOUT', None)
+    if not seconds:
+        yield
+        return
+
+    applied = []
+    for alias in {DEFAULT_DB_ALIAS, routers.reporting_alias()}:
+        connection = connections[alias]
+        statements = TIMEOUT_STATEMENTS.get(connection.vendor)
+        if statements is None:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(statements[0].format(int(seconds * 1000)))
+        applied.append((connection, statements[1]))
+    try:
+        yield
+    finally:
+        for connection, reset in applied:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(reset)
+            except DatabaseError as e:
+                # e.g. the transaction was aborted by the timeout
+                logger.error('Could not reset the statement timeout: %s', e)
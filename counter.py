@@ -0,0 +1,544 @@
+"""
+COUNTER Release 5 journal (TR_J1, TR_J3) and item (IR) reports.
+
+ArticleAccess rows are summarised into CounterItemUsage rows, one per article
+and day, by the build_counter_usage command. A user-session is an access
+identifier within a clock hour, so the unique metrics count each article at
+most once per identifier and hour. Reports read the summaries for the days
+that have been built and summarise the raw accesses of later days on the fly.
+"""
+import csv
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from io import StringIO
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractHour, TruncDate, TruncMonth
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from identifiers import models as id_models
+from journal import models as jm
+from metrics import models as mm
+from submission import models as sm
+
+from plugins.reporting import instrumentation, models, rollups, sketches
+
+# COUNTER metric types and the CounterItemUsage field holding each of them
+METRICS = OrderedDict([
+    ('Total_Item_Investigations', 'total_investigations'),
+    ('Unique_Item_Investigations', 'unique_investigations'),
+    ('Total_Item_Requests', 'total_requests'),
+    ('Unique_Item_Requests', 'unique_requests'),
+])
+
+REQUEST_METRICS = ['Total_Item_Requests', 'Unique_Item_Requests']
+
+JOURNAL_COLUMNS = [
+    'Title', 'Publisher', 'Publisher_ID', 'Platform', 'DOI', 'Proprietary_ID',
+    'Print_ISSN', 'Online_ISSN', 'URI',
+]
+
+ITEM_COLUMNS = [
+    'Item', 'Publisher', 'Publisher_ID', 'Platform', 'Publication_Date',
+    'DOI', 'Proprietary_ID', 'Parent_Title', 'Parent_Data_Type',
+    'Parent_Proprietary_ID', 'Parent_Print_ISSN', 'Parent_Online_ISSN',
+    'Data_Type', 'YOP', 'Access_Type', 'Access_Method',
+]
+
+
+class CounterReport(object):
+    def __init__(self, report_id, name, group, metrics, columns, filters):
+        self.report_id = report_id
+        self.name = name
+        self.group = group
+        self.metrics = metrics
+        self.columns = columns
+        self.filters = filters
+
+
+REPORTS = OrderedDict((report.report_id, report) for report in [
+    CounterReport(
+        'TR_J1',
+        'Journal Requests (Excluding OA_Gold)',
+        'journal',
+        REQUEST_METRICS,
+        JOURNAL_COLUMNS,
+        'Data_Type=Journal; Access_Type=Controlled; Access_Method=Regular',
+    ),
+    CounterReport(
+        'TR_J3',
+        'Journal Usage by Access Type',
+        'journal',
+        list(METRICS),
+        JOURNAL_COLUMNS + ['Access_Type'],
+        'Data_Type=Journal; Access_Method=Regular',
+    ),
+    CounterReport(
+        'IR',
+        'Item Master Report',
+        'article',
+        list(METRICS),
+        ITEM_COLUMNS,
+        'Access_Method=Regular',
+    ),
+])
+
+
+def access_type():
+    """ The COUNTER Access_Type of the usage, OA_Gold unless configured"""
+    return getattr(settings, 'REPORTING_COUNTER_ACCESS_TYPE', 'OA_Gold')
+
+
+def summarise(accesses):
+    """ Summarises accesses into COUNTER metrics per article and day
+    :param accesses: an ArticleAccess queryset
+    :return: A dict of {(article_id, day): {field: count, 'journal_id': id,
+        'visitors': HyperLogLog of the access identifiers}}
+    """
+    sessions = accesses.filter(
+        type__in=['view', 'download'],
+    ).annotate(
+        day=TruncDate('accessed'),
+        hour=ExtractHour('accessed'),
+    ).order_by().values(
+        'article_id', 'article__journal_id', 'day', 'identifier', 'hour',
+    ).annotate(
+        total=Count('id'),
+        requests=Count('id', filter=Q(galley_type__isnull=False)),
+    )
+
+    usage = {}
+    for session in sessions.iterator():
+        row = usage.setdefault(
+            (session['article_id'], session['day']),
+            {
+                'journal_id': session['article__journal_id'],
+                'total_investigations': 0,
+                'unique_investigations': 0,
+                'total_requests': 0,
+                'unique_requests': 0,
+                'visitors': sketches.HyperLogLog(),
+            },
+        )
+        row['visitors'].add(session['identifier'])
+        # Every request is also an investigation
+        row['total_investigations'] += session['total']
+        row['unique_investigations'] += 1
+        if session['requests']:
+            row['total_requests'] += session['requests']
+            row['unique_requests'] += 1
+    return usage
+
+
+def build_day(day):
+    """ Replaces the CounterItemUsage and CounterJournalVisitors rows of a
+    day
+    """
+    usage = summarise(rollups.raw_day(day))
+    journal_visitors = defaultdict(sketches.HyperLogLog)
+    for row in usage.values():
+        journal_visitors[row['journal_id']].merge(row['visitors'])
+        row['visitors'] = row['visitors'].to_bytes()
+    with transaction.atomic():
+        models.CounterItemUsage.objects.filter(date=day).delete()
+        models.CounterItemUsage.objects.bulk_create([
+            models.CounterItemUsage(article_id=article_id, date=day, **row)
+            for (article_id, _), row in usage.items()
+        ], batch_size=5000)
+        models.CounterJournalVisitors.objects.filter(date=day).delete()
+        models.CounterJournalVisitors.objects.bulk_create([
+            models.CounterJournalVisitors(
+                journal_id=journal_id, date=day, visitors=sketch.to_bytes(),
+            ) for journal_id, sketch in journal_visitors.items()
+        ], batch_size=5000)
+
+
+def build(until=None, log=None):
+    """ Builds the CounterItemUsage rows of every day before until
+    :param until: a date, defaults to today, which is still being counted
+    :param log: optional callable receiving progress messages
+    :return: the number of days built
+    """
+    log = log or (lambda message: None)
+    until = until or timezone.localdate()
+    state = models.CompactionState.get()
+    day = state.counted_before or rollups.first_access_day()
+    built = 0
+    while day and day < until:
+        build_day(day)
+        state.counted_before = day + timedelta(days=1)
+        state.save()
+        log('Counted {}'.format(day))
+        built += 1
+        day += timedelta(days=1)
+    return built
+
+
+def monthly_usage(group, journals, first_month, last_month):
+    """ Sums the COUNTER metrics by article or journal and month
+    :param group: 'article' or 'journal'
+    :param journals: a Journal queryset
+    :param first_month: a date, the first day of the first month
+    :param last_month: a date, the first day of the last month
+    :return: A dict of {pk: {month: {field: count}}}
+    """
+    end = (last_month + timedelta(days=32)).replace(day=1)
+    counted = models.CompactionState.objects.filter(pk=1).values_list(
+        'counted_before', flat=True,
+    ).first() or first_month
+    counted = min(max(counted, first_month), end)
+
+    usage = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    stored = models.CounterItemUsage.objects.filter(
+        date__gte=first_month,
+        date__lt=counted,
+        journal__in=journals,
+    ).annotate(
+        month=TruncMonth('date'),
+    ).values('{}_id'.format(group), 'month').annotate(
+        **{'sum_' + field: Sum(field) for field in METRICS.values()}
+    ).order_by()
+    for row in stored:
+        counts = usage[row['{}_id'.format(group)]][row['month']]
+        for field in METRICS.values():
+            counts[field] += row['sum_' + field]
+
+    if counted < end:
+        live = summarise(mm.ArticleAccess.objects.filter(
+            accessed__gte=rollups.day_start(counted),
+            accessed__lt=rollups.day_start(end),
+            article__journal__in=journals,
+        ))
+        for (article_id, day), row in live.items():
+            key = article_id if group == 'article' else row['journal_id']
+            counts = usage[key][day.replace(day=1)]
+            for field in METRICS.values():
+                counts[field] += row[field]
+    return usage
+
+
+def day_range(start_date, end_date):
+    """ The days [first, last) of a report range, a midnight end being
+    exclusive as it is for the raw queries
+    """
+    start = rollups.to_local_datetime(start_date)
+    end = rollups.to_local_datetime(end_date)
+    last_day = end.date()
+    if end.time() != datetime.min.time():
+        last_day += timedelta(days=1)
+    return start.date(), last_day
+
+
+def counted_until(first_day, last_day):
+    """ The day from which [first_day, last_day) has not been summarised"""
+    counted = models.CompactionState.objects.filter(pk=1).values_list(
+        'counted_before', flat=True,
+    ).first() or first_day
+    return min(max(counted, first_day), last_day)
+
+
+def unique_visitors(group, journals, start_date, end_date):
+    """ Estimates the distinct visitors by article or journal between two
+    dates, merging the daily sketches of the days that have been built and
+    sketching the raw accesses of later days
+    :param group: 'article' or 'journal'
+    :param journals: a Journal queryset
+    :return: A tuple of ({pk: estimate}, the estimate over all of journals)
+    """
+    first_day, last_day = day_range(start_date, end_date)
+    counted = counted_until(first_day, last_day)
+
+    if group == 'article':
+        stored = models.CounterItemUsage.objects.exclude(visitors=None)
+    else:
+        stored = models.CounterJournalVisitors.objects.all()
+    stored = stored.filter(
+        date__gte=first_day,
+        date__lt=counted,
+        journal__in=journals,
+    ).values_list('{}_id'.format(group), 'visitors')
+
+    visitors = defaultdict(sketches.HyperLogLog)
+    total = sketches.HyperLogLog()
+    for pk, sketch in stored.iterator():
+        visitors[pk].merge(sketch)
+        total.merge(sketch)
+
+    if counted < last_day:
+        live = mm.ArticleAccess.objects.filter(
+            accessed__gte=rollups.day_start(counted),
+            accessed__lt=rollups.day_start(last_day),
+            article__journal__in=journals,
+            type__in=['view', 'download'],
+        ).values_list(
+            'article_id' if group == 'article' else 'article__journal_id',
+            'identifier',
+        ).distinct()
+        for pk, identifier in live.iterator():
+            visitors[pk].add(identifier)
+            total.add(identifier)
+
+    return (
+        {pk: sketch.count() for pk, sketch in visitors.items()},
+        total.count(),
+    )
+
+
+def unique_items(journals, start_date, end_date):
+    """ Counts the distinct articles investigated by journal between two
+    dates, exactly, from the daily summaries and the raw accesses of later
+    days
+    :return: A tuple of ({journal pk: count}, the count over all journals)
+    """
+    first_day, last_day = day_range(start_date, end_date)
+    counted = counted_until(first_day, last_day)
+
+    items = set(models.CounterItemUsage.objects.filter(
+        date__gte=first_day,
+        date__lt=counted,
+        journal__in=journals,
+    ).values_list('journal_id', 'article_id').distinct())
+    if counted < last_day:
+        items.update(mm.ArticleAccess.objects.filter(
+            accessed__gte=rollups.day_start(counted),
+            accessed__lt=rollups.day_start(last_day),
+            article__journal__in=journals,
+            type__in=['view', 'download'],
+        ).values_list('article__journal_id', 'article_id').distinct())
+
+    counts = defaultdict(int)
+    for journal_id, _ in items:
+        counts[journal_id] += 1
+    return dict(counts), len(items)
+
+
+def annotate_journal_uniques(journals, start_date, end_date):
+    """ Sets unique_visitors and unique_items on Journal objects
+    :return: A tuple of the (unique visitors, unique items) of all journals
+    """
+    queryset = jm.Journal.objects.filter(
+        pk__in=[journal.pk for journal in journals],
+    )
+    visitors, total_visitors = unique_visitors(
+        'journal', queryset, start_date, end_date,
+    )
+    items, total_items = unique_items(queryset, start_date, end_date)
+    for journal in journals:
+        journal.unique_visitors = visitors.get(journal.pk, 0)
+        journal.unique_items = items.get(journal.pk, 0)
+    return total_visitors, total_items
+
+
+def annotate_article_uniques(articles, journal, start_date, end_date):
+    """ Sets unique_visitors on the Article objects of a journal
+    :return: A tuple of the (unique visitors, unique items) of the journal
+    """
+    queryset = jm.Journal.objects.filter(pk=journal.pk)
+    visitors, total_visitors = unique_visitors(
+        'article', queryset, start_date, end_date,
+    )
+    for article in articles:
+        article.unique_visitors = visitors.get(article.pk, 0)
+    return total_visitors, unique_items(queryset, start_date, end_date)[1]
+
+
+def months_between(first_month, last_month):
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def journal_attributes(journal, platform):
+    return {
+        'Title': journal.name,
+        'Publisher': platform,
+        'Publisher_ID': '',
+        'Platform': platform,
+        'DOI': '',
+        'Proprietary_ID': '{}:{}'.format(platform, journal.code),
+        'Print_ISSN': getattr(journal, 'print_issn', '') or '',
+        'Online_ISSN': journal.issn or '',
+        'URI': journal.site_url(),
+    }
+
+
+def items(report, journals, first_month, last_month, platform):
+    """ Yields (attributes, {metric: {month: count}}) for a report's rows"""
+    if report.report_id == 'TR_J1' and access_type() == 'OA_Gold':
+        # TR_J1 excludes OA_Gold usage, which is all of it
+        return
+    usage = monthly_usage(report.group, journals, first_month, last_month)
+
+    if report.group == 'journal':
+        objects = journals.filter(pk__in=usage.keys())
+        attributes = {
+            journal.pk: journal_attributes(journal, platform)
+            for journal in objects
+        }
+        for attrs in attributes.values():
+            attrs['Access_Type'] = access_type()
+    else:
+        objects = sm.Article.objects.filter(
+            pk__in=usage.keys(),
+        ).select_related('journal')
+        dois = dict(id_models.Identifier.objects.filter(
+            id_type='doi',
+            article__in=objects,
+        ).values_list('article_id', 'identifier'))
+        parents = {}
+        attributes = {}
+        for article in objects:
+            if article.journal_id not in parents:
+                parents[article.journal_id] = journal_attributes(
+                    article.journal, platform,
+                )
+            parent = parents[article.journal_id]
+            published = article.date_published
+            attributes[article.pk] = {
+                'Item': article.title,
+                'Publisher': platform,
+                'Publisher_ID': '',
+                'Platform': platform,
+                'Publication_Date': published.date() if published else '',
+                'DOI': dois.get(article.pk, ''),
+                'Proprietary_ID': '{}:{}'.format(platform, article.pk),
+                'Parent_Title': parent['Title'],
+                'Parent_Data_Type': 'Journal',
+                'Parent_Proprietary_ID': parent['Proprietary_ID'],
+                'Parent_Print_ISSN': parent['Print_ISSN'],
+                'Parent_Online_ISSN': parent['Online_ISSN'],
+                'Data_Type': 'Article',
+                'YOP': published.year if published else '',
+                'Access_Type': access_type(),
+                'Access_Method': 'Regular',
+            }
+
+    for pk, attrs in sorted(
+        attributes.items(), key=lambda item: str(item[1][report.columns[0]]),
+    ):
+        performance = OrderedDict()
+        for metric in report.metrics:
+            field = METRICS[metric]
+            performance[metric] = OrderedDict(
+                (month, counts[field])
+                for month, counts in sorted(usage[pk].items())
+                if counts[field]
+            )
+        yield attrs, performance
+
+
+def header(report, first_month, last_month, platform):
+    end = (last_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    exceptions = ''
+    if report.report_id == 'TR_J1' and access_type() == 'OA_Gold':
+        exceptions = '3030 (No Usage Available for Requested Dates): ' \
+                     'all usage is OA_Gold'
+    return OrderedDict([
+        ('Report_Name', report.name),
+        ('Report_ID', report.report_id),
+        ('Release', '5'),
+        ('Institution_Name', 'The World'),
+        ('Institution_ID', ''),
+        ('Metric_Types', '; '.join(report.metrics)),
+        ('Report_Filters', report.filters),
+        ('Report_Attributes', ''),
+        ('Exceptions', exceptions),
+        ('Reporting_Period', 'Begin_Date={}; End_Date={}'.format(
+            first_month.isoformat(), end.isoformat(),
+        )),
+        ('Created', timezone.now().replace(microsecond=0).isoformat()),
+        ('Created_By', platform),
+    ])
+
+
+def stream_tsv(report, journals, first_month, last_month, platform):
+    """ Serves a report in the COUNTER tabular format"""
+    months = months_between(first_month, last_month)
+
+    def rows():
+        for key, value in header(
+            report, first_month, last_month, platform,
+        ).items():
+            yield [key, value]
+        yield []
+        yield report.columns + ['Metric_Type', 'Reporting_Period_Total'] + [
+            month.strftime('%b-%Y') for month in months
+        ]
+        for attrs, performance in items(
+            report, journals, first_month, last_month, platform,
+        ):
+            for metric, counts in performance.items():
+                if not counts:
+                    continue
+                yield [attrs[column] for column in report.columns] + [
+                    metric, sum(counts.values()),
+                ] + [counts.get(month, 0) for month in months]
+
+    def streamer():
+        for row in rows():
+            file_like = StringIO()
+            csv.writer(file_like, delimiter='\t').writerow(row)
+            instrumentation.add_rows(1)
+            yield file_like.getvalue()
+
+    response = StreamingHttpResponse(
+        instrumentation.track_stream(streamer()),
+        content_type='text/tab-separated-values',
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}.tsv"'.format(
+        report.report_id,
+    )
+    return response
+
+
+def stream_json(report, journals, first_month, last_month, platform):
+    """ Serves a report in the COUNTER_SUSHI JSON format, item by item"""
+    report_header = header(report, first_month, last_month, platform)
+
+    def streamer():
+        yield '{{"Report_Header": {}, "Report_Items": ['.format(
+            json.dumps(report_header),
+        )
+        separator = ''
+        for attrs, performance in items(
+            report, journals, first_month, last_month, platform,
+        ):
+            periods = defaultdict(list)
+            for metric, counts in performance.items():
+                for month, count in counts.items():
+                    periods[month].append(
+                        {'Metric_Type': metric, 'Count': count},
+                    )
+            if not periods:
+                continue
+            item = dict(
+                (column, str(attrs[column])) for column in report.columns
+            )
+            item['Performance'] = [
+                {
+                    'Period': {
+                        'Begin_Date': month.isoformat(),
+                        'End_Date': (
+                            (month + timedelta(days=32)).replace(day=1)
+                            - timedelta(days=1)
+                        ).isoformat(),
+                    },
+                    'Instance': instances,
+                } for month, instances in sorted(periods.items())
+            ]
+            instrumentation.add_rows(1)
+            yield separator + json.dumps(item)
+            separator = ', '
+        yield ']}'
+
+    return StreamingHttpResponse(
+        instrumentation.track_stream(streamer()),
+        content_type='application/json',
+    )
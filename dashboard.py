@@ -0,0 +1,133 @@
+"""
+Headline numbers of several reports, computed concurrently for dashboards.
+
+The sections are independent, so gather() runs each one in its own worker
+thread, with its own database connection, and waits for all of them at once.
+A section still running after REPORTING_DASHBOARD_TIMEOUT seconds is left
+out and listed under timed_out, so one slow section can't hold up the
+others; where REPORTING_STATEMENT_TIMEOUT is set its query is cancelled
+too. A section that fails is listed under failed.
+"""
+import asyncio
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import connections
+
+from journal import models as jm
+from utils.logger import get_logger
+
+from plugins.reporting import cost, logic, routers
+
+logger = get_logger(__name__)
+
+
+def timeout():
+    return getattr(settings, 'REPORTING_DASHBOARD_TIMEOUT', 10)
+
+
+def accesses_section(journal, start_date, end_date):
+    views, downloads = logic.get_accesses(journal, start_date, end_date)
+    return {'views': views, 'downloads': downloads}
+
+
+def peer_review_section(journal, start_date, end_date):
+    return logic.peer_review_stats(start_date, end_date, journal)
+
+
+def journals_section(journal, start_date, end_date):
+    journals = jm.Journal.objects.filter(is_remote=False).order_by('code')
+    if journal:
+        journals = journals.filter(pk=journal.pk)
+    return [
+        {
+            'code': journal.code,
+            'name': journal.name,
+            'submitted': journal.submitted,
+            'published': journal.published,
+            'rejected': journal.rejected,
+            'users': journal.users,
+            'views': journal.total_views,
+            'downloads': journal.total_downloads,
+        } for journal in logic.press_journal_report_data(
+            journals, start_date, end_date,
+        )
+    ]
+
+
+def licenses_section(journal, start_date, end_date):
+    licenses = logic.license_report(start_date, end_date)
+    if journal:
+        licenses = licenses.filter(journal=journal)
+    return [
+        {
+            'license': row['license__name'],
+            'journal': row['license__journal__code'],
+            'count': row['lcount'],
+        } for row in licenses
+    ]
+
+
+def countries_section(journal, start_date, end_date):
+    return [
+        {
+            'country_id': row['country_id'],
+            'country': row['country__name'],
+            'count': row['country_count'],
+        } for row in logic.acessses_by_country(journal, start_date, end_date)
+    ]
+
+
+SECTIONS = OrderedDict([
+    ('accesses', accesses_section),
+    ('peer_review', peer_review_section),
+    ('journals', journals_section),
+    ('licenses', licenses_section),
+    ('countries', countries_section),
+])
+
+
+def run_section(section, journal, start_date, end_date):
+    """ Runs a section in a worker thread, reading from the reporting
+    database, and closes the thread's connections afterwards
+    """
+    try:
+        with routers.reading(), cost.statement_timeout():
+            return section(journal, start_date, end_date)
+    finally:
+        connections.close_all()
+
+
+async def gather(journal, start_date, end_date):
+    """ Computes every section concurrently
+    :param journal: a Journal, or None for the press
+    :return: A dict of the data of each section, None for the sections that
+        timed out or failed, and the names of those in timed_out and failed
+    """
+    async def section_data(section):
+        return await asyncio.wait_for(
+            sync_to_async(run_section, thread_sensitive=False)(
+                section, journal, start_date, end_date,
+            ),
+            timeout(),
+        )
+
+    results = await asyncio.gather(
+        *[section_data(section) for section in SECTIONS.values()],
+        return_exceptions=True,
+    )
+    data = OrderedDict()
+    data['timed_out'] = []
+    data['failed'] = []
+    for name, result in zip(SECTIONS, results):
+        data[name] = None
+        if isinstance(result, asyncio.TimeoutError):
+            data['timed_out'].append(name)
+        elif isinstance(result, Exception):
+            logger.error('Dashboard section %s failed: %s', name, result)
+            data['failed'].append(name)
+        else:
+            data[name] = result
+    return data
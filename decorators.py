@@ -0,0 +1,58 @@
+from functools import wraps
+import hashlib
+
+from django.utils.cache import patch_cache_control, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from plugins.reporting import instrumentation, logic
+
+
+def report_watermark(report, sources):
+    """
+    Answers conditional GET requests for a report from its data watermark.
+
+    The ETag and Last-Modified headers are derived from cheap aggregates over
+    the tables the report reads from, so a 304 is returned without running
+    any of the report queries when nothing has changed. POST requests (CSV
+    exports) are passed straight through.
+
+    A page built from cached results or a snapshot may be older than the
+    tables, so it gets validators of its own, derived from when that data was
+    computed: they never match the watermark of the tables, and the page is
+    rendered again rather than answered with a 304.
+    :param report: str, the name of the report
+    :param sources: an iterable of logic.WatermarkSource
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            watermark = logic.get_report_watermark(
+                request, report, sources, kwargs,
+            )
+            conditional_view = condition(
+                etag_func=lambda *a, **kw: watermark.etag,
+                last_modified_func=lambda *a, **kw: watermark.last_modified,
+            )(view_func)
+            response = conditional_view(request, *args, **kwargs)
+            recorder = instrumentation.current()
+            precomputed = recorder.precomputed if recorder else []
+            if precomputed and response.status_code == 200:
+                fingerprint = repr((watermark.etag, sorted(precomputed)))
+                response['ETag'] = quote_etag(
+                    hashlib.sha256(fingerprint.encode('utf-8')).hexdigest(),
+                )
+                response['Last-Modified'] = http_date(min(
+                    computed for _, computed in precomputed
+                ).timestamp())
+            patch_cache_control(
+                response, private=True, max_age=0, must_revalidate=True,
+            )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,274 @@
+"""
+Per-request instrumentation of the reports.
+
+A ReportRecorder is bound to the current thread while a report view runs (and
+again while its CSV is streamed). It splits the elapsed time into phases and
+counts the queries run in each of them, the rows and bytes produced and the
+hits and misses of the cached report functions. Finished recordings are
+logged as JSON and stored as ReportExecution rows for the summary page.
+"""
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.shortcuts import render as django_render
+from django.utils import timezone
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_local = threading.local()
+
+
+def current():
+    """ Returns the ReportRecorder bound to this thread, if any"""
+    return getattr(_local, 'recorder', None)
+
+
+class ReportRecorder(object):
+
+    def __init__(self, report, request=None):
+        self.report = report
+        self.path = getattr(request, 'path', '')
+        self.parameters = dict(request.GET.items()) if request else {}
+        user = getattr(request, 'user', None)
+        self.user_id = user.pk if user and user.is_authenticated else None
+        self.started = timezone.now()
+        self.status_code = None
+        self._start = time.perf_counter()
+        self.phases = {}
+        self._phase = None
+        self.query_count = 0
+        self.query_duration = 0.0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.deferred = False
+        self.finished = False
+        # (source, aware datetime) of data that was not read live
+        self.precomputed = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """ Database execute wrapper that times every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.query_count += 1
+            self.query_duration += elapsed
+            if self._phase is not None:
+                self._phase['queries'] += 1
+                self._phase['query_duration'] += elapsed
+
+    @contextmanager
+    def bound(self):
+        """ Binds the recorder to this thread and to every DB connection"""
+        previous = current()
+        _local.recorder = self
+        try:
+            if previous is self:
+                yield self
+                return
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(self))
+                yield self
+        finally:
+            _local.recorder = previous
+
+    @contextmanager
+    def phase(self, name):
+        stats = self.phases.setdefault(
+            name, {'duration': 0.0, 'queries': 0, 'query_duration': 0.0},
+        )
+        previous = self._phase
+        self._phase = stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['duration'] += time.perf_counter() - start
+            self._phase = previous
+
+    def as_dict(self):
+        return {
+            'report': self.report,
+            'path': self.path,
+            'parameters': self.parameters,
+            'user': self.user_id,
+            'started': self.started,
+            'status_code': self.status_code,
+            'duration': self.duration,
+            'query_count': self.query_count,
+            'query_duration': self.query_duration,
+            'rows': self.rows,
+            'bytes_sent': self.bytes_sent,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'phases': self.phases,
+        }
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.duration = time.perf_counter() - self._start
+        data = self.as_dict()
+        logger.info(
+            'Report execution: %s', json.dumps(data, cls=DjangoJSONEncoder),
+        )
+
+        if not getattr(settings, 'REPORTING_STORE_EXECUTIONS', True):
+            return
+        from plugins.reporting import models
+        data['user_id'] = data.pop('user')
+        data['phases'] = json.loads(json.dumps(self.phases))
+        try:
+            models.ReportExecution.objects.create(**data)
+        except DatabaseError as e:
+            logger.error('Could not store report execution: %s', e)
+
+
+def phase(name):
+    """ Times a phase of the current report, a no-op outside of one"""
+    recorder = current()
+    if recorder is None:
+        return _null_phase()
+    return recorder.phase(name)
+
+
+@contextmanager
+def _null_phase():
+    yield None
+
+
+def add_rows(count):
+    recorder = current()
+    if recorder is not None:
+        recorder.rows += count
+
+
+def add_bytes(count):
+    recorder = current()
+    if recorder is not None:
+        recorder.bytes_sent += count
+
+
+def report(name):
+    """ Records the timings of a report view"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            from plugins.reporting import cost
+
+            recorder = ReportRecorder(name, request)
+            with recorder.bound(), recorder.phase('view'), \
+                    cost.statement_timeout():
+                response = view_func(request, *args, **kwargs)
+            recorder.status_code = response.status_code
+
+            if recorder.deferred:
+                # Finished by track_stream once the last chunk is sent
+                return response
+            if getattr(response, 'is_rendered', True) is False:
+                def rendered(response):
+                    recorder.bytes_sent += len(response.content)
+                    recorder.finish()
+                response.add_post_render_callback(rendered)
+                return response
+            if not response.streaming and not recorder.bytes_sent:
+                # Exports written to disk report their own size
+                recorder.bytes_sent += len(response.content)
+            recorder.finish()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def render(request, template, context):
+    """ django.shortcuts.render, timed as the 'render' phase of a report"""
+    with phase('render'):
+        return django_render(request, template, context)
+
+
+def track_stream(chunks):
+    """ Wraps a streamed response body so the stream is recorded too
+    The recorder of the view that built the response is re-bound while the
+    WSGI server consumes the generator and is finished once it's exhausted.
+    The queries of a streamed report only run then, after the view returned,
+    so the statement timeout is applied again around them.
+    """
+    from plugins.reporting import cost
+
+    recorder = current()
+    if recorder is None:
+        return chunks
+    recorder.deferred = True
+
+    def tracked():
+        try:
+            with recorder.bound(), recorder.phase('stream'), \
+                    cost.statement_timeout():
+                for chunk in chunks:
+                    recorder.bytes_sent += len(chunk.encode('utf-8'))
+                    yield chunk
+        finally:
+            recorder.finish()
+
+    return tracked()
+
+
+def record_precomputed(source, computed):
+    """ Notes that the current report serves data computed ahead of it, from
+    the cache or a snapshot, so its validators must not claim it is current
+    :param source: str, the cache key or snapshot it came from
+    :param computed: an aware datetime, when the data was computed
+    """
+    recorder = current()
+    if recorder is not None:
+        recorder.precomputed.append((source, computed))
+
+
+def record_cache(hit):
+    recorder = current()
+    if recorder is not None:
+        if hit:
+            recorder.cache_hits += 1
+        else:
+            recorder.cache_misses += 1
+
+
+
+def retention_days():
+    return getattr(settings, 'REPORTING_EXECUTION_RETENTION_DAYS', 90)
+
+
+def prune_executions(batch_size=10000, now=None):
+    """ Deletes the stored executions older than the retention period
+    :param batch_size: int, number of rows deleted per statement
+    :return: the number of executions deleted
+    """
+    from plugins.reporting import models
+
+    cutoff = (now or timezone.now()) - timezone.timedelta(
+        days=retention_days(),
+    )
+    old = models.ReportExecution.objects.filter(started__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(old.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        models.ReportExecution.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    return deleted
@@ -0,0 +1,292 @@
+"""
+Background jobs for the reports too expensive to run inside a request.
+
+Jobs are queued in the ReportJob table and run by the run_report_jobs
+management command, which claims one pending job at a time with SELECT ...
+FOR UPDATE SKIP LOCKED, so several workers can share the queue. Results are
+written to files under files/reporting/jobs and downloaded from the job list.
+"""
+from collections import OrderedDict
+import csv
+from datetime import timedelta
+import hashlib
+import json
+import os
+import time
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from journal import models as jm
+from submission import models as sm
+from utils.logger import get_logger
+
+from plugins.reporting import logic, models, routers
+
+logger = get_logger(__name__)
+
+# How often, in seconds, a running job saves its progress
+PROGRESS_INTERVAL = 2
+# Running jobs that have not saved progress for this long are run again
+STALE_AFTER = timedelta(minutes=30)
+
+
+def job_directory():
+    return os.path.join(settings.BASE_DIR, 'files', 'reporting', 'jobs')
+
+
+class Progress(object):
+    """ Saves the progress of a job, at most every PROGRESS_INTERVAL"""
+
+    def __init__(self, job):
+        self.job = job
+        self.total = None
+        self.rows = 0
+        self._saved = 0
+
+    def __call__(self, done):
+        if time.monotonic() - self._saved < PROGRESS_INTERVAL:
+            return
+        self.save(done)
+
+    def save(self, done=0):
+        """ Saves the progress now, so a long step without rows to count
+        does not leave the job looking stale to claim()
+        """
+        self._saved = time.monotonic()
+        percent = int(100 * done / self.total) if self.total else 0
+        models.ReportJob.objects.filter(pk=self.job.pk).update(
+            progress=min(percent, 99),
+            rows=self.rows,
+            updated=timezone.now(),
+        )
+
+
+def get_journal(parameters):
+    journal_id = parameters.get('journal_id')
+    return jm.Journal.objects.get(pk=journal_id) if journal_id else None
+
+
+def write_rows(to_write, headers, rows, progress, rows_done=False):
+    """ Writes the rows of a report to a CSV file
+    :param rows_done: report progress as the rows written, for row iterables
+        that do not report their own progress
+    """
+    writer = csv.writer(to_write)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        progress.rows += 1
+        if rows_done:
+            progress(progress.rows)
+
+
+def run_authors(parameters, to_write, progress):
+    accounts = logic.author_report_accounts(
+        parameters['start_date'],
+        parameters['end_date'],
+        get_journal(parameters),
+    )
+    progress.total = accounts.count()
+    write_rows(
+        to_write,
+        logic.AUTHOR_REPORT_HEADERS,
+        logic.author_rows(accounts, progress),
+        progress,
+    )
+
+
+def run_review(parameters, to_write, progress):
+    journal = get_journal(parameters)
+    articles = sm.Article.objects.all()
+    if journal:
+        articles = articles.filter(journal=journal)
+    data = logic.peer_review_data(
+        articles, parameters['start_date'], parameters['end_date'],
+    )
+    progress.total = len(data)
+    write_rows(
+        to_write,
+        logic.REVIEW_REPORT_HEADERS,
+        logic.review_rows(data, progress),
+        progress,
+    )
+
+
+def run_crossref_dois(parameters, to_write, progress):
+    journal = get_journal(parameters)
+    progress.total = logic.get_doi_identifiers(journal).count()
+
+    def dois_done(done):
+        progress.rows = done
+        progress(done)
+
+    logic.write_doi_tsv_report(
+        to_write,
+        journal=journal,
+        crosscheck=parameters.get('crosscheck', False),
+        progress=dois_done,
+    )
+
+
+def run_press(parameters, to_write, progress):
+    progress.save()
+    journals = logic.press_report(
+        jm.Journal.objects.filter(is_remote=False).order_by('code'),
+        parameters['start_date'],
+        parameters['end_date'],
+    )
+    progress.total = len(journals)
+    progress.save()
+    write_rows(
+        to_write,
+        logic.PRESS_REPORT_HEADERS,
+        logic.press_rows(journals),
+        progress,
+        rows_done=True,
+    )
+
+
+def run_articles(parameters, to_write, progress):
+    if parameters.get('journal_id') is None:
+        raise ValueError('The article report needs a journal')
+    progress.save()
+    journal = logic.press_journal_report_data(
+        jm.Journal.objects.filter(pk=parameters['journal_id']),
+        parameters['start_date'],
+        parameters['end_date'],
+    ).first()
+    articles = logic.get_articles(
+        journal, parameters['start_date'], parameters['end_date'],
+    )
+    progress.total = len(articles)
+    progress.save()
+    write_rows(
+        to_write,
+        logic.ARTICLE_REPORT_HEADERS,
+        logic.article_report_rows(articles, journal),
+        progress,
+        rows_done=True,
+    )
+
+
+class JobReport(object):
+    def __init__(self, name, label, filename, run):
+        self.name = name
+        self.label = label
+        self.filename = filename
+        self.run = run
+
+
+REPORTS = OrderedDict((report.name, report) for report in [
+    JobReport('press', 'Press Report', 'press_report.csv', run_press),
+    JobReport('articles', 'Article Metrics', 'articles_report.csv', run_articles),
+    JobReport('authors', 'Author Report', 'author_report.csv', run_authors),
+    JobReport('review', 'Peer Review Report', 'review_report.csv', run_review),
+    JobReport(
+        'crossref_dois', 'Crossref DOI URLs', 'DOI_urls.tsv', run_crossref_dois,
+    ),
+])
+
+
+def parameters_hash(parameters):
+    return hashlib.sha256(
+        json.dumps(parameters, sort_keys=True, default=str).encode('utf-8'),
+    ).hexdigest()
+
+
+def enqueue(report, parameters, user=None):
+    """ Queues a report, unless the same user already has an identical one
+    pending or running. Jobs are only visible to the users who requested
+    them, so users never share a job.
+    :return: A tuple of (ReportJob, created)
+    """
+    if report not in REPORTS:
+        raise ValueError('Unknown report {}'.format(report))
+    digest = parameters_hash(parameters)
+    active = models.ReportJob.objects.filter(
+        report=report,
+        parameters_hash=digest,
+        requested_by=user,
+        status__in=[models.ReportJob.PENDING, models.ReportJob.RUNNING],
+    )
+    existing = active.first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            job = models.ReportJob.objects.create(
+                report=report,
+                parameters=parameters,
+                parameters_hash=digest,
+                requested_by=user,
+            )
+    except IntegrityError:
+        # A concurrent request queued the same job first
+        return active.get(), False
+    return job, True
+
+
+def claim():
+    """ Marks the oldest runnable job as running and returns it"""
+    with transaction.atomic():
+        job = models.ReportJob.objects.select_for_update(
+            skip_locked=True,
+        ).filter(
+            Q(status=models.ReportJob.PENDING)
+            | Q(
+                status=models.ReportJob.RUNNING,
+                updated__lt=timezone.now() - STALE_AFTER,
+            )
+        ).order_by('created').first()
+        if job:
+            job.status = models.ReportJob.RUNNING
+            job.started = timezone.now()
+            job.progress = 0
+            job.save()
+    return job
+
+
+def run(job):
+    """ Runs a claimed job and stores its result file or error"""
+    report = REPORTS[job.report]
+    os.makedirs(job_directory(), exist_ok=True)
+    path = os.path.join(
+        job_directory(), '{}-{}'.format(job.pk, report.filename),
+    )
+    progress = Progress(job)
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as to_write, \
+                routers.reading():
+            report.run(job.parameters, to_write, progress)
+    except Exception:
+        logger.exception('Report job %s failed', job.pk)
+        job.status = models.ReportJob.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = models.ReportJob.COMPLETE
+        job.progress = 100
+        job.file_path = path
+    job.rows = progress.rows
+    job.finished = timezone.now()
+    job.save()
+    return job
+
+
+def work(once=False, sleep=5, log=None):
+    """ Runs jobs until interrupted, or until the queue is empty if once"""
+    log = log or (lambda message: None)
+    while True:
+        close_old_connections()
+        job = claim()
+        if job:
+            log('Running job {} ({})'.format(job.pk, job.report))
+            job = run(job)
+            log('Job {} {}'.format(job.pk, job.status))
+        elif once:
+            return
+        else:
+            time.sleep(sleep)
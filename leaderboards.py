@@ -0,0 +1,101 @@
+"""
+Leaderboards of the most accessed articles, per journal and press-wide.
+
+The daily CounterItemUsage rows are summed per article over each rolling
+period and streamed through a bounded heap per journal and one for the press,
+so only the top K articles are ever held. The entries are stored in the
+LeaderboardEntry table, which the leaderboard view and API read from. They
+are refreshed by build_counter_usage after it builds new days.
+"""
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+import heapq
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from plugins.reporting import models
+
+K = 50
+
+# The rolling periods, ending on the last day summarised: (label, days)
+PERIODS = OrderedDict([
+    ('week', ('Last 7 days', 7)),
+    ('month', ('Last 30 days', 30)),
+    ('year', ('Last 365 days', 365)),
+])
+
+
+def push(heap, total, article_id):
+    """ Keeps the K largest totals, ties going to the lowest article id"""
+    entry = (total, -article_id)
+    if len(heap) < K:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+def ranked(heap):
+    return [
+        (-negated_id, total) for total, negated_id in sorted(heap, reverse=True)
+    ]
+
+
+def top_articles(start_date, end_date):
+    """ The top K articles by investigations between two days
+    :return: A dict of {journal id or None for the press: [(article id,
+        total)]}, highest total first
+    """
+    totals = models.CounterItemUsage.objects.filter(
+        date__gte=start_date,
+        date__lt=end_date,
+    ).values('article_id', 'journal_id').annotate(
+        sum_total=Sum('total_investigations'),
+    ).order_by()
+
+    heaps = defaultdict(list)
+    for row in totals.iterator():
+        push(heaps[row['journal_id']], row['sum_total'], row['article_id'])
+        push(heaps[None], row['sum_total'], row['article_id'])
+    return {journal_id: ranked(heap) for journal_id, heap in heaps.items()}
+
+
+def refresh(until=None):
+    """ Recomputes the leaderboards of every period ending before until
+    :param until: a date, defaults to the first day not summarised yet
+    :return: the number of entries stored
+    """
+    if until is None:
+        until = models.CompactionState.get().counted_before
+    if until is None:
+        return 0
+    now = timezone.now()
+    entries = []
+    for period, (_, days) in PERIODS.items():
+        start = until - timedelta(days=days)
+        for journal_id, articles in top_articles(start, until).items():
+            entries += [
+                models.LeaderboardEntry(
+                    period=period,
+                    journal_id=journal_id,
+                    rank=rank,
+                    article_id=article_id,
+                    total=total,
+                    start_date=start,
+                    end_date=until - timedelta(days=1),
+                    computed=now,
+                ) for rank, (article_id, total) in enumerate(articles, 1)
+            ]
+    with transaction.atomic():
+        models.LeaderboardEntry.objects.all().delete()
+        models.LeaderboardEntry.objects.bulk_create(entries, batch_size=5000)
+    return len(entries)
+
+
+def leaderboard(period, journal=None):
+    """ The stored entries of a period, for a journal or the press"""
+    return models.LeaderboardEntry.objects.filter(
+        period=period,
+        journal=journal,
+    ).select_related('article', 'article__journal').order_by('rank')
@@ -1,8 +1,11 @@
 import csv
+import hashlib
+from collections import defaultdict, namedtuple
 from io import StringIO
 from itertools import chain
 import os
 from datetime import datetime, date, timedelta
+from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
 
 
@@ -12,30 +15,44 @@ from django.utils import timezone
 from django.conf import settings
 from django.template.defaultfilters import strip_tags
 from django.db.models import (
+    Avg,
     DurationField,
     ExpressionWrapper,
     F,
     IntegerField,
+    Max,
     Min,
     Case,
     Count,
+    Exists,
     Q,
     Subquery,
+    Sum,
     Func,
     When,
     OuterRef
 )
-from django.db.models.functions import TruncMonth
+from django.db.models.functions import Coalesce
 from django.contrib import messages
 
 from submission import models as sm
+from core import files
 from core.files import serve_temp_file
 from core import models as core_models
-from utils.function_cache import cache
 from journal import models as jm
 from review import models as rm
 from metrics import models as mm
 from identifiers import models as id_models
+from production import models as pm
+from plugins.reporting import (
+    caching,
+    instrumentation,
+    matviews,
+    models,
+    months,
+    parallel,
+    rollups,
+)
 from plugins.reporting.templatetags import timedelta as td_tag
 from repository import models as repository_models
 
@@ -111,10 +128,23 @@ def get_articles(journal, start_date, end_date):
     if journal:
         articles = articles.filter(journal=journal)
 
+    # A range ending on a date includes that whole day, whether it is read
+    # from the materialized view, the access log or the rollups
+    end = range_end(end_date)
+    month_range = whole_month_range(start_date, end)
+    if (
+        month_range
+        and matviews.is_available(models.MonthlyArticleUsage)
+        and refreshed_months(
+            month_range, months.report_timezone(),
+        ) == month_range
+    ):
+        return annotate_monthly_article_usage(articles, *month_range)
+
     abstract_page_views = mm.ArticleAccess.objects.filter(
         article=OuterRef("id"),
         accessed__gte=start_date,
-        accessed__lte=end_date,
+        accessed__lt=end,
         galley_type__isnull=True,
     ).order_by().annotate(
         count=Func(F('id'), function="Count")
@@ -123,7 +153,7 @@ def get_articles(journal, start_date, end_date):
     html_views = mm.ArticleAccess.objects.filter(
         article=OuterRef("id"),
         accessed__gte=start_date,
-        accessed__lte=end_date,
+        accessed__lt=end,
         galley_type__in={"html", "xml"},
         type="view",
     ).order_by().annotate(
@@ -133,7 +163,7 @@ def get_articles(journal, start_date, end_date):
     pdf_views = mm.ArticleAccess.objects.filter(
         article=OuterRef("id"),
         accessed__gte=start_date,
-        accessed__lte=end_date,
+        accessed__lt=end,
         galley_type="pdf",
         type="view",
     ).annotate(
@@ -143,7 +173,7 @@ def get_articles(journal, start_date, end_date):
     pdf_downloads = mm.ArticleAccess.objects.filter(
         article=OuterRef("id"),
         accessed__gte=start_date,
-        accessed__lte=end_date,
+        accessed__lt=end,
         galley_type="pdf",
         type="download",
     ).order_by().annotate(
@@ -153,7 +183,7 @@ def get_articles(journal, start_date, end_date):
     other_downloads = mm.ArticleAccess.objects.filter(
         article=OuterRef("id"),
         accessed__gte=start_date,
-        accessed__lte=end_date,
+        accessed__lt=end,
         type="download",
     ).exclude(
         galley_type__in={"pdf"},
@@ -161,31 +191,132 @@ def get_articles(journal, start_date, end_date):
         count=Func(F('id'), function="Count")
     ).order_by("count").values("count")
 
+    # Accesses for compacted days are only found in the daily rollup
+    day_range = rollups.rollup_range(start_date, end)
     articles = articles.annotate(
-        abstract_views=Subquery(abstract_page_views, output_field=IntegerField()),
-        html_views=Subquery(html_views, output_field=IntegerField()),
-        pdf_views=Subquery(pdf_views, output_field=IntegerField()),
-        pdf_downloads=Subquery(pdf_downloads, output_field=IntegerField()),
-        other_downloads=Subquery(other_downloads, output_field=IntegerField()),
+        abstract_views=rollups.with_rollup(
+            Subquery(abstract_page_views, output_field=IntegerField()),
+            day_range, 'article', galley_type__isnull=True,
+        ),
+        html_views=rollups.with_rollup(
+            Subquery(html_views, output_field=IntegerField()),
+            day_range, 'article', galley_type__in={"html", "xml"}, type="view",
+        ),
+        pdf_views=rollups.with_rollup(
+            Subquery(pdf_views, output_field=IntegerField()),
+            day_range, 'article', galley_type="pdf", type="view",
+        ),
+        pdf_downloads=rollups.with_rollup(
+            Subquery(pdf_downloads, output_field=IntegerField()),
+            day_range, 'article', galley_type="pdf", type="download",
+        ),
+        other_downloads=rollups.with_rollup(
+            Subquery(other_downloads, output_field=IntegerField()),
+            day_range, 'article', type="download",
+            exclude={'galley_type__in': {"pdf"}},
+        ),
     )
 
     return articles
 
 
+def range_end(end_date):
+    """ The exclusive end of a report range ending on end_date
+    A date, or a datetime at midnight, includes its whole day, so the range
+    ends when the next day starts.
+    :return: an aware datetime
+    """
+    end = rollups.to_local_datetime(end_date)
+    if end.time() != datetime.min.time():
+        return end
+    return rollups.day_start(end.date() + timedelta(days=1))
+
+
+def whole_month_range(start_date, end_date):
+    """ Returns the range as aware datetimes if it spans whole months
+    The materialized views are bucketed by month, so they can only answer
+    for ranges starting and ending on the first of a month.
+    :param end_date: the exclusive end of the range, see range_end()
+    :return: A tuple of (start, end) or None
+    """
+    try:
+        start, end = (
+            value if isinstance(value, datetime)
+            else parse(str(value))
+            for value in (start_date, end_date)
+        )
+    except (ValueError, TypeError, OverflowError):
+        return None
+    boundaries = []
+    for value in (start, end):
+        if value.day != 1 or value.time() != datetime.min.time():
+            return None
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        boundaries.append(value)
+    if boundaries[0] >= boundaries[1]:
+        return None
+    return tuple(boundaries)
+
+
+def monthly_article_usage_subquery(start, end, exclude=None, **filters):
+    usage = models.MonthlyArticleUsage.objects.filter(
+        article_id=OuterRef('id'),
+        month__gte=start,
+        month__lt=end,
+        **filters
+    )
+    if exclude:
+        usage = usage.exclude(**exclude)
+    return Subquery(
+        usage.order_by().values('article_id').annotate(
+            count=Sum('total'),
+        ).values('count'),
+        output_field=IntegerField(),
+    )
+
+
+def annotate_monthly_article_usage(articles, start, end):
+    """ The annotations of get_articles, read from the materialized view"""
+    return articles.annotate(
+        abstract_views=monthly_article_usage_subquery(
+            start, end, galley_type='',
+        ),
+        html_views=monthly_article_usage_subquery(
+            start, end, galley_type__in={'html', 'xml'}, type='view',
+        ),
+        pdf_views=monthly_article_usage_subquery(
+            start, end, galley_type='pdf', type='view',
+        ),
+        pdf_downloads=monthly_article_usage_subquery(
+            start, end, galley_type='pdf', type='download',
+        ),
+        other_downloads=monthly_article_usage_subquery(
+            start, end, type='download', exclude={'galley_type': 'pdf'},
+        ),
+    )
+
+
 def get_accesses(journal, start_date, end_date):
-    views = mm.ArticleAccess.objects.filter(
-        article__journal=journal,
-        type='view',
+    """ Counts the views and downloads of a journal, or of the press when
+    journal is None
+    """
+    filters = {'journal': journal} if journal else {}
+    accesses = mm.ArticleAccess.objects.filter(
         accessed__gte=start_date,
         accessed__lte=end_date,
-    ).count()
+    )
+    if journal:
+        accesses = accesses.filter(article__journal=journal)
 
-    downloads = mm.ArticleAccess.objects.filter(
-        article__journal=journal,
-        type='download',
-        accessed__gte=start_date,
-        accessed__lte=end_date,
-    ).count()
+    views = accesses.filter(type='view').count()
+    downloads = accesses.filter(type='download').count()
+
+    day_range = rollups.rollup_range(start_date, end_date)
+    views += rollups.rollup_count(day_range, type='view', **filters)
+    downloads += rollups.rollup_count(
+        day_range, type='download', **filters
+    )
 
     return views, downloads
 
@@ -195,10 +326,13 @@ def export_csv(rows, filename=None):
         filename = '{0}.csv'.format(timezone.now())
     full_path = os.path.join(settings.BASE_DIR, 'files', 'temp', filename)
 
-    with open(full_path, 'w', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile, delimiter=',')
-        for row in rows:
-            csv_writer.writerow(row)
+    with instrumentation.phase('export'):
+        with open(full_path, 'w', encoding='utf-8') as csvfile:
+            csv_writer = csv.writer(csvfile, delimiter=',')
+            for row in rows:
+                csv_writer.writerow(row)
+                instrumentation.add_rows(1)
+    instrumentation.add_bytes(os.path.getsize(full_path))
 
     return serve_temp_file(
         full_path,
@@ -229,10 +363,11 @@ def stream_csv(headers, iterable, filename=None):
             file_like = StringIO()
             csv_writer = csv.writer(file_like)
             csv_writer.writerow(row)
+            instrumentation.add_rows(1)
             yield file_like.getvalue()
 
     response = StreamingHttpResponse(
-        response_streamer(),
+        instrumentation.track_stream(response_streamer()),
         content_type="text/csv",
 
     )
@@ -260,17 +395,30 @@ def export_journal_csv(journals):
     return export_csv(all_rows)
 
 
+ARTICLE_REPORT_HEADERS = [
+    'Articles',
+    'Submissions',
+    'Published Articles',
+    'Rejected Articles',
+    'Views',
+    'Downloads',
+]
+
+
 def export_article_csv(articles, journal):
+    filename = f'articles-report-{journal.code}-{timezone.now()}.csv'
 
-    info_header_row = [
-        'Articles',
-        'Submissions',
-        'Published Articles',
-        'Rejected Articles',
-        'Views',
-        'Downloads',
-    ]
+    return stream_csv(
+        ARTICLE_REPORT_HEADERS,
+        article_report_rows(articles, journal),
+        filename=filename,
+    )
 
+
+def article_report_rows(articles, journal):
+    """ The rows of the article report after ARTICLE_REPORT_HEADERS: the
+    journal totals, then a header and a row for each article
+    """
     journal_row = [
         journal.article_set.count(),
         journal.submitted,
@@ -310,10 +458,7 @@ def export_article_csv(articles, journal):
         article.other_downloads,
     ) for article in articles)
 
-    all_rows = chain([journal_row, main_header_row], iter_articles)
-    filename = f'articles-report-{journal.code}-{timezone.now()}.csv'
-
-    return stream_csv(info_header_row, all_rows, filename=filename)
+    return chain([journal_row, main_header_row], iter_articles)
 
 
 def export_production_csv(production_assignments):
@@ -461,22 +606,154 @@ def average(lst):
 
 
 def acessses_by_country(journal, start_date, end_date):
-    metrics = mm.ArticleAccess.objects.filter(
-        article__stage=sm.STAGE_PUBLISHED,
-        accessed__gte=start_date,
-        accessed__lte=end_date,
-    ).values(
-        'country__name'
-    ).annotate(
-        country_count=Count('country')
+    """ Returns the accesses of published articles by country
+    :return: A list of dicts, busiest country first, with the country id and
+        name, the total count and the count of each month in the range
+    """
+    usage = country_usage_by_month(journal, start_date, end_date)
+    countries = core_models.Country.objects.in_bulk(
+        [country_id for country_id in usage if country_id is not None]
     )
+    rows = [
+        {
+            'country_id': country_id,
+            'country__name': getattr(countries.get(country_id), 'name', None),
+            'country_count': sum(by_month.values()),
+            'months': [
+                {'month': month.date(), 'count': count}
+                for month, count in sorted(by_month.items())
+            ],
+        } for country_id, by_month in usage.items()
+    ]
+    rows.sort(key=lambda row: row['country_count'], reverse=True)
+    return rows
+
+
+def month_boundaries(start, end, tz=None):
+    """ Returns the whole months inside a range of aware datetimes
+    :param tz: the timezone of the months, by default the current one
+    :return: A tuple of (first month start, last month end) or None
+    """
+    tz = tz or timezone.get_current_timezone()
+    starts = months.boundaries(start, end, tz)
+    first = starts[0] if starts[0] >= start else starts[1]
+    last = starts[-2]
+    if first >= last:
+        return None
+    return first, last
+
+
+def refreshed_months(month_range, tz):
+    """ Shortens a whole month range to the months the materialized views
+    held in full when they were last refreshed
+    :param month_range: a tuple of aware datetimes (first month start, last
+        month end)
+    :return: A tuple of (start, end) or None
+    """
+    complete = matviews.complete_before(tz)
+    if complete is None or month_range[0] >= complete:
+        return None
+    return month_range[0], min(month_range[1], complete)
 
+
+def country_usage_queryset(journal, accessed, starts):
+    """ Counts the raw accesses of published articles by country and month
+    :param accessed: a Q of the accessed ranges counted
+    :param starts: the month boundaries of months.boundaries(). Each row's
+        month is the index of its start in starts.
+    """
+    live = mm.ArticleAccess.objects.filter(
+        accessed,
+        article__stage=sm.STAGE_PUBLISHED,
+    )
     if journal:
-        metrics = metrics.filter(
-            article__journal=journal,
+        live = live.filter(article__journal=journal)
+    return live.annotate(
+        month=months.bucket('accessed', starts),
+    ).values('country_id', 'month').annotate(total=Count('country'))
+
+
+@caching.cached(300, key=lambda journal, start_date, end_date: (
+    caching.instance_key(journal),
+    caching.date_key(start_date),
+    caching.date_key(end_date),
+))
+def country_usage_by_month(journal, start_date, end_date):
+    """ Counts the accesses of published articles by country and month
+    Whole months are read from the monthly country materialized view when it
+    is available, the partial months at either end, and months that had not
+    ended when the view was refreshed, from the access log.
+    :return: A dict of {country id or None: {month start: count}}
+    """
+    start = rollups.to_local_datetime(start_date)
+    end = rollups.to_local_datetime(end_date)
+    tz_name = months.timezone_name(journal)
+    tz = months.get_timezone(tz_name)
+    starts = months.boundaries(start, end, tz)
+    usage = defaultdict(lambda: defaultdict(int))
+    # (start, end, end is inclusive) ranges read from the access log
+    live_ranges = [(start, end, True)]
+
+    whole_months = month_boundaries(start, end, tz)
+    if (
+        whole_months
+        and tz_name == months.timezone_name()
+        and matviews.is_available(models.MonthlyCountryUsage)
+    ):
+        whole_months = refreshed_months(whole_months, tz)
+    else:
+        whole_months = None
+    if whole_months:
+        monthly = models.MonthlyCountryUsage.objects.filter(
+            month__gte=whole_months[0],
+            month__lt=whole_months[1],
+        )
+        if journal:
+            monthly = monthly.filter(journal_id=journal.pk)
+        for row in monthly.values('country_id', 'month').annotate(
+            total=Sum('total'),
+        ):
+            month = timezone.localtime(row['month'], tz)
+            usage[row['country_id'] or None][month] += row['total']
+        live_ranges = [
+            (start, whole_months[0], False),
+            (whole_months[1], end, True),
+        ]
+
+    accessed = Q()
+    for range_start, range_end, inclusive in live_ranges:
+        if inclusive:
+            accessed |= Q(accessed__gte=range_start, accessed__lte=range_end)
+        elif range_start < range_end:
+            accessed |= Q(accessed__gte=range_start, accessed__lt=range_end)
+    for row in country_usage_queryset(journal, accessed, starts):
+        usage[row['country_id']][starts[row['month']]] += row['total']
+
+    days = Q()
+    for range_start, range_end, _ in live_ranges:
+        day_range = rollups.rollup_range(range_start, range_end)
+        if day_range:
+            days |= Q(date__gte=day_range[0], date__lt=day_range[1])
+    if days:
+        compacted = models.ArticleAccessRollup.objects.filter(
+            days,
+            article__stage=sm.STAGE_PUBLISHED,
         )
+        if journal:
+            compacted = compacted.filter(journal=journal)
+        for row in compacted.annotate(
+            month=months.bucket('date', months.start_dates(starts, tz)),
+        ).values('country_id', 'month').annotate(
+            # Count('country') skips unknown countries, so the sum does too
+            total=Sum('count', filter=Q(country__isnull=False)),
+        ):
+            usage[row['country_id']][starts[row['month']]] += (
+                row['total'] or 0
+            )
 
-    return metrics
+    return {
+        country_id: dict(months) for country_id, months in usage.items()
+    }
 
 
 def export_country_csv(metrics):
@@ -488,15 +765,11 @@ def export_country_csv(metrics):
     return export_csv(all_rows, filename="access_by_country.csv")
 
 
-@cache(300)
-def get_most_viewed_article(metrics):
-    from django.db.models import Count
-
-    return metrics.values('article__title').annotate(
-        total=Count('article')).order_by('-total')[:1]
-
-
-@cache(300)
+@caching.cached(300, key=lambda journals, start_date, end_date: (
+    caching.queryset_key(journals),
+    caching.date_key(start_date),
+    caching.date_key(end_date),
+))
 def press_journal_report_data(journals, start_date, end_date):
     data = []
 
@@ -547,76 +820,114 @@ def press_journal_report_data(journals, start_date, end_date):
         count=Func(F('id'), function="Count")
     ).order_by("count").values("count")
 
+    # Counted like Journal.journal_users(), without loading the users
+    users_subq = core_models.AccountRole.objects.filter(
+        journal=OuterRef("id"),
+        user__is_active=True,
+    ).order_by().values("journal").annotate(
+        count=Count("user", distinct=True),
+    ).values("count")
+
+    day_range = rollups.rollup_range(start_date, end_date)
     journals = journals.annotate(
+        users=Coalesce(
+            Subquery(users_subq, output_field=IntegerField()), 0,
+        ),
         submitted=Subquery(submissions_subq, output_field=IntegerField()),
         published=Subquery(published_articles_subq, output_field=IntegerField()),
         rejected=Subquery(rejected_articles_subq, output_field=IntegerField()),
-        total_views=Subquery(views_subq, output_field=IntegerField()),
-        total_downloads=Subquery(downloads_subq, output_field=IntegerField()),
+        total_views=rollups.with_rollup(
+            Subquery(views_subq, output_field=IntegerField()),
+            day_range, 'journal', type="view",
+        ),
+        total_downloads=rollups.with_rollup(
+            Subquery(downloads_subq, output_field=IntegerField()),
+            day_range, 'journal', type="download",
+        ),
     )
     return journals
 
 
+def press_report_units(journals):
+    """ The querysets press_report() computes, and caches, separately: the
+    journals as a whole, or each journal when parallel reports are enabled
+    """
+    if not parallel.enabled():
+        return [journals]
+    return [journals.filter(pk=journal.pk) for journal in journals]
+
+
+def press_report(journals, start_date, end_date):
+    """ The journals of the press report, computed one journal per worker
+    when parallel reports are enabled
+    :return: A list of annotated Journal objects, in the order of journals
+    """
+    if not parallel.enabled():
+        return list(press_journal_report_data(journals, start_date, end_date))
+    return parallel.map_units(
+        lambda unit: press_journal_report_data(unit, start_date, end_date)[0],
+        press_report_units(journals),
+    )
+
+
+def press_report_cached(journals, start_date, end_date):
+    """ Whether press_report() would be answered from the cache"""
+    return all(
+        press_journal_report_data.has_entry(unit, start_date, end_date)
+        for unit in press_report_units(journals)
+    )
+
+
+PRESS_REPORT_HEADERS = [
+    'Journal',
+    'Submissions',
+    'Published Submissions',
+    'Rejected Submissions',
+    'Number of Users',
+    'Views',
+    'Downloads',
+]
+
+
 def export_press_csv(journals):
-    header_row = [
-        'Journal',
-        'Submissions',
-        'Published Submissions',
-        'Rejected Submissions',
-        'Number of Users',
-        'Views',
-        'Downloads',
-    ]
+    filename = f'press-report-{timezone.now()}.csv'
+
+    return stream_csv(
+        PRESS_REPORT_HEADERS, press_rows(journals), filename=filename,
+    )
 
 
-    rows = ((
+def press_rows(journals):
+    return ((
         journal.name,
         journal.submitted,
         journal.published,
         journal.rejected,
-        len(journal.journal_users()),
+        journal.users,
         journal.total_views,
         journal.total_downloads,
     ) for journal in journals)
-    filename = f'press-report-{timezone.now()}.csv'
-
-    return stream_csv(header_row, rows, filename=filename)
 
 
-@cache(600)
-def journal_usage_by_month_data(date_parts):
-    """An attempt to make the view above more performant"""
-    journals = jm.Journal.objects.filter(is_remote=False, hide_from_press=False)
-    journal_id_map = {j.id: j for j in journals}
-    data = {}
-    metrics = mm.ArticleAccess.objects.all()
-
-    start = timezone.make_aware(timezone.datetime(
-        int(date_parts["start_month_y"]),
-        int(date_parts["start_month_m"]),
-        1
-    ))
-    end = timezone.make_aware(timezone.datetime(
-        int(date_parts["end_month_y"]),
-        int(date_parts["end_month_m"]),
-        1
-        # get first day of next month at 00:00:00
-    ) + relativedelta(months=1))
-
-
-    journal_metrics = metrics.filter(
+def journal_usage_by_month_queryset(journals, starts):
+    """ Returns the view and download totals grouped by journal and month
+    :param journals: A queryset of Journal objects
+    :param starts: the month boundaries of months.boundaries(). Each row's
+        month is the index of its start in starts.
+    """
+    return mm.ArticleAccess.objects.filter(
         article__journal__in=journals,
         type__in=['view', 'download'],
-        accessed__gte=start,
-        accessed__lt=end,
+        accessed__gte=starts[0],
+        accessed__lt=starts[-1],
     ).exclude(
         galley_type__isnull=True,
     ).annotate(
-        month=TruncMonth('accessed'),
+        month=months.bucket('accessed', starts),
     ).values(
         # There is no group by in the ORM, this call will translate into:
         # GROUP BY "submission_article"."journal_id",
-        #   DATE_TRUNC('month', "metrics_articleaccess"."accessed")
+        #   CASE WHEN "metrics_articleaccess"."accessed" >= ... THEN 0 ... END
         "article__journal", "month",
     ).annotate(
         # This annotation has to take place after the values above so that it is
@@ -626,85 +937,187 @@ def journal_usage_by_month_data(date_parts):
     ).values("article__journal", "month", "total"
     ).order_by("article__journal", "month")
 
-    dates = [start]
-    requested_start = start # preserve original requested start
 
-    while start < end:
-        start += relativedelta(months=1)
-        if start < end:
-            dates.append(start)
+def monthly_journal_usage(journals, first_month, last_month):
+    """ The view and download totals of galleys by journal and month, each
+    journal bucketed in its report timezone. The months that had ended when
+    the materialized view was last refreshed are read from it, when it is
+    available and bucketed in the same timezone, the others live.
+    :param first_month: a date, the first day of the first month
+    :param last_month: a date, the first day of the last month
+    :return: A list of dicts of article__journal, month (the date of its first
+        day) and total, ordered by journal and month
+    """
+    rows = []
+    for tz_name, group in months.by_timezone(journals):
+        tz = months.get_timezone(tz_name)
+        starts = months.boundaries(first_month, last_month, tz)
+        matview_months = None
+        if (
+            tz_name == months.timezone_name()
+            and matviews.is_available(models.MonthlyJournalUsage)
+        ):
+            matview_months = refreshed_months((starts[0], starts[-1]), tz)
+        if matview_months:
+            usage = models.MonthlyJournalUsage.objects.filter(
+                journal_id__in=group.values('id'),
+                type__in=['view', 'download'],
+                has_galley=True,
+                month__gte=matview_months[0],
+                month__lt=matview_months[1],
+            ).values('journal_id', 'month').annotate(
+                total=Sum('total'),
+            )
+            rows += [
+                {
+                    'article__journal': row['journal_id'],
+                    'month': timezone.localtime(row['month'], tz).date(),
+                    'total': row['total'],
+                } for row in usage
+            ]
+            starts = [start for start in starts if start >= matview_months[1]]
+            if len(starts) < 2:
+                continue
+
+        dates = months.start_dates(starts, tz)
+        usage = [
+            {
+                'article__journal': row['article__journal'],
+                'month': dates[row['month']],
+                'total': row['total'],
+            } for row in journal_usage_by_month_queryset(group, starts)
+        ]
+        day_range = rollups.rollup_range(starts[0], starts[-1])
+        if day_range:
+            usage = merge_monthly_rollup(usage, group, day_range, dates)
+        rows += usage
 
-    current_journal = None
-    maximum = minimum = 0
-    for row in journal_metrics:
-        journal = journal_id_map[row["article__journal"]]
-        data.setdefault(journal, [])
-        if journal != current_journal:  # if we have switched to another journal
-            # fill gaps if a journal history doesn't have history in the period
-            if row["month"] != requested_start:
-                delta = relativedelta(row["month"].date(), requested_start.date())
-                months_delta = (delta.years * 12) + delta.months
-                for _ in range(months_delta):
-                    data[journal].append(0)
-
-        month_total = row["total"]
-        data[journal].append(month_total)
-        if month_total > maximum:
-            maximum = month_total
-        if month_total < minimum:
-            minimum = month_total
-        current_journal = journal
+    rows.sort(key=lambda row: (row['article__journal'], row['month']))
+    return rows
 
-    return data, dates, maximum, minimum
+
+def merge_monthly_rollup(rows, journals, day_range, dates):
+    """ Adds the compacted accesses to monthly_journal_usage rows
+    :param dates: the months.start_dates() the rows are bucketed by
+    """
+    totals = {
+        (row['article__journal'], row['month']): row['total'] for row in rows
+    }
+    compacted = rollups.rollups_in(
+        day_range,
+        journal__in=journals,
+        type__in=['view', 'download'],
+        galley_type__isnull=False,
+    ).annotate(
+        month=months.bucket('date', dates),
+    ).values('journal', 'month').annotate(total=Sum('count'))
+    for row in compacted:
+        key = (row['journal'], dates[row['month']])
+        totals[key] = totals.get(key, 0) + row['total']
+
+    return [
+        {'article__journal': journal, 'month': month, 'total': total}
+        for (journal, month), total in sorted(totals.items())
+    ]
 
 
-@cache(600)
-def ajournal_usage_by_month_data(date_parts):
+def usage_months(date_parts):
+    """ The first days of the first and last months of a usage report"""
+    return (
+        date(int(date_parts["start_month_y"]), int(date_parts["start_month_m"]), 1),
+        date(int(date_parts["end_month_y"]), int(date_parts["end_month_m"]), 1),
+    )
+
+
+@caching.cached(600, key=caching.month_parts_key)
+def journal_usage_by_month_data(date_parts):
+    """An attempt to make the view above more performant"""
     journals = jm.Journal.objects.filter(is_remote=False, hide_from_press=False)
+    journal_id_map = {j.id: j for j in journals}
     data = {}
 
+    first_month, last_month = usage_months(date_parts)
 
-    start = timezone.datetime(
-        int(date_parts["start_month_y"]),
-        int(date_parts["start_month_m"]),
-        1
-    )
-    end = timezone.datetime(
-        int(date_parts["end_month_y"]),
-        # get first day of next month at 00:00:00
-        int(date_parts["end_month_m"]) + 1,
-        1
-    )
+    if parallel.enabled():
+        # Rows are ordered by journal, as in the single query
+        journal_metrics = list(chain.from_iterable(parallel.map_units(
+            lambda journal: monthly_journal_usage(
+                journals.filter(pk=journal.pk), first_month, last_month,
+            ),
+            sorted(journal_id_map.values(), key=lambda journal: journal.pk),
+        )))
+    else:
+        journal_metrics = monthly_journal_usage(
+            journals, first_month, last_month,
+        )
+
+    dates = [first_month]
+    while dates[-1] < last_month:
+        dates.append(dates[-1] + relativedelta(months=1))
+
+    totals = defaultdict(dict)
+    for row in journal_metrics:
+        totals[journal_id_map[row["article__journal"]]][row["month"]] = (
+            row["total"]
+        )
+
+    maximum = minimum = 0
+    for journal, journal_totals in totals.items():
+        # fill the months a journal has no history for
+        data[journal] = [journal_totals.get(month, 0) for month in dates]
+        maximum = max([maximum] + data[journal])
+        minimum = min([minimum] + data[journal])
+
+    return data, dates, maximum, minimum
+
+
+@caching.cached(600, key=caching.month_parts_key)
+def ajournal_usage_by_month_data(date_parts):
+    journals = jm.Journal.objects.filter(is_remote=False, hide_from_press=False)
+    first_month, last_month = usage_months(date_parts)
+    by_journal = {}
     dates = []
 
-    while start < end:
-        if start < end:
-            # e.g: 2022-01, 2022-02...
-            annotation_key = start.strftime("%Y-%m")
-            dates.append(annotation_key)
-            next_month = start + relativedelta(months=1)
-
-        # Annotate each journal with the metrics for this date range
-        journals = journals.annotate(**{
-            annotation_key: Subquery(
-                build_range_metrics_subq(start, next_month),
-                output_field=IntegerField(),
+    for tz_name, group in months.by_timezone(journals):
+        tz = months.get_timezone(tz_name)
+        starts = months.boundaries(first_month, last_month, tz)
+        # e.g: 2022-01, 2022-02...
+        dates = [
+            "{:%Y-%m}".format(day) for day in months.start_dates(starts, tz)[:-1]
+        ]
+
+        # Annotate each journal with the metrics for each month
+        group = group.annotate(**{
+            annotation_key: rollups.with_rollup(
+                Subquery(
+                    build_range_metrics_subq(start, next_month),
+                    output_field=IntegerField(),
+                ),
+                rollups.rollup_range(start, next_month),
+                'journal',
+            ) for annotation_key, start, next_month in zip(
+                dates, starts, starts[1:],
             )
         })
-        start = next_month
-
-    for journal in journals:
-        # transform the data into tabular format for the template/CSV
-        data[journal] = [getattr(journal, date, 0) for date in dates]
 
+        for journal in group:
+            # transform the data into tabular format for the template/CSV
+            by_journal[journal.pk] = (
+                journal, [getattr(journal, date, 0) for date in dates],
+            )
 
+    data = dict(
+        by_journal[journal.pk] for journal in journals
+        if journal.pk in by_journal
+    )
     return data, dates
 
 
 def build_range_metrics_subq(start, end):
     return mm.ArticleAccess.objects.filter(
         article__journal=OuterRef("id"),
-        accessed__range=(start, end),
+        accessed__gte=start,
+        accessed__lt=end,
     ).order_by().annotate(
         count=Func(F('id'), function='Count', output_field=IntegerField()),
     ).values('count')
@@ -734,31 +1147,42 @@ def export_usage_by_month(data, dates):
     return export_csv(all_rows)
 
 
-@cache(60)
+@caching.cached(60, key=lambda articles, start_date, end_date: (
+    caching.queryset_key(articles),
+    caching.date_key(start_date),
+    caching.date_key(end_date),
+))
 def peer_review_data(articles, start_date, end_date):
-    data = []
-
-    for article in articles:
-        reviews = rm.ReviewAssignment.objects.filter(
-            article=article,
-            date_accepted__isnull=False,
-            date_complete__isnull=False,
-            date_requested__gte=start_date,
-            date_requested__lte=end_date,
-        )
+    reviews_by_article = defaultdict(list)
+    reviews = rm.ReviewAssignment.objects.filter(
+        article__in=articles,
+        date_accepted__isnull=False,
+        date_complete__isnull=False,
+        date_requested__gte=start_date,
+        date_requested__lte=end_date,
+    ).select_related(
+        'reviewer',
+        'article',
+    )
 
-        for review in reviews:
-            review.request_to_accept = review.date_accepted - review.date_requested
-            review.accept_to_complete = review.date_complete - review.date_accepted
+    for review in reviews:
+        review.request_to_accept = review.date_accepted - review.date_requested
+        review.accept_to_complete = review.date_complete - review.date_accepted
+        reviews_by_article[review.article_id].append(review)
 
-        data.append(
-            {'article': article, 'reviews': reviews}
-        )
+    data = [
+        {'article': article, 'reviews': reviews_by_article[article.pk]}
+        for article in articles.select_related('journal')
+    ]
 
     return data
 
 
-@cache(300)
+@caching.cached(300, key=lambda start_date, end_date, journal: (
+    caching.date_key(start_date),
+    caching.date_key(end_date),
+    caching.instance_key(journal),
+))
 def peer_review_stats(start_date, end_date, journal=None):
     """Returns peer review statistics for the journal in the given period"""
     submitted_articles = sm.Article.objects.filter(
@@ -783,25 +1207,64 @@ def peer_review_stats(start_date, end_date, journal=None):
     return stats
 
 
+AUTHOR_REPORT_HEADERS = [
+    "Author Name", "Author Email", "Author Affiliation",
+    "Article ID", "Article Title", "Date Published",
+]
+
+
+def author_report_accounts(start_date, end_date, journal=None):
+    accounts = core_models.Account.objects.filter(
+        authors__date_published__gte=start_date,
+        authors__date_published__lte=end_date,
+    )
+    if journal:
+        accounts = accounts.filter(authors__journal=journal)
+    return accounts
+
+
+def author_rows(accounts, progress=None):
+    """ Yields a CSV row for every published article of every account
+    :param progress: An optional callable receiving the accounts done so far
+    """
+    for done, account in enumerate(accounts, 1):
+        for article in account.published_articles():
+            yield (
+                account.full_name(), account.email, account.affiliation(),
+                article.id, article.title, article.date_published
+            )
+        if progress:
+            progress(done)
+
+
+REVIEW_REPORT_HEADERS = [
+    'Reviewer',
+    'Journal',
+    'Date Requested',
+    'Date Accepted',
+    'Date Due',
+    'Date Complete',
+    'Time to Acceptance',
+    'Time to Completion',
+]
+
+
 def export_review_data(data):
     all_rows = list()
 
-    headers = [
-        'Reviewer',
-        'Journal',
-        'Date Requested',
-        'Date Accepted',
-        'Date Due',
-        'Date Complete',
-        'Time to Acceptance',
-        'Time to Completion',
-    ]
+    all_rows.append(REVIEW_REPORT_HEADERS)
+    all_rows.extend(review_rows(data))
+
+    return export_csv(all_rows)
 
-    all_rows.append(headers)
 
-    for data_point in data:
+def review_rows(data, progress=None):
+    """ Yields a CSV row for every review in peer_review_data
+    :param progress: An optional callable receiving the articles done so far
+    """
+    for done, data_point in enumerate(data, 1):
         for review in data_point.get('reviews'):
-            row = [
+            yield [
                 review.reviewer.full_name(),
                 strip_tags(data_point.get('article').title),
                 review.date_requested,
@@ -811,10 +1274,8 @@ def export_review_data(data):
                 review.request_to_accept,
                 review.accept_to_complete,
             ]
-
-            all_rows.append(row)
-
-    return export_csv(all_rows)
+        if progress:
+            progress(done)
 
 
 def current_year():
@@ -839,7 +1300,7 @@ def get_year(request):
     return request.GET.get('year', current_year())
 
 
-@cache(600)
+@caching.cached(600, key=lambda year: int(year))
 def citation_data(year):
     articles = sm.Article.objects.filter(
         articlelink__year=year,
@@ -862,14 +1323,10 @@ def get_journal_citations(journal):
     return articles
 
 
-def write_doi_tsv_report(to_write, journal=None, crosscheck=False):
-    """ Writes a TSV of DOI and pointed URLS to the passed object
-    :param to_write: An file-like object that can be written to
-    :param journal: An optional Journal object to filter the report by
-    :param crosscheck: A bool flag for returning URLs to full-text instead
-    :return: The Same file-like object passed as an argument
+def get_doi_identifiers(journal=None):
+    """ Returns the DOIs of published articles, optionally for a single journal
+    :param journal: An optional Journal object to filter the DOIs by
     """
-    writer = csv.writer(to_write, delimiter="\t", lineterminator='\n')
     identifiers = id_models.Identifier.objects.filter(
         article__isnull=False,
         article__stage=sm.STAGE_PUBLISHED,
@@ -878,12 +1335,73 @@ def write_doi_tsv_report(to_write, journal=None, crosscheck=False):
 
     if journal:
         identifiers = identifiers.filter(article__journal=journal)
-    identifiers = identifiers.order_by("article__journal", "id")
+    return identifiers.order_by("article__journal", "id")
 
+
+def write_doi_tsv_report(
+    to_write, journal=None, crosscheck=False, progress=None,
+):
+    """ Writes a TSV of DOI and pointed URLS to the passed object
+    :param to_write: An file-like object that can be written to
+    :param journal: An optional Journal object to filter the report by
+    :param crosscheck: A bool flag for returning URLs to full-text instead
+    :param progress: An optional callable receiving the DOIs written so far
+    :return: The Same file-like object passed as an argument
+    """
+    writer = csv.writer(to_write, delimiter="\t", lineterminator='\n')
     writer.writerow(["DOI", "URL"])
+
+    if journal is None and parallel.enabled():
+        # Journals are the first key of the order of get_doi_identifiers
+        journals = jm.Journal.objects.filter(
+            pk__in=get_doi_identifiers().values('article__journal'),
+        ).order_by('pk')
+        units = parallel.map_units(
+            lambda journal_: list(doi_rows(journal_, crosscheck)),
+            journals,
+        )
+        rows = chain.from_iterable(units)
+    else:
+        rows = doi_rows(journal, crosscheck)
+
+    for done, article_rows in enumerate(rows, 1):
+        writer.writerows(article_rows)
+        instrumentation.add_rows(len(article_rows))
+        if progress:
+            progress(done)
+
+    return to_write
+
+
+def doi_rows(journal, crosscheck):
+    """ Yields the rows of write_doi_tsv_report for each DOI of a journal
+    :return: A generator of lists of (DOI, URL), the article's DOI followed
+        by the DOIs of its supplementary files
+    """
+    identifiers = get_doi_identifiers(journal).select_related(
+        'article',
+        'article__journal',
+    )
+
+    supp_files = defaultdict(list)
+    if crosscheck:
+        identifiers = identifiers.annotate(
+            has_pdf=Exists(core_models.Galley.objects.filter(
+                article_id=OuterRef('article_id'),
+                file__mime_type__in=files.PDF_MIMETYPES,
+            )),
+        )
+    else:
+        # Supplementary file DOIs, fetched in one query for all articles
+        for supp_file in core_models.SupplementaryFile.objects.filter(
+            file__article_id__in=identifiers.values('article_id'),
+            doi__isnull=False,
+        ).select_related('file'):
+            supp_files[supp_file.file.article_id].append(supp_file)
+
     for identifier in identifiers:
         article = identifier.article
-        if crosscheck and article.pdfs.exists():
+        if crosscheck and identifier.has_pdf:
             path = reverse('serve_article_pdf',
                 kwargs={
                     "identifier_type": "id",
@@ -893,17 +1411,10 @@ def write_doi_tsv_report(to_write, journal=None, crosscheck=False):
             url = article.journal.site_url(path)
         else:
             url = article.url
-        writer.writerow((identifier.identifier, url))
-
-        # Supplementary file DOIs
-        if not crosscheck:
-            for supp_file in core_models.SupplementaryFile.objects.filter(
-                file__article_id=article.pk,
-                doi__isnull=False,
-            ):
-                writer.writerow((supp_file.doi, supp_file.url()))
-
-    return to_write
+        yield [(identifier.identifier, url)] + [
+            (supp_file.doi, supp_file.url())
+            for supp_file in supp_files[article.pk]
+        ]
 
 
 def license_report(start, end):
@@ -1027,3 +1538,119 @@ def manager_metrics_summary(repository, start_date, end_date):
         )
     )
     return preprints
+
+
+WatermarkSource = namedtuple('WatermarkSource', ['model', 'fields'])
+
+# Only the MAX of each field is read, which is answered from its index
+# without scanning the table, as the watermark is computed on every request.
+ACCESS_WATERMARK = WatermarkSource(mm.ArticleAccess, ('id', 'accessed'))
+ARTICLE_WATERMARK = WatermarkSource(sm.Article, ('id', 'last_modified'))
+CITATION_WATERMARK = WatermarkSource(mm.ArticleLink, ('id',))
+JOURNAL_WATERMARK = WatermarkSource(jm.Journal, ('id',))
+USER_WATERMARK = WatermarkSource(core_models.AccountRole, ('id',))
+REVIEW_WATERMARK = WatermarkSource(rm.ReviewAssignment, ('id',))
+PRODUCTION_WATERMARK = WatermarkSource(pm.TypesetTask, ('id',))
+IDENTIFIER_WATERMARK = WatermarkSource(id_models.Identifier, ('id',))
+SNAPSHOT_WATERMARK = WatermarkSource(models.ReportSnapshot, ('id', 'computed'))
+
+Watermark = namedtuple('Watermark', ['etag', 'last_modified'])
+
+
+def get_data_watermark(sources):
+    """ Returns the cheap aggregates that change whenever a report's data does
+    :param sources: an iterable of WatermarkSource
+    :return: A tuple of (list of aggregate values, latest datetime found)
+    """
+    values = []
+    last_modified = None
+    for source in sources:
+        aggregates = {
+            'max_{}'.format(field): Max(field) for field in source.fields
+        }
+        result = source.model.objects.order_by().aggregate(**aggregates)
+        for key in sorted(result):
+            value = result[key]
+            values.append(value)
+            if isinstance(value, datetime):
+                if last_modified is None or value > last_modified:
+                    last_modified = value
+
+    return values, last_modified
+
+
+def normalise_report_parameters(request, view_kwargs=None):
+    """ Returns the parameters that identify a rendering of a report
+    The querystring is sorted so that equivalent URLs share a watermark. The
+    user and CSRF token are included as the rendered page embeds both.
+    """
+    params = sorted(
+        (key, tuple(sorted(request.GET.getlist(key))))
+        for key in request.GET
+    )
+    csrf_token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return (
+        request.path,
+        tuple(sorted((view_kwargs or {}).items())),
+        tuple(params),
+        getattr(getattr(request, 'journal', None), 'pk', None),
+        getattr(request.user, 'pk', None),
+        csrf_token,
+    )
+
+
+def report_dates(request):
+    """ The dates a report request resolves to, which change over time when
+    they are left to their defaults, and the current date for the reports
+    that default to the current year
+    """
+    start_date, end_date = get_start_and_end_date(request)
+    return (
+        str(start_date),
+        str(end_date),
+        request.GET.get('start_month', get_first_month_year()),
+        request.GET.get('end_month', get_current_month_year()),
+        timezone.localdate().isoformat(),
+    )
+
+
+def get_report_watermark(request, report, sources, view_kwargs=None):
+    """ Builds the ETag and Last-Modified values for a report request
+    :param request: HttpRequest object
+    :param report: str, the name of the report
+    :param sources: an iterable of WatermarkSource the report reads from
+    :param view_kwargs: the keyword arguments passed to the view
+    :return: A Watermark
+    """
+    values, last_modified = get_data_watermark(sources)
+    fingerprint = repr((
+        report,
+        normalise_report_parameters(request, view_kwargs),
+        report_dates(request),
+        values,
+    ))
+    etag = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    return Watermark(etag, last_modified)
+
+
+def instrumentation_summary(since):
+    """ Aggregates the recorded report executions since the given datetime
+    :param since: an aware datetime
+    :return: A tuple of (per report aggregates, slowest executions)
+    """
+    executions = models.ReportExecution.objects.filter(started__gte=since)
+    per_report = executions.values('report').annotate(
+        executions=Count('id'),
+        average_duration=Avg('duration'),
+        max_duration=Max('duration'),
+        average_queries=Avg('query_count'),
+        average_query_duration=Avg('query_duration'),
+        total_rows=Sum('rows'),
+        total_bytes=Sum('bytes_sent'),
+        cache_hits=Sum('cache_hits'),
+        cache_misses=Sum('cache_misses'),
+    ).order_by('-max_duration')
+    slowest = executions.select_related('user').order_by('-duration')[:25]
+
+    return per_report, slowest
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from plugins.reporting import counter, leaderboards, models
+
+
+class Command(BaseCommand):
+    """ Summarises article accesses into daily COUNTER usage"""
+
+    help = (
+        "Builds the daily COUNTER Release 5 usage of every article up to "
+        "yesterday, starting after the last day built, then refreshes the "
+        "most accessed articles leaderboards. Run it from cron; COUNTER "
+        "reports summarise the days not built yet on the fly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            default=False,
+            help='Rebuild every day that still has raw accesses.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            state = models.CompactionState.get()
+            state.counted_before = state.compacted_before
+            state.save()
+        built = counter.build(log=self.stdout.write)
+        self.stdout.write('Built {} days of COUNTER usage'.format(built))
+        entries = leaderboards.refresh()
+        self.stdout.write('Stored {} leaderboard entries'.format(entries))
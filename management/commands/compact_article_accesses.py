@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plugins.reporting import rollups
+
+
+class Command(BaseCommand):
+    """ Rolls up old ArticleAccess rows and optionally deletes them"""
+
+    help = (
+        "Summarises raw article accesses older than --older-than-days into "
+        "daily rollups. With --delete, the verified raw rows are removed "
+        "afterwards, optionally archived to --archive-dir first. Reports "
+        "read compacted days from the rollups. Run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=395,
+            help='Only compact days at least this old (default 395).',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            default=False,
+            help='Delete raw accesses once they are rolled up and verified.',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Write the raw accesses of each day to a gzipped CSV in this '
+                 'directory before deleting them.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of raw accesses deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 1:
+            raise CommandError('--older-than-days must be at least 1')
+        archive_dir = options['archive_dir']
+        if archive_dir and not os.path.isdir(archive_dir):
+            raise CommandError('{} is not a directory'.format(archive_dir))
+
+        try:
+            rollups.compact(
+                options['older_than_days'],
+                delete=options['delete'],
+                archive_dir=archive_dir,
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except rollups.CompactionError as e:
+            raise CommandError(str(e))
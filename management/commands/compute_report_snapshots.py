@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from plugins.reporting import snapshots
+
+
+class Command(BaseCommand):
+    """ Precomputes reports for the standard periods"""
+
+    help = (
+        "Computes and stores the press, article, geographical and license "
+        "reports for last month, last quarter and year to date, for the "
+        "press and every journal. Report views serve these snapshots when "
+        "their dates match. Run it nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report',
+            action='append',
+            choices=list(snapshots.REPORTS),
+            help='Only compute this report, can be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        computed = snapshots.compute_all(
+            reports=options['report'],
+            log=self.stdout.write,
+        )
+        self.stdout.write('Computed {} snapshots'.format(computed))
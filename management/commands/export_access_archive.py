@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plugins.reporting import columnar
+
+
+class Command(BaseCommand):
+    """ Appends new article and preprint accesses to a Parquet archive"""
+
+    help = (
+        "Exports the ArticleAccess and PreprintAccess rows added since the "
+        "last run, up to REPORTING_ARCHIVE_LAG_SECONDS ago, to monthly "
+        "partitioned Parquet files in a directory, for offline analysis. "
+        "Needs pyarrow. Run it from cron, before compact_article_accesses "
+        "--delete: it refuses to continue an archive whose next accesses "
+        "have been deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='The archive directory.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100000,
+            help='Number of accesses read and written at a time.',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError('{} is not a directory'.format(directory))
+        try:
+            exported = columnar.export(
+                directory,
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except columnar.ArchiveError as e:
+            raise CommandError(str(e))
+        for name, count in exported.items():
+            self.stdout.write('Exported {} new {} rows'.format(count, name))
@@ -1,50 +1,322 @@
+from collections import namedtuple
+from datetime import timedelta
 
 from django.db import connection
-from django.db.utils import OperationalError, ProgrammingError
-from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.db.utils import DatabaseError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
+from identifiers import models as id_models
+from journal import models as jm
+from metrics import models as mm
+from review import models as rm
+from submission import models as sm
 from utils.logger import get_logger
 
+from plugins.reporting import logic, months
+
 logger = get_logger(__name__)
 
 
+ReportIndex = namedtuple(
+    'ReportIndex',
+    ['name', 'model', 'columns', 'include', 'where', 'method', 'reports'],
+)
+
+# Each index lists the reports whose queries it serves. Backends that lack a
+# feature get the nearest equivalent: BRIN becomes btree, INCLUDE columns are
+# appended to the key and, on MySQL, the partial predicate column leads it.
+REPORT_INDEXES = [
+    ReportIndex(
+        name='reporting_access_accessed_brin',
+        model=mm.ArticleAccess,
+        columns=['accessed'],
+        include=[],
+        where=None,
+        method='brin',
+        reports=['press', 'usage_by_month', 'geo'],
+    ),
+    ReportIndex(
+        name='reporting_access_downloads_idx',
+        model=mm.ArticleAccess,
+        columns=['article_id', 'accessed'],
+        include=['galley_type'],
+        where=('type', 'download'),
+        method='btree',
+        reports=['articles', 'press'],
+    ),
+    ReportIndex(
+        name='reporting_access_views_idx',
+        model=mm.ArticleAccess,
+        columns=['article_id', 'accessed'],
+        include=['galley_type'],
+        where=('type', 'view'),
+        method='btree',
+        reports=['articles', 'press'],
+    ),
+    ReportIndex(
+        name='reporting_access_covering_idx',
+        model=mm.ArticleAccess,
+        columns=['article_id', 'accessed', 'type', 'galley_type'],
+        include=['country_id'],
+        where=None,
+        method='btree',
+        reports=['articles', 'usage_by_month', 'geo'],
+    ),
+    ReportIndex(
+        name='reporting_review_requested_idx',
+        model=rm.ReviewAssignment,
+        columns=['article_id', 'date_requested'],
+        include=['date_accepted', 'date_complete'],
+        where=None,
+        method='btree',
+        reports=['review'],
+    ),
+    ReportIndex(
+        name='reporting_articlelink_year_idx',
+        model=mm.ArticleLink,
+        columns=['year', 'article_id'],
+        include=[],
+        where=None,
+        method='btree',
+        reports=['citations'],
+    ),
+    ReportIndex(
+        name='reporting_identifier_doi_idx',
+        model=id_models.Identifier,
+        columns=['article_id', 'id'],
+        include=['identifier'],
+        where=('id_type', 'doi'),
+        method='btree',
+        reports=['crossref'],
+    ),
+]
+
+# Indexes created by earlier versions of this command, now superseded
+LEGACY_INDEXES = {
+    'articleaccess_accessed_idx': mm.ArticleAccess,
+    'articleaccess_accessed_article_idx': mm.ArticleAccess,
+}
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def build_postgresql(index):
+    sql = 'CREATE INDEX CONCURRENTLY {name} ON {table} USING {method} ({cols})'
+    if index.include and index.method == 'btree':
+        sql += ' INCLUDE ({include})'
+    if index.where:
+        sql += ' WHERE {where}'
+    return sql
+
+
+def build_sqlite(index):
+    sql = 'CREATE INDEX {name} ON {table} ({cols})'
+    if index.where:
+        sql += ' WHERE {where}'
+    return sql
+
+
+def build_mysql(index):
+    return 'CREATE INDEX {name} ON {table} ({cols}) ALGORITHM=INPLACE LOCK=NONE'
+
+
+BUILDERS = {
+    'postgresql': build_postgresql,
+    'sqlite': build_sqlite,
+    'mysql': build_mysql,
+}
+
+
+def index_sql(index, vendor):
+    """ Renders the CREATE INDEX statement of an index for a database vendor
+    :param index: A ReportIndex
+    :param vendor: str, a django connection vendor
+    :return: str, the SQL statement
+    """
+    columns = list(index.columns)
+    if vendor != 'postgresql' or index.method != 'btree':
+        columns += [col for col in index.include if col not in columns]
+    if vendor == 'mysql' and index.where:
+        columns.insert(0, index.where[0])
+
+    where = None
+    if index.where:
+        column, value = index.where
+        where = "{} = '{}'".format(quote(column), value)
+
+    return BUILDERS[vendor](index).format(
+        name=quote(index.name),
+        table=quote(index.model._meta.db_table),
+        method=index.method,
+        cols=', '.join(quote(col) for col in columns),
+        include=', '.join(quote(col) for col in index.include),
+        where=where,
+    )
+
+
+def report_querysets(start, end):
+    """ Returns representative querysets for each report, used for EXPLAIN"""
+    journal = jm.Journal.objects.order_by('pk').first()
+    journals = jm.Journal.objects.filter(is_remote=False)
+    starts = months.boundaries(start, end, months.report_timezone())
+    return {
+        'articles': logic.get_articles(journal, start, end),
+        # The uncached function, which returns the queryset itself
+        'press': logic.press_journal_report_data.__wrapped__(
+            journals, start, end,
+        ),
+        'usage_by_month': logic.journal_usage_by_month_queryset(
+            journals, starts,
+        ),
+        'geo': logic.country_usage_queryset(
+            None, Q(accessed__gte=start, accessed__lte=end), starts,
+        ),
+        'review': rm.ReviewAssignment.objects.filter(
+            article__journal=journal,
+            date_accepted__isnull=False,
+            date_complete__isnull=False,
+            date_requested__gte=start,
+            date_requested__lte=end,
+        ),
+        'citations': sm.Article.objects.filter(
+            articlelink__year=end.year,
+        ),
+        'crossref': logic.get_doi_identifiers(journal),
+    }
+
+
 class Command(BaseCommand):
-    """ A management that generates metrics indexes for faster reporting"""
+    """ Creates the indexes that serve the access patterns of each report"""
 
     help = "Generates database indexes on metrics for faster reporting"
 
-    METRICS_INDEXES = {
-        # We use GIN over GiST indexes as the former are more performant during
-        # Lookups at the expense of lower build/update performance
-        # https://www.postgresql.org/docs/current/textsearch-indexes.html
-        "postgresql": [
-            """
-            CREATE INDEX IF NOT EXISTS articleaccess_accessed_idx
-            ON public.metrics_articleaccess USING btree
-            (accessed ASC NULLS LAST);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS articleaccess_accessed_article_idx
-            ON public.metrics_articleaccess USING btree
-            (accessed ASC NULLS LAST, article_id ASC NULLS LAST,
-            id ASC NULLS LAST,
-            type COLLATE pg_catalog."default" ASC NULLS LAST
-            );
-            """
-        ],
-    }
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            default=False,
+            help='Print the statements and current query plans only.',
+        )
+        parser.add_argument(
+            '--no-explain',
+            action='store_true',
+            default=False,
+            help='Skip printing EXPLAIN output for the report queries.',
+        )
+        parser.add_argument(
+            '--drop-legacy',
+            action='store_true',
+            default=False,
+            help='Drop the indexes created by earlier versions of this '
+                 'command once their replacements exist.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Size of the date range used for the EXPLAIN queries.',
+        )
 
     def handle(self, *args, **options):
-        cursor = connection.cursor()
-        if connection.vendor in self.METRICS_INDEXES:
-            for sql in self.METRICS_INDEXES[connection.vendor]:
-                try:
-                    cursor.execute(sql)
-                except (OperationalError, ProgrammingError) as e:
-                    logger.debug(e)
-                    pass # Ignore if already exists
-        else:
-            logger.warning(
-                "Metrics indexing on %s backend not supported",
-                connection.vendor,
+        vendor = connection.vendor
+        if vendor not in BUILDERS:
+            raise CommandError(
+                "Metrics indexing on {} backend not supported".format(vendor)
+            )
+
+        dry_run = options['dry_run']
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+        querysets = {}
+        if not options['no_explain']:
+            querysets = report_querysets(start, end)
+            self.explain(querysets, 'before')
+
+        failed = []
+        for index in REPORT_INDEXES:
+            sql = index_sql(index, vendor)
+            state = self.index_state(index.model, index.name)
+            if state == 'valid':
+                self.stdout.write('{} already exists'.format(index.name))
+                continue
+            if state == 'invalid':
+                sql = 'DROP INDEX CONCURRENTLY {}; {}'.format(
+                    quote(index.name), sql,
+                )
+
+            self.stdout.write('{}\n  serves: {}\n  {}'.format(
+                index.name, ', '.join(index.reports), sql,
+            ))
+            if dry_run:
+                continue
+            try:
+                with connection.cursor() as cursor:
+                    for statement in sql.split('; '):
+                        cursor.execute(statement)
+            except DatabaseError as e:
+                logger.error('Failed to create %s: %s', index.name, e)
+                self.stderr.write('Failed to create {}: {}'.format(
+                    index.name, e,
+                ))
+                failed.append(index.name)
+
+        if options['drop_legacy'] and not failed:
+            self.drop_legacy(dry_run)
+
+        if querysets and not dry_run:
+            self.explain(querysets, 'after')
+
+        if failed:
+            raise CommandError(
+                'Could not create: {}'.format(', '.join(failed))
             )
+
+    def index_state(self, model, name):
+        """ Returns 'valid', 'invalid' or None if the index doesn't exist"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table,
+            )
+            if name not in constraints:
+                return None
+            if connection.vendor == 'postgresql':
+                # A failed CONCURRENTLY build leaves an invalid index behind
+                cursor.execute(
+                    'SELECT i.indisvalid FROM pg_index i '
+                    'JOIN pg_class c ON c.oid = i.indexrelid '
+                    'WHERE c.relname = %s',
+                    [name],
+                )
+                row = cursor.fetchone()
+                if row and not row[0]:
+                    return 'invalid'
+        return 'valid'
+
+    def drop_legacy(self, dry_run):
+        for name, model in LEGACY_INDEXES.items():
+            if not self.index_state(model, name):
+                continue
+            if connection.vendor == 'postgresql':
+                sql = 'DROP INDEX CONCURRENTLY {}'.format(quote(name))
+            elif connection.vendor == 'mysql':
+                sql = 'DROP INDEX {} ON {}'.format(
+                    quote(name), quote(model._meta.db_table),
+                )
+            else:
+                sql = 'DROP INDEX {}'.format(quote(name))
+            self.stdout.write(sql)
+            if not dry_run:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql)
+
+    def explain(self, querysets, label):
+        for report, queryset in querysets.items():
+            self.stdout.write('-- EXPLAIN {} ({})'.format(report, label))
+            try:
+                self.stdout.write(queryset.explain())
+            except DatabaseError as e:
+                self.stderr.write('Could not explain {}: {}'.format(report, e))
@@ -0,0 +1,87 @@
+from dateutil.parser import parse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.utils import timezone
+
+from plugins.reporting.synthetic import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    """ Bulk inserts a reproducible synthetic data set for benchmarking"""
+
+    help = "Generates synthetic journals, articles and usage for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journals', type=int, default=3)
+        parser.add_argument(
+            '--articles', type=int, default=100,
+            help='Number of articles per journal.',
+        )
+        parser.add_argument(
+            '--accesses', type=int, default=100000,
+            help='Total number of article accesses.',
+        )
+        parser.add_argument(
+            '--reviews', type=int, default=2,
+            help='Average number of review assignments per article.',
+        )
+        parser.add_argument(
+            '--links', type=int, default=3,
+            help='Average number of citing works per cited article.',
+        )
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument(
+            '--preprints', type=int, default=0,
+            help='Number of preprints, added to the first repository.',
+        )
+        parser.add_argument('--preprint-accesses', type=int, default=0)
+        parser.add_argument(
+            '--months', type=int, default=36,
+            help='How far back in time the data set reaches.',
+        )
+        parser.add_argument(
+            '--until',
+            help='End date of the data set (YYYY-MM-DD), defaults to now. '
+                 'Fix it to get identical timestamps between runs.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='BMK',
+            help='Prefix for the codes of the generated journals.',
+        )
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            until = timezone.make_aware(parse(options['until']))
+        generator = SyntheticDataGenerator(
+            until=until,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            months=options['months'],
+            prefix=options['prefix'],
+            log=self.stdout.write,
+        )
+        try:
+            created = generator.generate(
+                journals=options['journals'],
+                articles=options['articles'],
+                accesses=options['accesses'],
+                reviews=options['reviews'],
+                links=options['links'],
+                users=options['users'],
+                preprints=options['preprints'],
+                preprint_accesses=options['preprint_accesses'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        except IntegrityError as e:
+            raise CommandError(
+                'Could not insert the data set with the prefix {}, some of '
+                'it may already exist: {}'.format(options['prefix'], e)
+            )
+
+        for name, count in created.items():
+            self.stdout.write('{}: {}'.format(name, count))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from plugins.reporting import instrumentation
+
+
+class Command(BaseCommand):
+    """ Deletes the report timings past their retention period"""
+
+    help = (
+        "Deletes the stored report executions started more than "
+        "REPORTING_EXECUTION_RETENTION_DAYS days ago. Run it nightly from "
+        "cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of executions deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = instrumentation.prune_executions(
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write('Deleted {} report executions'.format(deleted))
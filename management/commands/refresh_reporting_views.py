@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from plugins.reporting import matviews
+
+
+class Command(BaseCommand):
+    """ Creates and refreshes the monthly usage materialized views"""
+
+    help = (
+        "Creates (if needed) and refreshes the PostgreSQL materialized views "
+        "used for monthly usage reports. Run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            default=False,
+            help='Drop the views, so reports go back to live queries.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Materialized views are only supported on PostgreSQL, '
+                'reports use live queries on {}'.format(connection.vendor)
+            )
+
+        started = timezone.now()
+        for model, select, unique_columns in matviews.definitions():
+            table = model._meta.db_table
+            if options['drop']:
+                matviews.drop(model)
+                self.stdout.write('Dropped {}'.format(table))
+                continue
+
+            matviews.create(model, select, unique_columns)
+            start = time.monotonic()
+            matviews.refresh(model)
+            self.stdout.write('Refreshed {} in {:.1f}s'.format(
+                table, time.monotonic() - start,
+            ))
+        if not options['drop']:
+            matviews.mark_refreshed(started)
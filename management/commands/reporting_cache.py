@@ -0,0 +1,113 @@
+import time
+
+from django.core.cache import cache as django_cache
+from django.core.management.base import BaseCommand, CommandError
+
+# Importing logic registers its cached functions
+from plugins.reporting import caching, logic  # noqa: F401
+
+# The length of the values printed by inspect
+REPR_LENGTH = 2000
+
+
+class Command(BaseCommand):
+    """ Lists, inspects and flushes the cached reporting results"""
+
+    help = (
+        "Lists the cached reporting results with their function, parameters, "
+        "age and freshness, shows the hit rate of each function, inspects an "
+        "entry or flushes the entries of a function or of all functions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['list', 'stats', 'inspect', 'flush'],
+        )
+        parser.add_argument(
+            '--function',
+            help='Only act on the entries of this function, '
+                 'e.g. plugins.reporting.logic.citation_data.',
+        )
+        parser.add_argument(
+            '--key',
+            help='The cache key of the entry to inspect.',
+        )
+
+    def handle(self, *args, **options):
+        function = options['function']
+        if function and function not in caching.FUNCTIONS:
+            raise CommandError('Unknown function {}, choose from: {}'.format(
+                function, ', '.join(sorted(caching.FUNCTIONS)),
+            ))
+        getattr(self, options['action'])(options)
+
+    def entries(self, function):
+        return sorted(
+            (
+                (key, entry) for key, entry in caching.registry().items()
+                if function is None or entry['function'] == function
+            ),
+            key=lambda item: (item[1]['function'], -item[1]['used']),
+        )
+
+    def list(self, options):
+        entries = self.entries(options['function'])
+        values = django_cache.get_many([key for key, _ in entries])
+        now = time.time()
+        for key, entry in entries:
+            value = values.get(key)
+            if value is None:
+                state = 'missing'
+            elif value[0] > now:
+                state = 'fresh'
+            else:
+                state = 'stale'
+            self.stdout.write('{}\n  {}{}\n  {}, used {:.0f}s ago'.format(
+                key,
+                entry['function'].rsplit('.', 1)[-1],
+                entry['parameters'],
+                state,
+                now - entry['used'],
+            ))
+        self.stdout.write('{} entries'.format(len(entries)))
+
+    def stats(self, options):
+        for name, (hits, misses) in caching.stats().items():
+            if options['function'] and name != options['function']:
+                continue
+            total = hits + misses
+            self.stdout.write('{}: {} hits, {} misses, {}'.format(
+                name,
+                hits,
+                misses,
+                '{:.0%} hit rate'.format(hits / total) if total else 'unused',
+            ))
+
+    def inspect(self, options):
+        key = options['key']
+        if not key:
+            raise CommandError('inspect requires --key, see the list action')
+        entry = caching.registry().get(key)
+        value = django_cache.get(key)
+        if entry:
+            self.stdout.write('Function: {}\nParameters: {}'.format(
+                entry['function'], entry['parameters'],
+            ))
+        if value is None:
+            raise CommandError('No cached value for {}'.format(key))
+        fresh_until, result = value
+        text = repr(result)
+        if len(text) > REPR_LENGTH:
+            text = '{}... ({} characters)'.format(
+                text[:REPR_LENGTH], len(text),
+            )
+        self.stdout.write('Fresh for: {:.0f}s\nType: {}\nValue: {}'.format(
+            fresh_until - time.time(),
+            type(result).__name__,
+            text,
+        ))
+
+    def flush(self, options):
+        flushed = caching.flush(options['function'])
+        self.stdout.write('Flushed {} entries'.format(flushed))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from plugins.reporting import jobs
+
+
+class Command(BaseCommand):
+    """ Runs queued report jobs"""
+
+    help = (
+        "Runs queued background report jobs until interrupted. Several "
+        "workers can run at once. Use --once to stop when the queue is empty, "
+        "e.g. when run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            default=False,
+            help='Exit once there are no more jobs to run.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Seconds to wait before polling an empty queue again.',
+        )
+
+    def handle(self, *args, **options):
+        jobs.work(
+            once=options['once'],
+            sleep=options['sleep'],
+            log=self.stdout.write,
+        )
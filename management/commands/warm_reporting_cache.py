@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from plugins.reporting import warming
+
+
+class Command(BaseCommand):
+    """ Pre-populates the reporting cache"""
+
+    help = (
+        "Computes the cached reporting functions for the press and every "
+        "journal over the default ranges of the report views: the current "
+        "month, the months of the current year and the current citation "
+        "year. Run it after deploys, cache flushes and nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--parallel',
+            type=int,
+            default=1,
+            help='The number of reports computed at once, default 1.',
+        )
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=None,
+            help='Do not start further reports after this many seconds.',
+        )
+
+    def handle(self, *args, **options):
+        warmed, skipped = warming.warm(
+            parallelism=max(options['parallel'], 1),
+            budget=options['budget'],
+            log=self.stdout.write,
+        )
+        self.stdout.write('Warmed {} entries, skipped {}'.format(
+            warmed, skipped,
+        ))
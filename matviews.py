@@ -0,0 +1,201 @@
+"""
+Optional PostgreSQL materialized views of monthly usage.
+
+The views are created and refreshed by the refresh_reporting_views management
+command. The logic layer checks is_available() before reading from them and
+falls back to the live ArticleAccess queries on other backends or when the
+views have not been created. The views only hold every access of the months
+that had ended when they were last refreshed; complete_before() tells where
+the live queries have to take over.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from metrics import models as mm
+from submission import models as sm
+from utils.logger import get_logger
+
+from plugins.reporting import models, months
+
+logger = get_logger(__name__)
+
+# How long the list of populated views is trusted before checking again
+AVAILABILITY_TTL = 300
+_available = {'checked': 0, 'views': frozenset(), 'refreshed': None}
+
+
+def month_expression(column, tz):
+    """ Truncates a timestamp column to the month, in the report timezone"""
+    return (
+        "(date_trunc('month', {column} AT TIME ZONE '{tz}')"
+        " AT TIME ZONE '{tz}')".format(column=column, tz=tz)
+    )
+
+
+def access_source():
+    """ One row per raw access or compacted rollup row, weighted by n
+    Rollup rows only count for days whose raw rows have been deleted.
+    """
+    tz = months.timezone_name().replace("'", "''")
+    return """
+        SELECT aa.article_id, a.journal_id, a.stage, {access_month} AS month,
+            aa.type, aa.galley_type, aa.country_id, 1 AS n
+        FROM {access} aa JOIN {article} a ON a.id = aa.article_id
+        UNION ALL
+        SELECT r.article_id, a.journal_id, a.stage,
+            (date_trunc('month', r.date::timestamp) AT TIME ZONE '{tz}'),
+            r.type, r.galley_type, r.country_id, r.count
+        FROM {rollup} r JOIN {article} a ON a.id = r.article_id
+        WHERE r.date < COALESCE(
+            (SELECT compacted_before FROM {state} WHERE id = 1),
+            '-infinity'::date
+        )
+    """.format(
+        access_month=month_expression('aa.accessed', tz),
+        access=mm.ArticleAccess._meta.db_table,
+        article=sm.Article._meta.db_table,
+        rollup=models.ArticleAccessRollup._meta.db_table,
+        state=models.CompactionState._meta.db_table,
+        tz=tz,
+    )
+
+
+def definitions():
+    """ Returns (model, select SQL, unique columns) for each view"""
+    source = '({}) aa'.format(access_source())
+    published = sm.STAGE_PUBLISHED.replace("'", "''")
+
+    return [
+        (
+            models.MonthlyJournalUsage,
+            """
+            SELECT row_number() OVER () AS id, journal_id, month, type,
+                has_galley, total
+            FROM (
+                SELECT aa.journal_id, aa.month, aa.type,
+                    aa.galley_type IS NOT NULL AS has_galley,
+                    SUM(aa.n) AS total
+                FROM {source}
+                GROUP BY 1, 2, 3, 4
+            ) usage
+            """.format(source=source),
+            ['journal_id', 'month', 'type', 'has_galley'],
+        ),
+        (
+            models.MonthlyCountryUsage,
+            """
+            SELECT row_number() OVER () AS id, journal_id, country_id,
+                month, total
+            FROM (
+                SELECT aa.journal_id, COALESCE(aa.country_id, 0) AS country_id,
+                    aa.month,
+                    SUM(CASE WHEN aa.country_id IS NULL THEN 0 ELSE aa.n END)
+                        AS total
+                FROM {source}
+                WHERE aa.stage = '{published}'
+                GROUP BY 1, 2, 3
+            ) usage
+            """.format(source=source, published=published),
+            ['journal_id', 'country_id', 'month'],
+        ),
+        (
+            models.MonthlyArticleUsage,
+            """
+            SELECT row_number() OVER () AS id, article_id, journal_id, month,
+                type, galley_type, total
+            FROM (
+                SELECT aa.article_id, aa.journal_id, aa.month, aa.type,
+                    COALESCE(aa.galley_type, '') AS galley_type,
+                    SUM(aa.n) AS total
+                FROM {source}
+                GROUP BY 1, 2, 3, 4, 5
+            ) usage
+            """.format(source=source),
+            ['article_id', 'month', 'type', 'galley_type'],
+        ),
+    ]
+
+
+def supported():
+    return (
+        connection.vendor == 'postgresql'
+        and getattr(settings, 'REPORTING_USE_MATERIALIZED_VIEWS', True)
+    )
+
+
+def populated_views():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT matviewname FROM pg_matviews WHERE ispopulated',
+        )
+        return frozenset(row[0] for row in cursor.fetchall())
+
+
+def is_available(model):
+    """ Returns True if the materialized view behind model can be queried"""
+    if not supported():
+        return False
+    if time.monotonic() - _available['checked'] > AVAILABILITY_TTL:
+        _available['views'] = populated_views()
+        _available['refreshed'] = models.CompactionState.objects.filter(
+            pk=1,
+        ).values_list('views_refreshed', flat=True).first()
+        _available['checked'] = time.monotonic()
+    return model._meta.db_table in _available['views']
+
+
+def complete_before(tz):
+    """ The start, in tz, of the month in which the views were last refreshed
+    Months before it are complete in the views, later ones must be counted
+    live. Only meaningful once is_available() returned True.
+    :return: an aware datetime, or None when the refresh time is unknown
+    """
+    refreshed = _available['refreshed']
+    if refreshed is None:
+        return None
+    return months.boundaries(refreshed, refreshed, tz)[0]
+
+
+def create(model, select, unique_columns):
+    """ Creates a materialized view, without data, and its unique index"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE MATERIALIZED VIEW IF NOT EXISTS {} AS {} WITH NO DATA'.format(
+                table, select,
+            )
+        )
+        # REFRESH ... CONCURRENTLY requires a unique index over all rows
+        cursor.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS {table}_key ON {table} '
+            '({columns})'.format(table=table, columns=', '.join(unique_columns))
+        )
+
+
+def drop(model):
+    with connection.cursor() as cursor:
+        cursor.execute('DROP MATERIALIZED VIEW IF EXISTS {}'.format(
+            model._meta.db_table,
+        ))
+    _available['checked'] = 0
+
+
+def refresh(model):
+    """ Refreshes a view, concurrently unless it has never been populated"""
+    table = model._meta.db_table
+    concurrently = table in populated_views()
+    with connection.cursor() as cursor:
+        cursor.execute('REFRESH MATERIALIZED VIEW {}{}'.format(
+            'CONCURRENTLY ' if concurrently else '', table,
+        ))
+    _available['checked'] = 0
+
+
+def mark_refreshed(started):
+    """ Records when the refresh of every view started"""
+    state = models.CompactionState.get()
+    state.views_refreshed = started
+    state.save()
+    _available['checked'] = 0
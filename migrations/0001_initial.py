@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportExecution',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=2000)),
+                ('parameters', models.JSONField(blank=True, default=dict)),
+                ('started', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('duration', models.FloatField(default=0, help_text='Total time in seconds, including streaming.')),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('query_duration', models.FloatField(default=0, help_text='Time in seconds spent waiting on the database.')),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('bytes_sent', models.PositiveBigIntegerField(default=0)),
+                ('cache_hits', models.PositiveIntegerField(default=0)),
+                ('cache_misses', models.PositiveIntegerField(default=0)),
+                ('phases', models.JSONField(blank=True, default=dict)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-started',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reportexecution',
+            index=models.Index(fields=['report', 'started'], name='reporting_exec_report_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportexecution',
+            index=models.Index(fields=['duration'], name='reporting_exec_duration_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """ Unmanaged models for the optional materialized views, which are
+    created by the refresh_reporting_views management command.
+    """
+
+    dependencies = [
+        ('reporting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyArticleUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.IntegerField()),
+                ('journal_id', models.IntegerField()),
+                ('month', models.DateTimeField()),
+                ('type', models.CharField(max_length=20)),
+                ('galley_type', models.CharField(max_length=255)),
+                ('total', models.PositiveIntegerField()),
+            ],
+            options={
+                'db_table': 'reporting_monthly_article_usage',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyCountryUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_id', models.IntegerField()),
+                ('country_id', models.IntegerField()),
+                ('month', models.DateTimeField()),
+                ('total', models.PositiveIntegerField()),
+            ],
+            options={
+                'db_table': 'reporting_monthly_country_usage',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyJournalUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_id', models.IntegerField()),
+                ('month', models.DateTimeField()),
+                ('type', models.CharField(max_length=20)),
+                ('has_galley', models.BooleanField()),
+                ('total', models.PositiveIntegerField()),
+            ],
+            options={
+                'db_table': 'reporting_monthly_journal_usage',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '__first__'),
+        ('journal', '__first__'),
+        ('submission', '__first__'),
+        ('reporting', '0002_monthly_usage_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactionState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rolled_up_before', models.DateField(blank=True, null=True)),
+                ('compacted_before', models.DateField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArticleAccessRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(max_length=20)),
+                ('galley_type', models.CharField(blank=True, max_length=200, null=True)),
+                ('count', models.PositiveIntegerField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.article')),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.country')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='articleaccessrollup',
+            index=models.Index(fields=['date', 'journal'], name='reporting_rollup_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articleaccessrollup',
+            index=models.Index(fields=['article', 'date'], name='reporting_rollup_article_idx'),
+        ),
+    ]
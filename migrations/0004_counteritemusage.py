@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '__first__'),
+        ('submission', '__first__'),
+        ('reporting', '0003_articleaccessrollup_compactionstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compactionstate',
+            name='counted_before',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CounterItemUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_investigations', models.PositiveIntegerField(default=0)),
+                ('unique_investigations', models.PositiveIntegerField(default=0)),
+                ('total_requests', models.PositiveIntegerField(default=0)),
+                ('unique_requests', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.article')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+            options={
+                'unique_together': {('article', 'date')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='counteritemusage',
+            index=models.Index(fields=['date', 'journal'], name='reporting_counter_date_idx'),
+        ),
+    ]
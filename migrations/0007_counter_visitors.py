@@ -0,0 +1,34 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '__first__'),
+        ('reporting', '0006_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counteritemusage',
+            name='visitors',
+            field=models.BinaryField(blank=True, help_text='A HyperLogLog sketch of the distinct access identifiers.', null=True),
+        ),
+        migrations.CreateModel(
+            name='CounterJournalVisitors',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('visitors', models.BinaryField()),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+            options={
+                'unique_together': {('journal', 'date')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='counterjournalvisitors',
+            index=models.Index(fields=['date', 'journal'], name='reporting_visitors_date_idx'),
+        ),
+    ]
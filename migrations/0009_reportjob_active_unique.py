@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0008_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(status__in=['pending', 'running']),
+                fields=('report', 'parameters_hash', 'requested_by'),
+                name='reporting_job_active_unique',
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0009_reportjob_active_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compactionstate',
+            name='views_refreshed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,357 @@
+import os
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class ReportExecution(models.Model):
+    """ Timings and volumes recorded for a single request to a report"""
+    report = models.CharField(max_length=255)
+    path = models.CharField(max_length=2000)
+    parameters = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    started = models.DateTimeField(default=timezone.now)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration = models.FloatField(
+        default=0,
+        help_text='Total time in seconds, including streaming.',
+    )
+    query_count = models.PositiveIntegerField(default=0)
+    query_duration = models.FloatField(
+        default=0,
+        help_text='Time in seconds spent waiting on the database.',
+    )
+    rows = models.PositiveIntegerField(default=0)
+    bytes_sent = models.PositiveBigIntegerField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    cache_misses = models.PositiveIntegerField(default=0)
+    phases = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ('-started',)
+        indexes = [
+            models.Index(
+                fields=['report', 'started'],
+                name='reporting_exec_report_idx',
+            ),
+            models.Index(
+                fields=['duration'],
+                name='reporting_exec_duration_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} at {} ({:.2f}s)'.format(
+            self.report, self.started, self.duration,
+        )
+
+
+class MonthlyJournalUsage(models.Model):
+    """ Accesses per journal, month and type (PostgreSQL materialized view)"""
+    journal_id = models.IntegerField()
+    month = models.DateTimeField()
+    type = models.CharField(max_length=20)
+    has_galley = models.BooleanField()
+    total = models.PositiveIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'reporting_monthly_journal_usage'
+
+
+class MonthlyCountryUsage(models.Model):
+    """ Accesses to published articles per journal, country and month
+    (PostgreSQL materialized view). Unknown countries have a country_id of 0.
+    """
+    journal_id = models.IntegerField()
+    country_id = models.IntegerField()
+    month = models.DateTimeField()
+    total = models.PositiveIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'reporting_monthly_country_usage'
+
+
+class MonthlyArticleUsage(models.Model):
+    """ Accesses per article, month, type and galley type (PostgreSQL
+    materialized view). Abstract page views have an empty galley_type.
+    """
+    article_id = models.IntegerField()
+    journal_id = models.IntegerField()
+    month = models.DateTimeField()
+    type = models.CharField(max_length=20)
+    galley_type = models.CharField(max_length=255)
+    total = models.PositiveIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'reporting_monthly_article_usage'
+
+
+class ArticleAccessRollup(models.Model):
+    """ ArticleAccess rows summarised per day by compact_article_accesses.
+    The day is in the site timezone, as are the dates of the report forms.
+    """
+    article = models.ForeignKey(
+        'submission.Article',
+        on_delete=models.CASCADE,
+    )
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    type = models.CharField(max_length=20)
+    galley_type = models.CharField(max_length=200, blank=True, null=True)
+    country = models.ForeignKey(
+        'core.Country',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['date', 'journal'],
+                name='reporting_rollup_date_idx',
+            ),
+            models.Index(
+                fields=['article', 'date'],
+                name='reporting_rollup_article_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {} {}: {}'.format(
+            self.article_id, self.date, self.type, self.count,
+        )
+
+
+class CompactionState(models.Model):
+    """ Tracks how far ArticleAccess has been summarised and compacted.
+    Days before rolled_up_before have ArticleAccessRollup rows and days
+    before counted_before have CounterItemUsage rows. Days before
+    compacted_before have had their raw rows deleted, so reports read them
+    from the rollup instead. views_refreshed is when the materialized views
+    were last refreshed: months that ended before it are complete in them.
+    """
+    rolled_up_before = models.DateField(blank=True, null=True)
+    compacted_before = models.DateField(blank=True, null=True)
+    counted_before = models.DateField(blank=True, null=True)
+    views_refreshed = models.DateTimeField(blank=True, null=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get(cls):
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+    def __str__(self):
+        return 'Rolled up before {}, compacted before {}'.format(
+            self.rolled_up_before, self.compacted_before,
+        )
+
+
+class CounterItemUsage(models.Model):
+    """ COUNTER Release 5 item metrics of an article, per site-timezone day.
+    Unique counts are per user-session, so they can be summed over days.
+    """
+    article = models.ForeignKey(
+        'submission.Article',
+        on_delete=models.CASCADE,
+    )
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    total_investigations = models.PositiveIntegerField(default=0)
+    unique_investigations = models.PositiveIntegerField(default=0)
+    total_requests = models.PositiveIntegerField(default=0)
+    unique_requests = models.PositiveIntegerField(default=0)
+    visitors = models.BinaryField(
+        blank=True,
+        null=True,
+        help_text='A HyperLogLog sketch of the distinct access identifiers.',
+    )
+
+    class Meta:
+        unique_together = ('article', 'date')
+        indexes = [
+            models.Index(
+                fields=['date', 'journal'],
+                name='reporting_counter_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {}: {} requests'.format(
+            self.article_id, self.date, self.total_requests,
+        )
+
+
+class CounterJournalVisitors(models.Model):
+    """ A HyperLogLog sketch of the distinct access identifiers of a
+    journal's articles on a site-timezone day, built with CounterItemUsage.
+    """
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    visitors = models.BinaryField()
+
+    class Meta:
+        unique_together = ('journal', 'date')
+        indexes = [
+            models.Index(
+                fields=['date', 'journal'],
+                name='reporting_visitors_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.journal_id, self.date)
+
+
+class LeaderboardEntry(models.Model):
+    """ An article among the most accessed of a journal, or of the press
+    when journal is None, over a rolling period. Refreshed by
+    build_counter_usage from the CounterItemUsage rows.
+    """
+    period = models.CharField(max_length=20)
+    journal = models.ForeignKey(
+        'journal.Journal',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    rank = models.PositiveSmallIntegerField()
+    article = models.ForeignKey(
+        'submission.Article',
+        on_delete=models.CASCADE,
+    )
+    total = models.PositiveIntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()
+    computed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('period', 'journal', 'rank')
+        indexes = [
+            models.Index(
+                fields=['period', 'journal', 'rank'],
+                name='reporting_leaderboard_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {} #{}: {}'.format(
+            self.period, self.journal_id, self.rank, self.article_id,
+        )
+
+
+class ReportSnapshot(models.Model):
+    """ The data of a report for a standard period, computed ahead of time
+    by compute_report_snapshots and served instead of the live queries.
+    """
+    report = models.CharField(max_length=255)
+    journal = models.ForeignKey(
+        'journal.Journal',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    period = models.CharField(max_length=50)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    computed = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField(
+        default=0,
+        help_text='Time in seconds taken to compute the snapshot.',
+    )
+
+    class Meta:
+        unique_together = ('report', 'journal', 'start_date', 'end_date')
+
+    def __str__(self):
+        return '{} {} to {}'.format(self.report, self.start_date, self.end_date)
+
+
+class ReportJob(models.Model):
+    """ An expensive report run in the background by run_report_jobs"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    )
+
+    report = models.CharField(max_length=255)
+    parameters = models.JSONField(default=dict, blank=True)
+    parameters_hash = models.CharField(max_length=64)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Percentage done.',
+    )
+    rows = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    file_path = models.CharField(max_length=1000, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='reporting_job_status_idx',
+            ),
+            models.Index(
+                fields=['report', 'parameters_hash'],
+                name='reporting_job_hash_idx',
+            ),
+        ]
+        constraints = [
+            # One pending or running job per user and identical report
+            models.UniqueConstraint(
+                fields=['report', 'parameters_hash', 'requested_by'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='reporting_job_active_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.report, self.status)
+
+    @property
+    def filename(self):
+        return os.path.basename(self.file_path)
@@ -0,0 +1,255 @@
+"""
+Daily summaries of ArticleAccess and compaction of the raw access log.
+
+Raw rows older than a configurable age are folded into ArticleAccessRollup
+rows, one per article, day, type, galley type and country. Once verified, the
+raw rows can be archived and deleted. The reports keep reading raw rows for
+recent days and add the rollup counts for the compacted days, which is where
+rollup_range() draws the line.
+"""
+import csv
+from datetime import date, datetime, timedelta
+import gzip
+import os
+import time
+
+from dateutil.parser import parse
+
+from django.db import transaction
+from django.db.models import Count, Min, OuterRef, Subquery, Sum, IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from metrics import models as mm
+
+from plugins.reporting import models
+
+# How long the compaction boundary is trusted before reading it again
+STATE_TTL = 60
+_state = {'checked': 0, 'compacted_before': None}
+
+
+class CompactionError(Exception):
+    pass
+
+
+def compacted_before():
+    """ Returns the day before which raw accesses live only in the rollup"""
+    if time.monotonic() - _state['checked'] > STATE_TTL:
+        _state['compacted_before'] = models.CompactionState.objects.filter(
+            pk=1,
+        ).values_list('compacted_before', flat=True).first()
+        _state['checked'] = time.monotonic()
+    return _state['compacted_before']
+
+
+def to_local_datetime(value):
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        dt = datetime(value.year, value.month, value.day)
+    else:
+        dt = parse(str(value))
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return timezone.localtime(dt)
+
+
+def day_start(day):
+    """ The aware datetime at which a day starts in the site timezone"""
+    return timezone.make_aware(datetime(day.year, day.month, day.day))
+
+
+def rollup_range(start_date, end_date):
+    """ Returns the compacted days that fall inside a report range
+    Raw accesses for those days no longer exist, so callers add the rollup
+    counts for [first_day, last_day) to their raw counts.
+    :param start_date: the inclusive start of the report range
+    :param end_date: the end of the report range. A midnight end is treated
+        as exclusive, as the raw queries only match that single instant.
+    :return: A tuple of (first_day, last_day) or None
+    """
+    boundary = compacted_before()
+    if boundary is None:
+        return None
+    start = to_local_datetime(start_date)
+    end = to_local_datetime(end_date)
+    first_day = start.date()
+    last_day = end.date()
+    if end.time() != datetime.min.time():
+        last_day += timedelta(days=1)
+    last_day = min(last_day, boundary)
+    if first_day >= last_day:
+        return None
+    return first_day, last_day
+
+
+def rollups_in(day_range, **filters):
+    return models.ArticleAccessRollup.objects.filter(
+        date__gte=day_range[0],
+        date__lt=day_range[1],
+        **filters
+    )
+
+
+def with_rollup(raw_subquery, day_range, outer_field, exclude=None, **filters):
+    """ Adds the compacted counts to a raw count subquery
+    :param raw_subquery: a Subquery counting raw ArticleAccess rows
+    :param day_range: the result of rollup_range(), or None
+    :param outer_field: the rollup field matched against OuterRef('id')
+    :param exclude: optional exclude() kwargs, applied like the raw query's
+    :param filters: filter() kwargs, applied like the raw query's
+    """
+    if day_range is None:
+        return raw_subquery
+    rollups = rollups_in(day_range, **{outer_field: OuterRef('id')}, **filters)
+    if exclude:
+        rollups = rollups.exclude(**exclude)
+    rollup_subquery = Subquery(
+        rollups.order_by().values(outer_field).annotate(
+            total=Sum('count'),
+        ).values('total'),
+        output_field=IntegerField(),
+    )
+    return Coalesce(raw_subquery, 0) + Coalesce(rollup_subquery, 0)
+
+
+def rollup_count(day_range, exclude=None, **filters):
+    """ The compacted count matching the filters, 0 without a day range"""
+    if day_range is None:
+        return 0
+    rollups = rollups_in(day_range, **filters)
+    if exclude:
+        rollups = rollups.exclude(**exclude)
+    return rollups.aggregate(total=Sum('count'))['total'] or 0
+
+
+def raw_day(day):
+    return mm.ArticleAccess.objects.filter(
+        accessed__gte=day_start(day),
+        accessed__lt=day_start(day + timedelta(days=1)),
+    )
+
+
+def first_access_day():
+    first = mm.ArticleAccess.objects.aggregate(first=Min('accessed'))['first']
+    return timezone.localtime(first).date() if first else None
+
+
+def rollup_day(day):
+    """ Replaces the rollup rows of a day with a fresh summary of raw rows"""
+    rows = raw_day(day).order_by().values(
+        'article_id',
+        'article__journal_id',
+        'type',
+        'galley_type',
+        'country_id',
+    ).annotate(count=Count('id'))
+
+    with transaction.atomic():
+        models.ArticleAccessRollup.objects.filter(date=day).delete()
+        models.ArticleAccessRollup.objects.bulk_create([
+            models.ArticleAccessRollup(
+                article_id=row['article_id'],
+                journal_id=row['article__journal_id'],
+                date=day,
+                type=row['type'],
+                galley_type=row['galley_type'],
+                country_id=row['country_id'],
+                count=row['count'],
+            ) for row in rows
+        ], batch_size=5000)
+        verify_day(day)
+
+
+def verify_day(day):
+    """ Raises CompactionError unless the rollup matches the raw rows"""
+    raw = dict(raw_day(day).order_by().values_list(
+        'type',
+    ).annotate(total=Count('id')))
+    rolled = dict(models.ArticleAccessRollup.objects.filter(
+        date=day,
+    ).order_by().values_list('type').annotate(total=Sum('count')))
+    if raw != rolled:
+        raise CompactionError(
+            'Totals for {} do not match: raw {}, rollup {}'.format(
+                day, raw, rolled,
+            )
+        )
+
+
+def archive_day(day, directory):
+    """ Writes the raw rows of a day to a gzipped CSV in directory"""
+    path = os.path.join(
+        directory, 'articleaccess-{}.csv.gz'.format(day.isoformat()),
+    )
+    fields = [
+        'id', 'article_id', 'type', 'identifier', 'accessed',
+        'galley_type', 'country_id',
+    ]
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as archive:
+        writer = csv.writer(archive)
+        writer.writerow(fields)
+        for row in raw_day(day).order_by('id').values_list(*fields).iterator():
+            writer.writerow(row)
+    return path
+
+
+def delete_day(day, batch_size):
+    """ Deletes the raw rows of a rolled up day and moves the boundary
+    Rows and boundary change in one transaction, so reports never see a day
+    both deleted and not yet read from the rollup.
+    """
+    with transaction.atomic():
+        verify_day(day)
+        deleted = 0
+        while True:
+            ids = list(
+                raw_day(day).order_by().values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            mm.ArticleAccess.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+        state = models.CompactionState.get()
+        state.compacted_before = day + timedelta(days=1)
+        state.save()
+    _state['checked'] = 0
+    return deleted
+
+
+def compact(older_than_days, delete=False, archive_dir=None, batch_size=10000,
+            log=None):
+    """ Rolls up, and optionally archives and deletes, old raw accesses
+    :param older_than_days: int, days younger than this are left untouched
+    :param delete: bool, delete the raw rows once they are rolled up
+    :param archive_dir: optional directory to archive raw rows to first
+    :param batch_size: int, number of raw rows deleted per statement
+    :param log: optional callable receiving progress messages
+    """
+    log = log or (lambda message: None)
+    cutoff = timezone.localdate() - timedelta(days=older_than_days)
+    state = models.CompactionState.get()
+
+    day = state.rolled_up_before or first_access_day()
+    while day and day < cutoff:
+        rollup_day(day)
+        state.rolled_up_before = day + timedelta(days=1)
+        state.save()
+        log('Rolled up {}'.format(day))
+        day += timedelta(days=1)
+
+    if not delete:
+        return
+
+    # COUNTER unique metrics can only be computed from the raw rows
+    from plugins.reporting import counter
+    counter.build(until=min(cutoff, state.rolled_up_before or cutoff), log=log)
+
+    day = state.compacted_before or first_access_day()
+    while day and day < min(cutoff, state.rolled_up_before or day):
+        if archive_dir:
+            log('Archived {}'.format(archive_day(day, archive_dir)))
+        deleted = delete_day(day, batch_size)
+        log('Deleted {} raw accesses for {}'.format(deleted, day))
+        day += timedelta(days=1)
@@ -0,0 +1,171 @@
+"""
+Routing of reporting queries to a read replica.
+
+Add 'plugins.reporting.routers.ReportingRouter' to DATABASE_ROUTERS and set
+REPORTING_DATABASE to the alias of a replica. Reads made while a report is
+running, that is inside a view recorded by instrumentation.report or inside
+reading(), then go to that alias and everything else, including all writes,
+stays on the default database. Only the models of the apps in
+REPORTING_DATABASE_APPS are routed, never the cache table, sessions or the
+plugin's own job, snapshot and instrumentation bookkeeping, which are read
+back right after they are written. When REPORTING_DATABASE_MAX_LAG is set and
+the replica is further behind than that many seconds, reports read from the
+default database until it catches up.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from utils.logger import get_logger
+
+from plugins.reporting import instrumentation
+
+logger = get_logger(__name__)
+
+# How often, in seconds, the replication lag is checked
+LAG_CHECK_INTERVAL = 10
+
+# The apps whose models hold the data reports read
+REPORTING_APPS = (
+    'core', 'identifiers', 'journal', 'metrics', 'production', 'repository',
+    'reporting', 'review', 'submission',
+)
+# Models of those apps that are always read from the default database
+BOOKKEEPING_MODELS = {
+    ('reporting', 'reportexecution'),
+    ('reporting', 'reportjob'),
+    ('reporting', 'reportsnapshot'),
+}
+
+_local = threading.local()
+_lag_checks = {}
+
+LAG_QUERIES = {
+    'postgresql': (
+        "SELECT CASE "
+        "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+        "END"
+    ),
+    'mysql': 'SHOW SLAVE STATUS',
+}
+
+
+def configured_alias():
+    alias = getattr(settings, 'REPORTING_DATABASE', None)
+    if alias and alias not in settings.DATABASES:
+        logger.error('REPORTING_DATABASE %s is not in DATABASES', alias)
+        return None
+    return alias
+
+
+def replication_lag(alias):
+    """ The seconds the database of alias is behind its primary
+    :return: a float, 0 when it is not a replica, or None when unknown
+    """
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor)
+    if query is None:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        row = cursor.fetchone()
+        if connection.vendor == 'mysql':
+            if row is None:
+                return 0
+            columns = [column[0] for column in cursor.description]
+            row = (row[columns.index('Seconds_Behind_Master')],)
+    if row is None or row[0] is None:
+        # Not replicating, or replication is stopped on MySQL
+        return 0 if connection.vendor == 'postgresql' else None
+    return float(row[0])
+
+
+def is_fresh(alias):
+    """ Whether the replica is within REPORTING_DATABASE_MAX_LAG seconds"""
+    max_lag = getattr(settings, 'REPORTING_DATABASE_MAX_LAG', None)
+    if max_lag is None:
+        return True
+    checked, fresh = _lag_checks.get(alias, (None, None))
+    if checked is not None and time.monotonic() - checked < LAG_CHECK_INTERVAL:
+        return fresh
+    try:
+        lag = replication_lag(alias)
+    except DatabaseError as e:
+        logger.error('Could not check the lag of %s: %s', alias, e)
+        lag = None
+    fresh = lag is not None and lag <= max_lag
+    if not fresh:
+        logger.warning(
+            'Reporting from %s instead of %s, replication lag: %s',
+            DEFAULT_DB_ALIAS, alias, lag,
+        )
+    _lag_checks[alias] = (time.monotonic(), fresh)
+    return fresh
+
+
+def reporting_alias():
+    """ The alias reporting reads currently go to"""
+    alias = configured_alias()
+    if alias is None or alias == DEFAULT_DB_ALIAS or not is_fresh(alias):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def is_reporting():
+    return (
+        getattr(_local, 'reading', False)
+        or instrumentation.current() is not None
+    )
+
+
+@contextmanager
+def reading():
+    """ Routes the reads of this thread to the reporting database
+    For reports run outside of a view: jobs, snapshots and cache refreshes.
+    """
+    previous = getattr(_local, 'reading', False)
+    _local.reading = True
+    try:
+        yield
+    finally:
+        _local.reading = previous
+
+
+def is_report_data(model):
+    """ Whether the reads of a model may go to the reporting database"""
+    meta = model._meta
+    apps = getattr(settings, 'REPORTING_DATABASE_APPS', REPORTING_APPS)
+    return (
+        meta.app_label in apps
+        and (meta.app_label, meta.model_name) not in BOOKKEEPING_MODELS
+    )
+
+
+class ReportingRouter(object):
+    """ Sends the reads of reports to REPORTING_DATABASE"""
+
+    def db_for_read(self, model, **hints):
+        if is_reporting() and configured_alias() and is_report_data(model):
+            return reporting_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica are saved to the default database
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == configured_alias():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the default database
+        aliases = {DEFAULT_DB_ALIAS, configured_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
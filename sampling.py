@@ -0,0 +1,267 @@
+"""
+Quick previews of the usage reports, estimated from a sample of accesses.
+
+Access counts are computed over REPORTING_SAMPLE_PERCENT of the ArticleAccess
+rows, read with TABLESAMPLE SYSTEM on PostgreSQL and by keeping the ids that
+are a multiple of 100 / percent elsewhere, and scaled back up. Each estimate
+carries a 95% margin of error from the binomial variance of the sample; block
+sampling on PostgreSQL is more variable than that when accesses cluster on
+pages, so margins are indicative. Compacted days are counted exactly from
+their rollups. Months are bucketed in the report timezone by range
+comparisons, like the exact usage by month report.
+"""
+from collections import defaultdict
+import math
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Mod
+
+from core import models as core_models
+from metrics import models as mm
+from submission import models as sm
+
+from plugins.reporting import months, rollups
+
+# The z-score of a 95% confidence interval
+Z = 1.96
+
+# The ArticleAccess and ArticleAccessRollup expressions of each grouping,
+# besides 'month', which is bucketed by group_expressions()
+GROUPS = {
+    'journal': (F('article__journal'), F('journal')),
+    'article': (F('article'), F('article')),
+    'country': (F('country'), F('country')),
+    'type': (F('type'), F('type')),
+}
+
+
+def sample_percent():
+    return getattr(settings, 'REPORTING_SAMPLE_PERCENT', 1)
+
+
+class Estimate(object):
+    """ A count scaled up from a sample, plus the exact compacted count"""
+
+    def __init__(self, sampled, fraction, exact=0):
+        self.value = round(sampled / fraction) + exact
+        # A group missing from the sample may still have a few accesses
+        self.margin = round(
+            Z * math.sqrt(max(sampled, 1) * (1 - fraction)) / fraction,
+        )
+
+    def __str__(self):
+        return '~{} ± {}'.format(self.value, self.margin)
+
+
+class Estimates(dict):
+    """ Estimates by group, of 0 with the margin of the sample when a group
+    had no sampled accesses
+    """
+
+    def __init__(self, fraction):
+        super().__init__()
+        self.fraction = fraction
+
+    def __missing__(self, key):
+        return Estimate(0, self.fraction)
+
+
+def group_expressions(groups, starts=None, tz=None):
+    """ The ArticleAccess and ArticleAccessRollup expressions of groups
+    :param starts: the months.boundaries() a 'month' group is bucketed by,
+        its values being the indices of the months
+    :param tz: the timezone of starts
+    :return: two dicts of {alias: expression}
+    """
+    raw, compacted = {}, {}
+    for group in groups:
+        alias = 'group_{}'.format(group)
+        if group == 'month':
+            raw[alias] = months.bucket('accessed', starts)
+            compacted[alias] = months.bucket(
+                'date', months.start_dates(starts, tz),
+            )
+        else:
+            raw[alias], compacted[alias] = GROUPS[group]
+    return raw, compacted
+
+
+def rollup_filters(filters):
+    return {
+        key.replace('article__journal', 'journal'): value
+        for key, value in filters.items()
+    }
+
+
+def tablesample(queryset, percent):
+    """ Runs a values_list queryset over a block sample of ArticleAccess
+    :return: the rows, or None when the SQL selects from ArticleAccess more
+        than once and the sample clause could be misplaced
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    table = connection.ops.quote_name(mm.ArticleAccess._meta.db_table)
+    source = 'FROM {}'.format(table)
+    if sql.count(source) != 1:
+        return None
+    sql = sql.replace(
+        source,
+        '{} TABLESAMPLE SYSTEM ({:f})'.format(source, float(percent)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def sample(groups, start_date, end_date, exclude=None, starts=None, tz=None,
+           **filters):
+    """ Estimates the accesses between two dates, grouped
+    :param groups: a list of keys of GROUPS, or 'month'
+    :param exclude: optional exclude() kwargs of ArticleAccess
+    :param starts: the months.boundaries() of a 'month' group
+    :param tz: the timezone of starts
+    :param filters: filter() kwargs of ArticleAccess
+    :return: {tuple of the values of groups: Estimate}
+    """
+    aliases = ['group_{}'.format(group) for group in groups]
+    raw, compacted_groups = group_expressions(groups, starts, tz)
+    accesses = mm.ArticleAccess.objects.filter(
+        accessed__gte=start_date,
+        accessed__lte=end_date,
+        **filters
+    )
+    if exclude:
+        accesses = accesses.exclude(**exclude)
+
+    def grouped(queryset):
+        return queryset.values(**raw).annotate(
+            total=Count('id'),
+        ).values_list(*aliases, 'total')
+
+    percent = sample_percent()
+    rows = None
+    if connections[accesses.db].vendor == 'postgresql':
+        fraction = percent / 100
+        rows = tablesample(grouped(accesses), percent)
+    if rows is None:
+        step = max(round(100 / percent), 1)
+        fraction = 1 / step
+        rows = grouped(
+            accesses.annotate(sample=Mod('id', step)).filter(sample=0),
+        )
+
+    sampled = defaultdict(int)
+    for row in rows:
+        sampled[tuple(row[:-1])] += row[-1]
+
+    exact = defaultdict(int)
+    day_range = rollups.rollup_range(start_date, end_date)
+    if day_range:
+        compacted = rollups.rollups_in(day_range, **rollup_filters(filters))
+        if exclude:
+            compacted = compacted.exclude(**rollup_filters(exclude))
+        for row in compacted.values(**compacted_groups).annotate(
+            total=Sum('count'),
+        ).values_list(*aliases, 'total'):
+            exact[tuple(row[:-1])] += row[-1]
+
+    estimates = Estimates(fraction)
+    for key in set(sampled) | set(exact):
+        estimates[key] = Estimate(
+            sampled.get(key, 0), fraction, exact.get(key, 0),
+        )
+    return estimates
+
+
+class Preview(object):
+    """ A table of estimates: a label and a cell per column for each row"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.percent = sample_percent()
+
+
+def views_and_downloads(estimates, key):
+    return [
+        estimates[key + (access_type,)] for access_type in ('view', 'download')
+    ]
+
+
+def press_preview(journals, start_date, end_date):
+    estimates = sample(
+        ['journal', 'type'], start_date, end_date,
+        type__in=['view', 'download'],
+    )
+    return Preview(['Views', 'Downloads'], [
+        (journal.name, views_and_downloads(estimates, (journal.pk,)))
+        for journal in journals
+    ])
+
+
+def articles_preview(journal, start_date, end_date):
+    estimates = sample(
+        ['article', 'type'], start_date, end_date,
+        article__journal=journal,
+        type__in=['view', 'download'],
+    )
+    titles = dict(sm.Article.objects.filter(
+        pk__in={key[0] for key in estimates},
+    ).values_list('pk', 'title'))
+    rows = [
+        (title, views_and_downloads(estimates, (pk,)))
+        for pk, title in titles.items()
+    ]
+    rows.sort(key=lambda row: row[1][0].value, reverse=True)
+    return Preview(['Views', 'Downloads'], rows)
+
+
+def geo_preview(journal, start_date, end_date):
+    filters = {'article__journal': journal} if journal else {}
+    estimates = sample(['country'], start_date, end_date, **filters)
+    names = dict(core_models.Country.objects.filter(
+        pk__in={key[0] for key in estimates if key[0] is not None},
+    ).values_list('pk', 'name'))
+    rows = [
+        (names.get(key[0], 'Unknown'), [estimate])
+        for key, estimate in estimates.items()
+    ]
+    rows.sort(key=lambda row: row[1][0].value, reverse=True)
+    return Preview(['Accesses'], rows)
+
+
+def usage_by_month_preview(journals, first_month, last_month):
+    """ Views and downloads of galleys by journal and month, each journal
+    bucketed in its report timezone
+    :param journals: A queryset of Journal objects
+    :param first_month: a date, the first day of the first month
+    :param last_month: a date, the first day of the last month
+    """
+    tz = months.report_timezone()
+    columns = [
+        month.strftime('%Y-%m') for month in months.start_dates(
+            months.boundaries(first_month, last_month, tz), tz,
+        )[:-1]
+    ]
+    cells = {}
+    for tz_name, group in months.by_timezone(journals):
+        tz = months.get_timezone(tz_name)
+        starts = months.boundaries(first_month, last_month, tz)
+        estimates = sample(
+            ['journal', 'month'], starts[0], starts[-1],
+            exclude={'galley_type__isnull': True},
+            starts=starts,
+            tz=tz,
+            article__journal__in=group,
+            type__in=['view', 'download'],
+        )
+        for journal in group:
+            cells[journal.pk] = [
+                estimates[(journal.pk, index)]
+                for index in range(len(starts) - 1)
+            ]
+    return Preview(columns, [
+        (journal.name, cells[journal.pk]) for journal in journals
+    ])
@@ -1,6 +1,25 @@
 from rest_framework import serializers
 
 
+class CountryMonthSerializer(serializers.Serializer):
+    month = serializers.DateField(read_only=True)
+    count = serializers.IntegerField(read_only=True)
+
+
 class GeographicalDataSerializer(serializers.Serializer):
+    country_id = serializers.IntegerField(read_only=True)
     country__name = serializers.CharField(read_only=True)
-    country_count = serializers.IntegerField(read_only=True)
\ No newline at end of file
+    country_count = serializers.IntegerField(read_only=True)
+    months = CountryMonthSerializer(many=True, read_only=True)
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField(read_only=True)
+    article_id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(source='article.title', read_only=True)
+    journal_code = serializers.CharField(
+        source='article.journal.code', read_only=True,
+    )
+    total = serializers.IntegerField(read_only=True)
+    start_date = serializers.DateField(read_only=True)
+    end_date = serializers.DateField(read_only=True)
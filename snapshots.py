@@ -0,0 +1,298 @@
+"""
+Snapshots of reports for the standard periods most requests ask for.
+
+The compute_report_snapshots command, run from cron, stores the data of the
+press, article, geographical and license reports for last month, last quarter
+and year to date. Report views look for a snapshot matching their journal and
+dates before running their live queries and serve it when one exists and is
+younger than REPORTING_SNAPSHOT_MAX_AGE_SECONDS. Snapshots of periods that
+have moved on, such as yesterday's year to date, are deleted on each run.
+"""
+from collections import OrderedDict
+from datetime import date, timedelta
+import time
+from types import SimpleNamespace
+
+from dateutil.parser import parse
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from journal import models as jm
+
+from plugins.reporting import counter, instrumentation, logic, models, routers
+
+
+def standard_periods(today=None):
+    """ Returns the standard periods as {name: (label, start, end)}"""
+    today = today or timezone.localdate()
+    quarter_start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+    return OrderedDict([
+        ('last_month', (
+            'Last month',
+            logic.get_first_day(today, d_months=-1),
+            logic.get_first_day(today) - timedelta(days=1),
+        )),
+        ('last_quarter', (
+            'Last quarter',
+            logic.get_first_day(quarter_start, d_months=-3),
+            quarter_start - timedelta(days=1),
+        )),
+        ('year_to_date', (
+            'Year to date',
+            date(today.year, 1, 1),
+            today,
+        )),
+    ])
+
+
+def revive_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def freeze_press(journal, start_date, end_date):
+    journals = logic.press_report(
+        jm.Journal.objects.filter(is_remote=False).order_by('code'),
+        start_date,
+        end_date,
+    )
+    visitors, items = counter.annotate_journal_uniques(
+        journals, start_date, end_date,
+    )
+    return {
+        'unique_visitors': visitors,
+        'unique_items': items,
+        'journals': [
+            {
+                'pk': journal.pk,
+                'name': journal.name,
+                'submitted': journal.submitted,
+                'published': journal.published,
+                'rejected': journal.rejected,
+                'users': journal.users,
+                'total_views': journal.total_views,
+                'total_downloads': journal.total_downloads,
+                'unique_visitors': journal.unique_visitors,
+                'unique_items': journal.unique_items,
+            } for journal in journals
+        ],
+    }
+
+
+def thaw_press(data):
+    return {
+        'unique_visitors': data.get('unique_visitors'),
+        'unique_items': data.get('unique_items'),
+        'journals': [SimpleNamespace(**row) for row in data['journals']],
+    }
+
+
+def freeze_articles(journal, start_date, end_date):
+    journal = logic.press_journal_report_data(
+        jm.Journal.objects.filter(pk=journal.pk),
+        start_date,
+        end_date,
+    ).first()
+    articles = logic.get_articles(journal, start_date, end_date)
+    visitors, items = counter.annotate_article_uniques(
+        articles, journal, start_date, end_date,
+    )
+    return {
+        'unique_visitors': visitors,
+        'unique_items': items,
+        'journal': {
+            'pk': journal.pk,
+            'name': journal.name,
+            'article_count': journal.article_set.count(),
+            'submitted': journal.submitted,
+            'published': journal.published,
+            'rejected': journal.rejected,
+            'total_views': journal.total_views,
+            'total_downloads': journal.total_downloads,
+        },
+        'articles': [
+            {
+                'pk': article.pk,
+                'title': article.title,
+                'section': article.section.name if article.section else None,
+                'date_submitted': article.date_submitted,
+                'date_accepted': article.date_accepted,
+                'date_published': article.date_published,
+                'editorial_days': (
+                    article.editorial_delta.days
+                    if article.editorial_delta else None
+                ),
+                'abstract_views': article.abstract_views,
+                'html_views': article.html_views,
+                'pdf_views': article.pdf_views,
+                'pdf_downloads': article.pdf_downloads,
+                'other_downloads': article.other_downloads,
+                'unique_visitors': article.unique_visitors,
+            } for article in articles
+        ],
+    }
+
+
+def thaw_articles(data):
+    journal = dict(data['journal'])
+    article_count = journal.pop('article_count')
+    articles = []
+    for row in data['articles']:
+        row = dict(row)
+        section = row.pop('section')
+        days = row.pop('editorial_days')
+        for field in ('date_submitted', 'date_accepted', 'date_published'):
+            row[field] = revive_datetime(row[field])
+        articles.append(SimpleNamespace(
+            section=SimpleNamespace(name=section) if section else None,
+            editorial_delta=timedelta(days=days) if days is not None else None,
+            **row
+        ))
+    return {
+        'journal': SimpleNamespace(
+            article_set=SimpleNamespace(count=article_count),
+            **journal
+        ),
+        'articles': articles,
+        'unique_visitors': data.get('unique_visitors'),
+        'unique_items': data.get('unique_items'),
+    }
+
+
+def freeze_geo(journal, start_date, end_date):
+    return {
+        'countries': logic.acessses_by_country(journal, start_date, end_date),
+    }
+
+
+def thaw_geo(data):
+    return {'countries': data['countries']}
+
+
+def freeze_licenses(journal, start_date, end_date):
+    return {'data': list(logic.license_report(start_date, end_date))}
+
+
+def thaw_licenses(data):
+    return {'data': data['data']}
+
+
+class SnapshotReport(object):
+    def __init__(self, name, freeze, thaw, press=True, per_journal=False):
+        self.name = name
+        self.freeze = freeze
+        self.thaw = thaw
+        self.press = press
+        self.per_journal = per_journal
+
+
+REPORTS = OrderedDict((report.name, report) for report in [
+    SnapshotReport('press', freeze_press, thaw_press),
+    SnapshotReport(
+        'articles', freeze_articles, thaw_articles,
+        press=False, per_journal=True,
+    ),
+    SnapshotReport('geo', freeze_geo, thaw_geo, per_journal=True),
+    SnapshotReport('licenses', freeze_licenses, thaw_licenses),
+])
+
+
+def compute(report, journal, period, start, end):
+    """ Computes and stores the snapshot of a report for a period"""
+    started = time.perf_counter()
+    with routers.reading():
+        data = REPORTS[report].freeze(
+            journal, start.isoformat(), end.isoformat(),
+        )
+    snapshot, _ = models.ReportSnapshot.objects.update_or_create(
+        report=report,
+        journal=journal,
+        start_date=start,
+        end_date=end,
+        defaults={
+            'period': period,
+            'data': data,
+            'computed': timezone.now(),
+            'duration': time.perf_counter() - started,
+        },
+    )
+    return snapshot
+
+
+def prune(periods):
+    """ Deletes the snapshots of standard periods whose dates have moved on
+    :param periods: the result of standard_periods()
+    :return: the number of snapshots deleted
+    """
+    deleted = 0
+    for period, (_, start, end) in periods.items():
+        deleted += models.ReportSnapshot.objects.filter(
+            period=period,
+        ).exclude(
+            start_date=start,
+            end_date=end,
+        ).delete()[0]
+    return deleted
+
+
+def compute_all(reports=None, today=None, log=None):
+    """ Computes the snapshots of every standard period
+    :param reports: optional list of report names, defaults to all
+    :param today: optional date the periods are relative to
+    :param log: optional callable receiving progress messages
+    :return: the number of snapshots computed
+    """
+    log = log or (lambda message: None)
+    periods = standard_periods(today)
+    log('Deleted {} outdated snapshots'.format(prune(periods)))
+    journals = list(jm.Journal.objects.filter(is_remote=False))
+    computed = 0
+    for period, (_, start, end) in periods.items():
+        for name in reports or REPORTS:
+            report = REPORTS[name]
+            targets = ([None] if report.press else []) + (
+                journals if report.per_journal else []
+            )
+            for journal in targets:
+                snapshot = compute(name, journal, period, start, end)
+                log('Computed {} {} for {} in {:.1f}s'.format(
+                    name,
+                    period,
+                    journal.code if journal else 'the press',
+                    snapshot.duration,
+                ))
+                computed += 1
+    return computed
+
+
+def find(report, journal_id, start_date, end_date):
+    """ Returns the snapshot matching a report request, if there is a recent
+    enough one
+    """
+    try:
+        start, end = (
+            value if isinstance(value, date) else parse(str(value)).date()
+            for value in (start_date, end_date)
+        )
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return models.ReportSnapshot.objects.filter(
+        report=report,
+        journal_id=journal_id,
+        start_date=start,
+        end_date=end,
+        computed__gte=timezone.now() - timedelta(seconds=getattr(
+            settings, 'REPORTING_SNAPSHOT_MAX_AGE_SECONDS', 172800,
+        )),
+    ).first()
+
+
+def context(snapshot):
+    """ The template context of a snapshot, including the snapshot itself"""
+    instrumentation.record_precomputed(
+        'snapshot:{}'.format(snapshot.pk), snapshot.computed,
+    )
+    data = REPORTS[snapshot.report].thaw(snapshot.data)
+    data['snapshot'] = snapshot
+    return data
@@ -0,0 +1,434 @@
+"""
+Generates reproducible, production-shaped data sets for benchmarking reports.
+
+Everything is derived from a single seeded random.Random so that the same
+options and seed always produce the same rows on an empty database.
+"""
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import models as core_models
+from identifiers import models as id_models
+from journal import models as jm
+from metrics import models as mm
+from production import models as pm
+from repository import models as repository_models
+from review import models as rm
+from submission import models as sm
+
+# (galley_type, weight, probability the access is a download)
+GALLEY_DISTRIBUTION = [
+    (None, 45, 0),
+    ('html', 22, 0),
+    ('pdf', 25, 0.6),
+    ('xml', 4, 0.3),
+    ('epub', 2, 1),
+    ('zip', 2, 1),
+]
+
+# Relative traffic per calendar month, academic terms being busier
+SEASONALITY = [1.0, 1.1, 1.2, 1.15, 1.0, 0.8, 0.6, 0.6, 1.0, 1.25, 1.3, 0.9]
+
+
+@contextmanager
+def historical_dates(*fields):
+    """ Lets bulk_create write the values of auto_now_add date fields"""
+    original = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in original:
+            field.auto_now_add = auto_now_add
+
+
+def model_field(model, name):
+    return model._meta.get_field(name)
+
+
+class WeightedChoice(object):
+    """ Draws items according to fixed weights in O(log n) per draw"""
+
+    def __init__(self, rng, items, weights):
+        self.rng = rng
+        self.items = list(items)
+        self.cum_weights = list(accumulate(weights))
+
+    def draw(self):
+        x = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect(self.cum_weights, x)]
+
+
+class SyntheticDataGenerator(object):
+
+    def __init__(
+        self, seed=42, batch_size=5000, months=36, prefix='BMK', log=None,
+        until=None,
+    ):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.months = months
+        self.prefix = prefix
+        # Passing a fixed end date makes the timestamps reproducible too
+        self.now = until or timezone.now().replace(microsecond=0)
+        self.start = self.now - timedelta(days=30 * months)
+        self.log = log or (lambda message: None)
+
+    def random_datetime(self, start, end):
+        seconds = int((end - start).total_seconds())
+        return start + timedelta(seconds=self.rng.randint(0, max(seconds, 0)))
+
+    def seasonal_datetime(self, start, end):
+        """ A datetime between start and end, skewed by SEASONALITY"""
+        maximum = max(SEASONALITY)
+        while True:
+            candidate = self.random_datetime(start, end)
+            if self.rng.random() * maximum <= SEASONALITY[candidate.month - 1]:
+                return candidate
+
+    def bulk_create(self, model, objects):
+        """ Inserts objects in batches, returning the created instances"""
+        created = []
+        for i in range(0, len(objects), self.batch_size):
+            batch = model.objects.bulk_create(objects[i:i + self.batch_size])
+            if batch and batch[0].pk is None:
+                # Backends such as MySQL don't return the new primary keys
+                batch = list(
+                    model.objects.order_by('-pk')[:len(batch)]
+                )[::-1]
+            created.extend(batch)
+        return created
+
+    def country_choice(self):
+        """ A Zipf-like skew over the available countries"""
+        countries = list(core_models.Country.objects.order_by('pk'))
+        if not countries:
+            return None
+        self.rng.shuffle(countries)
+        weights = [1 / (rank ** 1.2) for rank in range(1, len(countries) + 1)]
+        return WeightedChoice(self.rng, countries, weights)
+
+    def account_email(self, i):
+        return '{}-user-{}@example.org'.format(self.prefix.lower(), i)
+
+    def journal_code(self, i):
+        return '{}{}'.format(self.prefix, i + 1)
+
+    def check_prefix(self, journals, users):
+        """ Raises ValueError when the prefix was used by an earlier run, as
+        the accounts and journals it would create already exist
+        """
+        if jm.Journal.objects.filter(
+            code__in=[self.journal_code(i) for i in range(journals)],
+        ).exists() or core_models.Account.objects.filter(
+            username__in=[self.account_email(i) for i in range(users)],
+        ).exists():
+            raise ValueError(
+                'Data with the prefix {} already exists, use another '
+                'prefix'.format(self.prefix)
+            )
+
+    def create_accounts(self, count):
+        accounts = [
+            core_models.Account(
+                email=self.account_email(i),
+                username=self.account_email(i),
+                first_name='User',
+                last_name=str(i),
+                is_active=True,
+            ) for i in range(count)
+        ]
+        return self.bulk_create(core_models.Account, accounts)
+
+    def create_journals(self, count):
+        journals = []
+        for i in range(count):
+            code = self.journal_code(i)
+            journal = jm.Journal(code=code, domain='{}.example.org'.format(
+                code.lower(),
+            ))
+            journal.title = 'Synthetic Journal {}'.format(i + 1)
+            journal.save()
+            journals.append(journal)
+        return journals
+
+    def create_articles(self, journals, per_journal):
+        articles = []
+        for journal in journals:
+            section, _ = sm.Section.objects.get_or_create(
+                journal=journal, name='Articles',
+            )
+            for i in range(per_journal):
+                submitted = self.random_datetime(self.start, self.now)
+                article = sm.Article(
+                    journal=journal,
+                    section=section,
+                    title='{} article {}'.format(journal.code, i + 1),
+                    date_submitted=submitted,
+                    stage=sm.STAGE_UNASSIGNED,
+                )
+                outcome = self.rng.random()
+                if outcome < 0.25:
+                    article.stage = sm.STAGE_REJECTED
+                    article.date_declined = submitted + timedelta(
+                        days=self.rng.randint(5, 90),
+                    )
+                elif outcome < 0.85:
+                    accepted = submitted + timedelta(
+                        days=self.rng.randint(20, 200),
+                    )
+                    published = accepted + timedelta(
+                        days=self.rng.randint(5, 60),
+                    )
+                    if published < self.now:
+                        article.stage = sm.STAGE_PUBLISHED
+                        article.date_accepted = accepted
+                        article.date_published = published
+                articles.append(article)
+        return self.bulk_create(sm.Article, articles)
+
+    def create_reviews(self, articles, accounts, per_article):
+        rounds = self.bulk_create(rm.ReviewRound, [
+            rm.ReviewRound(article=article, round_number=1)
+            for article in articles
+        ])
+        reviews = []
+        for review_round in rounds:
+            for _ in range(self.rng.randint(0, per_article * 2)):
+                requested = review_round.article.date_submitted + timedelta(
+                    days=self.rng.randint(1, 30),
+                )
+                review = rm.ReviewAssignment(
+                    article=review_round.article,
+                    review_round=review_round,
+                    reviewer=self.rng.choice(accounts),
+                    editor=self.rng.choice(accounts),
+                    date_requested=requested,
+                    date_due=(requested + timedelta(days=30)).date(),
+                )
+                if self.rng.random() < 0.7:
+                    review.date_accepted = requested + timedelta(
+                        days=self.rng.expovariate(1 / 4),
+                    )
+                    if self.rng.random() < 0.9:
+                        review.date_complete = review.date_accepted + timedelta(
+                            days=self.rng.expovariate(1 / 25),
+                        )
+                else:
+                    review.date_declined = requested + timedelta(
+                        days=self.rng.randint(1, 10),
+                    )
+                reviews.append(review)
+
+        with historical_dates(model_field(rm.ReviewAssignment, 'date_requested')):
+            return self.bulk_create(rm.ReviewAssignment, reviews)
+
+    def create_typeset_tasks(self, articles, accounts):
+        published = [a for a in articles if a.date_published]
+        with historical_dates(model_field(pm.ProductionAssignment, 'assigned')):
+            assignments = self.bulk_create(pm.ProductionAssignment, [
+                pm.ProductionAssignment(
+                    article=article,
+                    production_manager=self.rng.choice(accounts),
+                    editor=self.rng.choice(accounts),
+                    assigned=article.date_accepted,
+                ) for article in published
+            ])
+        tasks = []
+        for assignment in assignments:
+            assigned = assignment.assigned + timedelta(
+                days=self.rng.randint(0, 5),
+            )
+            accepted = assigned + timedelta(days=self.rng.expovariate(1 / 2))
+            tasks.append(pm.TypesetTask(
+                assignment=assignment,
+                typesetter=self.rng.choice(accounts),
+                assigned=assigned,
+                accepted=accepted,
+                completed=accepted + timedelta(
+                    days=self.rng.expovariate(1 / 10),
+                ),
+            ))
+        return self.bulk_create(pm.TypesetTask, tasks)
+
+    def create_identifiers(self, articles):
+        return self.bulk_create(id_models.Identifier, [
+            id_models.Identifier(
+                article=article,
+                id_type='doi',
+                identifier='10.99999/{}.{}'.format(
+                    article.journal.code.lower(), article.pk,
+                ),
+            ) for article in articles if article.date_published
+        ])
+
+    def create_links(self, articles, per_article):
+        links = []
+        for article in articles:
+            if not article.date_published:
+                continue
+            # Most articles are never cited, a few are cited a lot
+            citations = int(self.rng.paretovariate(1.5)) - 1
+            for i in range(min(citations, per_article * 10)):
+                links.append(mm.ArticleLink(
+                    article=article,
+                    object_type='article',
+                    doi='10.88888/citing.{}.{}'.format(article.pk, i),
+                    year=self.rng.randint(
+                        article.date_published.year, self.now.year,
+                    ),
+                    journal_title='Citing Journal',
+                    article_title='Citing work {}'.format(i),
+                ))
+        return self.bulk_create(mm.ArticleLink, links)
+
+    def galley_choice(self):
+        return WeightedChoice(
+            self.rng,
+            [(galley, download) for galley, _, download in GALLEY_DISTRIBUTION],
+            [weight for _, weight, _ in GALLEY_DISTRIBUTION],
+        )
+
+    def create_article_accesses(self, articles, count):
+        published = [a for a in articles if a.date_published]
+        if not published:
+            return 0
+        # A heavy-tailed popularity so that a few articles dominate usage
+        popularity = WeightedChoice(
+            self.rng,
+            published,
+            [self.rng.paretovariate(1.16) for _ in published],
+        )
+        countries = self.country_choice()
+        galleys = self.galley_choice()
+
+        created = 0
+        accessed_field = model_field(mm.ArticleAccess, 'accessed')
+        with historical_dates(accessed_field):
+            while created < count:
+                batch = []
+                for _ in range(min(self.batch_size, count - created)):
+                    article = popularity.draw()
+                    galley_type, download_rate = galleys.draw()
+                    batch.append(mm.ArticleAccess(
+                        article=article,
+                        type='download'
+                        if self.rng.random() < download_rate else 'view',
+                        galley_type=galley_type,
+                        identifier='{:x}'.format(self.rng.getrandbits(64)),
+                        country=countries.draw() if countries else None,
+                        accessed=self.seasonal_datetime(
+                            max(article.date_published, self.start),
+                            self.now,
+                        ),
+                    ))
+                with transaction.atomic():
+                    mm.ArticleAccess.objects.bulk_create(batch)
+                created += len(batch)
+                self.log('{} article accesses'.format(created))
+        return created
+
+    def create_preprints(self, accounts, count):
+        repository = repository_models.Repository.objects.order_by('pk').first()
+        if not repository:
+            self.log('No repository found, skipping preprints')
+            return []
+        preprints = []
+        for i in range(count):
+            submitted = self.random_datetime(self.start, self.now)
+            preprints.append(repository_models.Preprint(
+                repository=repository,
+                owner=self.rng.choice(accounts),
+                title='{} preprint {}'.format(self.prefix, i + 1),
+                stage=repository_models.STAGE_PREPRINT_PUBLISHED,
+                date_submitted=submitted,
+                date_published=submitted + timedelta(
+                    days=self.rng.randint(1, 30),
+                ),
+            ))
+        return self.bulk_create(repository_models.Preprint, preprints)
+
+    def create_preprint_accesses(self, preprints, count):
+        preprints = [p for p in preprints if p.date_published < self.now]
+        if not preprints:
+            return 0
+        popularity = WeightedChoice(
+            self.rng,
+            preprints,
+            [self.rng.paretovariate(1.16) for _ in preprints],
+        )
+        countries = self.country_choice()
+
+        created = 0
+        accessed_field = model_field(repository_models.PreprintAccess, 'accessed')
+        with historical_dates(accessed_field):
+            while created < count:
+                batch = []
+                for _ in range(min(self.batch_size, count - created)):
+                    preprint = popularity.draw()
+                    batch.append(repository_models.PreprintAccess(
+                        preprint=preprint,
+                        identifier='{:x}'.format(self.rng.getrandbits(64)),
+                        country=countries.draw() if countries else None,
+                        accessed=self.seasonal_datetime(
+                            max(preprint.date_published, self.start),
+                            self.now,
+                        ),
+                    ))
+                with transaction.atomic():
+                    repository_models.PreprintAccess.objects.bulk_create(batch)
+                created += len(batch)
+                self.log('{} preprint accesses'.format(created))
+        return created
+
+    def generate(
+        self, journals=3, articles=100, accesses=100000, reviews=2,
+        links=3, users=50, preprints=0, preprint_accesses=0,
+    ):
+        """ Creates a complete data set and returns the number of rows per type
+        :param journals: int, number of journals to create
+        :param articles: int, number of articles per journal
+        :param accesses: int, total number of ArticleAccess rows
+        :param reviews: int, average review assignments per article
+        :param links: int, average citing links per cited article
+        :param users: int, number of accounts used as reviewers and editors
+        :param preprints: int, number of preprints (needs a repository)
+        :param preprint_accesses: int, total number of PreprintAccess rows
+        """
+        self.check_prefix(journals, users)
+        with transaction.atomic():
+            accounts = self.create_accounts(users)
+            journal_objects = self.create_journals(journals)
+            article_objects = self.create_articles(journal_objects, articles)
+            self.log('{} articles'.format(len(article_objects)))
+            review_objects = self.create_reviews(
+                article_objects, accounts, reviews,
+            )
+            tasks = self.create_typeset_tasks(article_objects, accounts)
+            identifiers = self.create_identifiers(article_objects)
+            link_objects = self.create_links(article_objects, links)
+            preprint_objects = self.create_preprints(accounts, preprints)
+
+        return {
+            'accounts': len(accounts),
+            'journals': len(journal_objects),
+            'articles': len(article_objects),
+            'review_assignments': len(review_objects),
+            'typeset_tasks': len(tasks),
+            'identifiers': len(identifiers),
+            'article_links': len(link_objects),
+            'preprints': len(preprint_objects),
+            'article_accesses': self.create_article_accesses(
+                article_objects, accesses,
+            ),
+            'preprint_accesses': self.create_preprint_accesses(
+                preprint_objects, preprint_accesses,
+            ),
+        }
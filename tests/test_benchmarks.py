@@ -0,0 +1,274 @@
+"""
+Benchmarks for the reporting functions and views.
+
+Every benchmark runs against synthetic data sets of increasing size. The
+suite fails when a benchmark runs more queries than its declared budget or
+when its query count grows with the data set (the signature of an N+1).
+
+Wall times at these scales are mostly noise, so they are only checked for
+super-linear growth when REPORTING_BENCHMARK_TIMING is set, and then only for
+benchmarks taking at least MIN_TIMED_SECONDS at the smallest scale. Set
+REPORTING_BENCHMARK_OUTPUT to a file path to also get the measurements as
+JSON.
+"""
+from collections import namedtuple
+from datetime import datetime
+from io import StringIO
+import json
+import os
+import time
+import tracemalloc
+
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from journal import models as jm
+from submission import models as sm
+from utils.testing import helpers
+
+from plugins.reporting import logic
+from plugins.reporting.synthetic import SyntheticDataGenerator
+
+SCALES = [
+    {'articles': 10, 'accesses': 500},
+    {'articles': 40, 'accesses': 2000},
+]
+# How much faster than the data set the wall time may grow between scales
+TIME_GROWTH_SLACK = 2
+# The shortest wall time, in seconds, whose growth is checked
+MIN_TIMED_SECONDS = 0.05
+# Views also pay for sessions, middleware and template context processors
+VIEW_QUERY_BUDGET = 60
+
+Benchmark = namedtuple('Benchmark', ['name', 'run', 'budget'])
+Measurement = namedtuple('Measurement', ['seconds', 'queries', 'peak_bytes'])
+
+
+def consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+FUNCTION_BENCHMARKS = [
+    Benchmark(
+        'get_articles',
+        lambda c: list(logic.get_articles(c.journal, c.start, c.end)),
+        1,
+    ),
+    Benchmark(
+        'get_accesses',
+        lambda c: logic.get_accesses(c.journal, c.start, c.end),
+        2,
+    ),
+    Benchmark(
+        'press_journal_report_data',
+        lambda c: list(logic.press_journal_report_data(
+            c.journals, c.start, c.end,
+        )),
+        1,
+    ),
+    Benchmark(
+        'acessses_by_country',
+        lambda c: list(logic.acessses_by_country(None, c.start, c.end)),
+        2,
+    ),
+    Benchmark(
+        'journal_usage_by_month_data',
+        lambda c: logic.journal_usage_by_month_data(c.date_parts),
+        2,
+    ),
+    Benchmark(
+        'ajournal_usage_by_month_data',
+        lambda c: logic.ajournal_usage_by_month_data(c.date_parts),
+        1,
+    ),
+    Benchmark(
+        'peer_review_data',
+        lambda c: logic.peer_review_data(c.articles, c.start, c.end),
+        2,
+    ),
+    Benchmark(
+        'peer_review_stats',
+        lambda c: logic.peer_review_stats(c.start, c.end, c.journal),
+        4,
+    ),
+    Benchmark(
+        'citation_data',
+        lambda c: list(logic.citation_data(c.end.year)),
+        1,
+    ),
+    Benchmark(
+        'write_doi_tsv_report',
+        lambda c: logic.write_doi_tsv_report(StringIO()),
+        2,
+    ),
+    Benchmark(
+        'write_doi_tsv_report_crosscheck',
+        lambda c: logic.write_doi_tsv_report(StringIO(), crosscheck=True),
+        1,
+    ),
+    Benchmark(
+        'license_report',
+        lambda c: list(logic.license_report(c.start, c.end)),
+        1,
+    ),
+    Benchmark(
+        'get_averages',
+        lambda c: logic.get_averages(c.articles),
+        1,
+    ),
+    Benchmark(
+        'export_article_csv',
+        lambda c: consume(logic.export_article_csv(
+            logic.get_articles(c.journal, c.start, c.end),
+            logic.press_journal_report_data(
+                c.journals.filter(pk=c.journal.pk), c.start, c.end,
+            ).first(),
+        )),
+        3,
+    ),
+]
+
+VIEW_BENCHMARKS = [
+    ('reporting_press', {}),
+    ('reporting_journal_usage_by_month', {}),
+    ('reporting_articles', {'journal_id': 'journal'}),
+    ('reporting_geo', {}),
+    ('reporting_review', {}),
+    ('reporting_license', {}),
+    ('reporting_workflow', {}),
+    ('reporting_crossref_dois', {'journal_id': 'journal'}),
+]
+
+
+class BenchmarkContext(object):
+    def __init__(self, journals, start, end):
+        self.journals = journals
+        self.journal = journals.first()
+        self.articles = sm.Article.objects.filter(journal=self.journal)
+        self.start = start
+        self.end = end
+        self.date_parts = {
+            'start_month_y': start.year,
+            'start_month_m': start.month,
+            'end_month_y': end.year,
+            'end_month_m': end.month,
+        }
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        func(*args)
+        seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Measurement(seconds, len(queries), peak)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+)
+class TestReportingBenchmarks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.press = helpers.create_press()
+        cls.user = helpers.create_user('benchmark@example.org')
+        cls.user.is_staff = True
+        cls.user.is_superuser = True
+        cls.user.save()
+        cls.until = timezone.make_aware(datetime(2024, 12, 31))
+
+    def run_scale(self, scale):
+        """ Seeds a data set in a savepoint, measures and rolls it back"""
+        results = {}
+        with transaction.atomic():
+            SyntheticDataGenerator(seed=1, months=12, until=self.until).generate(
+                journals=2,
+                articles=scale['articles'],
+                accesses=scale['accesses'],
+                reviews=2,
+                links=2,
+                users=10,
+            )
+            context = BenchmarkContext(
+                jm.Journal.objects.filter(code__startswith='BMK'),
+                timezone.make_aware(datetime(2024, 1, 1)),
+                self.until,
+            )
+            for benchmark in FUNCTION_BENCHMARKS:
+                results[benchmark.name] = measure(benchmark.run, context)
+
+            self.client.force_login(self.user)
+            for url_name, kwargs in VIEW_BENCHMARKS:
+                kwargs = {
+                    key: context.journal.pk for key, value in kwargs.items()
+                }
+                url = reverse(url_name, kwargs=kwargs)
+                results[url_name] = measure(
+                    lambda: consume(self.client.get(
+                        url,
+                        {'start_date': '2024-01-01', 'end_date': '2024-12-31'},
+                        SERVER_NAME=self.press.domain,
+                    )),
+                )
+            transaction.set_rollback(True)
+        return results
+
+    def test_benchmarks(self):
+        runs = [self.run_scale(scale) for scale in SCALES]
+        self.write_output(runs)
+
+        budgets = {b.name: b.budget for b in FUNCTION_BENCHMARKS}
+        budgets.update({name: VIEW_QUERY_BUDGET for name, _ in VIEW_BENCHMARKS})
+        data_growth = SCALES[-1]['accesses'] / SCALES[0]['accesses']
+        check_timing = bool(os.environ.get('REPORTING_BENCHMARK_TIMING'))
+
+        for name, budget in budgets.items():
+            with self.subTest(benchmark=name):
+                smallest, largest = runs[0][name], runs[-1][name]
+                self.assertLessEqual(
+                    largest.queries, budget,
+                    '{} ran {} queries, over its budget of {}'.format(
+                        name, largest.queries, budget,
+                    ),
+                )
+                self.assertLessEqual(
+                    largest.queries, smallest.queries,
+                    '{} query count grew from {} to {}'.format(
+                        name, smallest.queries, largest.queries,
+                    ),
+                )
+                if check_timing and smallest.seconds >= MIN_TIMED_SECONDS:
+                    self.assertLessEqual(
+                        largest.seconds,
+                        smallest.seconds * data_growth * TIME_GROWTH_SLACK,
+                        '{} wall time grew super-linearly'.format(name),
+                    )
+
+    @staticmethod
+    def write_output(runs):
+        path = os.environ.get('REPORTING_BENCHMARK_OUTPUT')
+        if not path:
+            return
+        with open(path, 'w') as output:
+            json.dump(
+                [
+                    {
+                        'scale': scale,
+                        'results': {
+                            name: m._asdict() for name, m in run.items()
+                        },
+                    } for scale, run in zip(SCALES, runs)
+                ],
+                output,
+                indent=2,
+            )
@@ -1,9 +1,54 @@
 from io import StringIO
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from identifiers import models as id_models
-from plugins.reporting import logic
+from journal import models as jm
+from metrics import models as mm
+from plugins.reporting import (
+    caching,
+    columnar,
+    comparison,
+    cost,
+    counter,
+    dashboard,
+    instrumentation,
+    jobs,
+    leaderboards,
+    logic,
+    matviews,
+    models,
+    months,
+    parallel,
+    rollups,
+    routers,
+    sampling,
+    sketches,
+    snapshots,
+    synthetic,
+    views,
+    warming,
+)
+from plugins.reporting.decorators import report_watermark
+from plugins.reporting.management.commands import generate_metrics_indexes
+from production import models as pm
 from submission import models as sm_models
 from utils.testing import helpers
 
@@ -60,3 +105,921 @@ class TestCrossRefDOIRreport(TestCase):
         self.assertEqual(expected, result)
 
 
+class TestReportWatermark(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        self.factory = RequestFactory()
+
+    def get_request(self, path):
+        request = self.factory.get(path)
+        request.user = AnonymousUser()
+        request.journal = None
+        return request
+
+    def test_parameter_order_does_not_change_etag(self):
+        sources = [logic.ARTICLE_WATERMARK]
+        first = logic.get_report_watermark(
+            self.get_request('/?start_date=2024-01-01&end_date=2024-01-31'),
+            'geo',
+            sources,
+        )
+        second = logic.get_report_watermark(
+            self.get_request('/?end_date=2024-01-31&start_date=2024-01-01'),
+            'geo',
+            sources,
+        )
+        self.assertEqual(first.etag, second.etag)
+
+    def test_new_access_changes_etag(self):
+        sources = [logic.ACCESS_WATERMARK]
+        request = self.get_request('/')
+        before = logic.get_report_watermark(request, 'geo', sources)
+        mm.ArticleAccess.objects.create(
+            article=self.article,
+            type='view',
+            identifier='test',
+        )
+        after = logic.get_report_watermark(request, 'geo', sources)
+        self.assertNotEqual(before.etag, after.etag)
+
+    def test_default_dates_change_etag(self):
+        request = self.get_request('/')
+        with mock.patch.object(
+            logic.timezone, 'localdate', return_value=date(2024, 1, 31),
+        ):
+            before = logic.get_report_watermark(request, 'geo', [])
+        with mock.patch.object(
+            logic.timezone, 'localdate', return_value=date(2024, 2, 1),
+        ):
+            after = logic.get_report_watermark(request, 'geo', [])
+        self.assertNotEqual(before.etag, after.etag)
+
+    def test_watermark_does_not_count_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            logic.get_report_watermark(self.get_request('/'), 'press', [
+                logic.ARTICLE_WATERMARK, logic.USER_WATERMARK,
+                logic.REVIEW_WATERMARK,
+            ])
+        self.assertFalse(any(
+            'COUNT' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_precomputed_pages_are_not_answered_with_304(self):
+        computed = timezone.now() - timedelta(days=1)
+
+        @instrumentation.report('geo')
+        @report_watermark('geo', [logic.ARTICLE_WATERMARK])
+        def view(request):
+            instrumentation.record_precomputed('snapshot:1', computed)
+            return HttpResponse('report')
+
+        first = view(self.get_request('/'))
+        watermark = logic.get_report_watermark(
+            self.get_request('/'), 'geo', [logic.ARTICLE_WATERMARK],
+        )
+        self.assertNotEqual(first['ETag'], '"{}"'.format(watermark.etag))
+        request = self.get_request('/')
+        request.META['HTTP_IF_NONE_MATCH'] = first['ETag']
+        request.META['HTTP_IF_MODIFIED_SINCE'] = first['Last-Modified']
+        self.assertEqual(view(request).status_code, 200)
+
+
+class TestWholeMonthRange(TestCase):
+    def test_month_aligned_range(self):
+        start, end = logic.whole_month_range('2024-01-01', '2024-04-01')
+        self.assertEqual((start.month, end.month), (1, 4))
+
+    def test_range_ending_on_a_date_includes_it(self):
+        end = logic.range_end('2024-02-29')
+        self.assertEqual((end.month, end.day, end.hour), (3, 1, 0))
+        start, end = logic.whole_month_range('2024-01-01', end)
+        self.assertEqual((start.month, end.month), (1, 3))
+        self.assertIsNone(logic.whole_month_range('2024-01-01', '2024-02-29'))
+
+    def test_partial_month_range(self):
+        self.assertIsNone(logic.whole_month_range('2024-01-01', '2024-01-30'))
+        self.assertIsNone(
+            logic.whole_month_range('2024-01-01', '2024-01-31 12:00'),
+        )
+
+    def test_months_after_the_refresh_are_left_out(self):
+        month_range = (
+            datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 6, 1, tzinfo=dt_timezone.utc),
+        )
+        refreshed = datetime(2024, 4, 2, 3, tzinfo=dt_timezone.utc)
+        with mock.patch.dict(matviews._available, {'refreshed': refreshed}):
+            self.assertEqual(
+                logic.refreshed_months(month_range, dt_timezone.utc),
+                (month_range[0], datetime(2024, 4, 1, tzinfo=dt_timezone.utc)),
+            )
+        with mock.patch.dict(matviews._available, {'refreshed': None}):
+            self.assertIsNone(
+                logic.refreshed_months(month_range, dt_timezone.utc),
+            )
+
+    def test_invalid_range(self):
+        self.assertIsNone(logic.whole_month_range('2024-02-01', '2024-01-01'))
+        self.assertIsNone(logic.whole_month_range('not a date', '2024-01-01'))
+
+
+class TestArticleUsageRange(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        sm_models.Article.objects.filter(pk=self.article.pk).update(
+            date_published=timezone.make_aware(datetime(2023, 12, 1)),
+            stage=sm_models.STAGE_PUBLISHED,
+        )
+        for accessed in [
+            datetime(2024, 1, 1, 9),
+            datetime(2024, 1, 31, 12),
+            datetime(2024, 2, 1, 0, 30),
+        ]:
+            access = mm.ArticleAccess.objects.create(
+                article=self.article,
+                type='download',
+                identifier='a',
+                galley_type='pdf',
+            )
+            mm.ArticleAccess.objects.filter(pk=access.pk).update(
+                accessed=timezone.make_aware(accessed),
+            )
+
+    def downloads(self):
+        return logic.get_articles(
+            self.journal_one, '2024-01-01', '2024-01-31',
+        ).get(pk=self.article.pk).pdf_downloads
+
+    @override_settings(REPORTING_USE_MATERIALIZED_VIEWS=False)
+    def test_live_range_includes_its_last_day(self):
+        self.assertEqual(self.downloads(), 2)
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'Materialized views need PostgreSQL',
+    )
+    def test_view_and_live_results_match(self):
+        with override_settings(REPORTING_USE_MATERIALIZED_VIEWS=False):
+            live = self.downloads()
+        self.addCleanup(matviews._available.update, {'checked': 0})
+        for model, select, unique_columns in matviews.definitions():
+            matviews.create(model, select, unique_columns)
+            matviews.refresh(model)
+        matviews.mark_refreshed(timezone.now())
+        self.assertTrue(matviews.is_available(models.MonthlyArticleUsage))
+        self.assertEqual(self.downloads(), live)
+
+
+class TestMonthBoundaries(TestCase):
+    def test_partial_months_are_left_out(self):
+        first, last = logic.month_boundaries(
+            timezone.make_aware(datetime(2024, 1, 15)),
+            timezone.make_aware(datetime(2024, 4, 10)),
+        )
+        self.assertEqual((first.month, last.month), (2, 4))
+        self.assertEqual((first.day, last.day), (1, 1))
+
+    def test_range_within_a_month(self):
+        self.assertIsNone(logic.month_boundaries(
+            timezone.make_aware(datetime(2024, 1, 2)),
+            timezone.make_aware(datetime(2024, 1, 30)),
+        ))
+
+
+class TestMonthBuckets(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        access = mm.ArticleAccess.objects.create(
+            article=self.article,
+            type='view',
+            identifier='a',
+            galley_type='pdf',
+        )
+        mm.ArticleAccess.objects.filter(pk=access.pk).update(
+            accessed=datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc),
+        )
+
+    def usage(self):
+        return logic.monthly_journal_usage(
+            jm.Journal.objects.filter(pk=self.journal_one.pk),
+            date(2024, 1, 1),
+            date(2024, 2, 1),
+        )
+
+    @override_settings(REPORTING_TIMEZONE='UTC')
+    def test_month_in_press_timezone(self):
+        self.assertEqual(
+            [(row['month'], row['total']) for row in self.usage()],
+            [(date(2024, 1, 1), 1)],
+        )
+
+    @override_settings(
+        REPORTING_TIMEZONE='UTC',
+        REPORTING_JOURNAL_TIMEZONES={'TST': 'Europe/Berlin'},
+    )
+    def test_month_in_journal_timezone(self):
+        self.journal_one.code = 'TST'
+        self.journal_one.save()
+        self.assertEqual(
+            [(row['month'], row['total']) for row in self.usage()],
+            [(date(2024, 2, 1), 1)],
+        )
+
+    def test_boundaries_follow_daylight_saving(self):
+        starts = months.boundaries(
+            date(2024, 3, 1), date(2024, 4, 1),
+            months.get_timezone('Europe/London'),
+        )
+        self.assertEqual(
+            [start.utcoffset().total_seconds() for start in starts],
+            [0, 3600, 3600],
+        )
+
+
+class TestCompaction(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        sm_models.Article.objects.filter(pk=self.article.pk).update(
+            date_published=timezone.make_aware(datetime(2019, 12, 1)),
+            stage=sm_models.STAGE_PUBLISHED,
+        )
+        for day, access_type, galley_type in [
+            (1, 'view', None),
+            (1, 'view', 'html'),
+            (2, 'download', 'pdf'),
+            (3, 'download', 'pdf'),
+        ]:
+            access = mm.ArticleAccess.objects.create(
+                article=self.article,
+                type=access_type,
+                identifier='test',
+                galley_type=galley_type,
+            )
+            mm.ArticleAccess.objects.filter(pk=access.pk).update(
+                accessed=timezone.make_aware(datetime(2020, 1, day, 12)),
+            )
+        rollups._state['checked'] = 0
+
+    def test_reports_unchanged_after_compaction(self):
+        start, end = '2020-01-01', '2020-01-31'
+        before = logic.get_accesses(self.journal_one, start, end)
+        rollups.compact(30, delete=True)
+
+        self.assertFalse(mm.ArticleAccess.objects.exists())
+        self.assertEqual(
+            logic.get_accesses(self.journal_one, start, end),
+            before,
+        )
+        article = logic.get_articles(self.journal_one, start, end).get(
+            pk=self.article.pk,
+        )
+        self.assertEqual(article.pdf_downloads, 2)
+        self.assertEqual(article.abstract_views, 1)
+
+
+class TestCounterUsage(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        for identifier, hour, galley_type in [
+            ('a', 9, None),
+            ('a', 9, 'pdf'),
+            ('a', 9, 'pdf'),
+            ('a', 10, 'pdf'),
+            ('b', 9, None),
+        ]:
+            access = mm.ArticleAccess.objects.create(
+                article=self.article,
+                type='view',
+                identifier=identifier,
+                galley_type=galley_type,
+            )
+            mm.ArticleAccess.objects.filter(pk=access.pk).update(
+                accessed=timezone.make_aware(datetime(2020, 1, 1, hour)),
+            )
+
+    def test_unique_metrics_count_sessions(self):
+        usage = counter.summarise(mm.ArticleAccess.objects.all())
+        self.assertEqual(len(usage), 1)
+        row = list(usage.values())[0]
+        self.assertEqual(row['total_investigations'], 5)
+        self.assertEqual(row['unique_investigations'], 3)
+        self.assertEqual(row['total_requests'], 3)
+        self.assertEqual(row['unique_requests'], 2)
+
+    def test_built_and_live_usage_match(self):
+        journals = jm.Journal.objects.filter(pk=self.journal_one.pk)
+        month = datetime(2020, 1, 1).date()
+        live = counter.monthly_usage('journal', journals, month, month)
+        counter.build(until=datetime(2020, 2, 1).date())
+        built = counter.monthly_usage('journal', journals, month, month)
+        self.assertEqual(live, built)
+
+    def test_built_and_live_unique_visitors_match(self):
+        journals = jm.Journal.objects.filter(pk=self.journal_one.pk)
+        live = counter.unique_visitors(
+            'article', journals, '2020-01-01', '2020-01-02',
+        )
+        counter.build(until=datetime(2020, 2, 1).date())
+        built = counter.unique_visitors(
+            'article', journals, '2020-01-01', '2020-01-02',
+        )
+        self.assertEqual(live, ({self.article.pk: 2}, 2))
+        self.assertEqual(built, live)
+
+
+class TestComparison(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        for year, access_type in [
+            (2020, 'view'),
+            (2020, 'download'),
+            (2021, 'view'),
+            (2021, 'view'),
+            (2021, 'view'),
+        ]:
+            access = mm.ArticleAccess.objects.create(
+                article=self.article,
+                type=access_type,
+                identifier='a',
+            )
+            mm.ArticleAccess.objects.filter(pk=access.pk).update(
+                accessed=timezone.make_aware(datetime(year, 3, 1, 9)),
+            )
+
+    def test_previous_period_has_the_same_length(self):
+        start, end, prior_start, prior_end = comparison.prior_range(
+            '2021-03-01', '2021-03-31', 'previous',
+        )
+        self.assertEqual(prior_end.date(), date(2021, 2, 28))
+        self.assertEqual(prior_end - prior_start, end - start)
+
+    def test_press_against_last_year(self):
+        journals = jm.Journal.objects.filter(
+            pk__in=[self.journal_one.pk, self.journal_two.pk],
+        ).order_by('code')
+        result = comparison.press_comparison(
+            journals, '2021-01-01', '2021-12-31', 'year',
+        )
+        views, downloads = result.totals[-2:]
+        self.assertEqual((views.current, views.prior), (3, 1))
+        self.assertEqual((views.change, views.percent), (2, 200.0))
+        self.assertEqual((downloads.change, downloads.percent), (-1, -100.0))
+
+
+class TestPressUsers(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        helpers.create_roles(['editor', 'reviewer'])
+        helpers.create_user(
+            'one@example.org', ['editor', 'reviewer'], self.journal_one,
+        )
+        helpers.create_user('two@example.org', ['reviewer'], self.journal_one)
+
+    def test_annotated_users_match_journal_users(self):
+        journals = logic.press_journal_report_data(
+            jm.Journal.objects.all().order_by('code'),
+            '2020-01-01',
+            '2020-12-31',
+        )
+        for journal in journals:
+            self.assertEqual(journal.users, len(journal.journal_users()))
+        self.assertEqual(
+            {journal.pk: journal.users for journal in journals}[
+                self.journal_one.pk
+            ],
+            2,
+        )
+
+
+@skipUnless(columnar.available(), 'pyarrow is not installed')
+class TestColumnarArchive(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.article = helpers.create_article(self.journal_one)
+        self.directory = tempfile.mkdtemp()
+
+    def access(self, month, access_type='view'):
+        access = mm.ArticleAccess.objects.create(
+            article=self.article,
+            type=access_type,
+            identifier='a',
+        )
+        mm.ArticleAccess.objects.filter(pk=access.pk).update(
+            accessed=timezone.make_aware(datetime(2024, month, 10)),
+        )
+
+    def test_incremental_export_matches_the_database(self):
+        self.access(1)
+        self.access(2, 'download')
+        self.assertEqual(
+            columnar.export(self.directory)['article_access'], 2,
+        )
+        self.access(2)
+        self.assertEqual(
+            columnar.export(self.directory)['article_access'], 1,
+        )
+
+        usage = columnar.Archive(self.directory).journal_usage(
+            '2024-01-01', '2024-12-31',
+        )
+        self.assertEqual(
+            sorted((row['type'], row['total']) for row in usage),
+            [('download', 1), ('view', 2)],
+        )
+
+    def test_rows_committed_late_are_exported(self):
+        # A recent access whose transaction commits after a later id
+        late = mm.ArticleAccess.objects.create(
+            article=self.article, type='view', identifier='a',
+        )
+        self.access(2)
+        self.assertEqual(
+            columnar.export(self.directory)['article_access'], 1,
+        )
+        with override_settings(REPORTING_ARCHIVE_LAG_SECONDS=0):
+            self.assertEqual(
+                columnar.export(self.directory)['article_access'], 1,
+            )
+        self.assertEqual(
+            len(columnar.Archive(self.directory).article_usage(
+                late.accessed, late.accessed,
+            )),
+            1,
+        )
+
+    def test_compacted_accesses_stop_the_export(self):
+        self.access(1)
+        columnar.export(self.directory)
+        self.access(3)
+        models.CompactionState.objects.update_or_create(
+            pk=1, defaults={'compacted_before': date(2024, 2, 1)},
+        )
+        rollups._state['checked'] = 0
+        self.addCleanup(rollups._state.update, checked=0)
+        with self.assertRaises(columnar.ArchiveError):
+            columnar.export(self.directory)
+
+
+class TestSnapshots(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+
+    def test_standard_periods(self):
+        periods = snapshots.standard_periods(datetime(2024, 5, 15).date())
+        self.assertEqual(
+            [(start.isoformat(), end.isoformat())
+             for _, start, end in periods.values()],
+            [
+                ('2024-04-01', '2024-04-30'),
+                ('2024-01-01', '2024-03-31'),
+                ('2024-01-01', '2024-05-15'),
+            ],
+        )
+
+    def test_snapshot_found_for_matching_request(self):
+        _, start, end = snapshots.standard_periods()['last_month']
+        snapshots.compute('geo', self.journal_one, 'last_month', start, end)
+
+        snapshot = snapshots.find(
+            'geo', self.journal_one.pk, start.isoformat(), end.isoformat(),
+        )
+        self.assertIsNotNone(snapshot)
+        self.assertIn('countries', snapshots.context(snapshot))
+        self.assertIsNone(snapshots.find(
+            'geo', self.journal_two.pk, start.isoformat(), end.isoformat(),
+        ))
+
+
+    def test_outdated_snapshots_are_pruned(self):
+        snapshots.compute_all(['licenses'], today=date(2024, 5, 15))
+        snapshots.compute_all(['licenses'], today=date(2024, 5, 16))
+        self.assertEqual(
+            sorted(models.ReportSnapshot.objects.values_list(
+                'period', 'start_date', 'end_date',
+            )),
+            [
+                ('last_month', date(2024, 4, 1), date(2024, 4, 30)),
+                ('last_quarter', date(2024, 1, 1), date(2024, 3, 31)),
+                ('year_to_date', date(2024, 1, 1), date(2024, 5, 16)),
+            ],
+        )
+
+    @override_settings(REPORTING_SNAPSHOT_MAX_AGE_SECONDS=3600)
+    def test_old_snapshots_are_not_served(self):
+        _, start, end = snapshots.standard_periods()['last_month']
+        snapshot = snapshots.compute('licenses', None, 'last_month', start, end)
+        models.ReportSnapshot.objects.filter(pk=snapshot.pk).update(
+            computed=timezone.now() - timedelta(hours=2),
+        )
+        self.assertIsNone(snapshots.find(
+            'licenses', None, start.isoformat(), end.isoformat(),
+        ))
+
+
+class TestReportJobs(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        self.parameters = {
+            'start_date': '2024-01-01',
+            'end_date': '2024-12-31',
+            'journal_id': self.journal_one.pk,
+            'crosscheck': False,
+        }
+
+    def test_identical_pending_jobs_are_deduplicated(self):
+        first, created = jobs.enqueue('review', self.parameters)
+        self.assertTrue(created)
+        second, created = jobs.enqueue('review', dict(self.parameters))
+        self.assertFalse(created)
+        self.assertEqual(first.pk, second.pk)
+
+    def test_jobs_are_deduplicated_per_user(self):
+        helpers.create_roles(['editor'])
+        editor = helpers.create_user(
+            'editor@example.org', ['editor'], self.journal_one,
+        )
+        first, _ = jobs.enqueue('review', self.parameters)
+        second, created = jobs.enqueue('review', self.parameters, editor)
+        self.assertTrue(created)
+        self.assertNotEqual(first.pk, second.pk)
+
+    def test_reports_run_live_without_cost_thresholds(self):
+        self.assertIsNone(cost.check('2014-01-01', '2024-12-31'))
+
+    @override_settings(
+        REPORTING_OFFLOAD_ROWS=1000,
+        REPORTING_REFUSE_ROWS=10000,
+    )
+    def test_costly_reports_are_offloaded_or_refused(self):
+        with mock.patch.object(cost, 'estimate_accesses', return_value=500):
+            self.assertIsNone(cost.check('2024-01-01', '2024-12-31'))
+        with mock.patch.object(cost, 'estimate_accesses', return_value=5000):
+            estimate = cost.check('2024-01-01', '2024-12-31')
+        self.assertEqual(estimate.verdict, cost.OFFLOAD)
+        self.assertFalse(estimate.refused)
+        with mock.patch.object(cost, 'estimate_accesses', return_value=50000):
+            estimate = cost.check('2024-01-01', '2024-12-31')
+        self.assertTrue(estimate.refused)
+        self.assertEqual(estimate.rows, 50000)
+
+    @override_settings(REPORTING_STATEMENT_TIMEOUT=5)
+    def test_streamed_reports_run_under_the_statement_timeout(self):
+        def rows():
+            yield '{}\n'.format(jm.Journal.objects.count())
+
+        @instrumentation.report('test')
+        def view(request):
+            return StreamingHttpResponse(instrumentation.track_stream(rows()))
+
+        statements = {connection.vendor: ('SELECT {:d}', 'SELECT 0')}
+        with mock.patch.dict(cost.TIMEOUT_STATEMENTS, statements):
+            response = view(RequestFactory().get('/'))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(b''.join(response.streaming_content), b'2\n')
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(sql[0], 'SELECT 5000')
+        self.assertIn('COUNT', sql[1])
+        self.assertEqual(sql[2], 'SELECT 0')
+
+    @override_settings(REPORTING_EXECUTION_RETENTION_DAYS=30)
+    def test_old_executions_are_pruned(self):
+        now = timezone.now()
+        for days in (1, 29, 31, 400):
+            models.ReportExecution.objects.create(
+                report='test', path='/', started=now - timedelta(days=days),
+            )
+        self.assertEqual(instrumentation.prune_executions(batch_size=1), 2)
+        self.assertEqual(
+            sorted(
+                (now - started).days for started in
+                models.ReportExecution.objects.values_list('started', flat=True)
+            ),
+            [1, 29],
+        )
+
+    @override_settings(REPORTING_EXECUTION_RETENTION_DAYS=30)
+    def test_instrumentation_page_clamps_days(self):
+        request = RequestFactory().get('/', {'days': '10' * 10})
+        request.user = mock.Mock(is_active=True, is_staff=True)
+        with mock.patch.object(views, 'render') as render:
+            views.report_instrumentation(request)
+        self.assertEqual(render.call_args[0][2]['days'], 30)
+
+    def test_press_job_saves_progress(self):
+        job, _ = jobs.enqueue('press', self.parameters)
+        job = jobs.claim()
+        models.ReportJob.objects.filter(pk=job.pk).update(
+            updated=timezone.now() - jobs.STALE_AFTER * 2,
+        )
+        progress = jobs.Progress(job)
+        with mock.patch.object(jobs, 'PROGRESS_INTERVAL', 0):
+            jobs.run_press(self.parameters, StringIO(), progress)
+        job.refresh_from_db()
+        self.assertEqual(job.rows, 2)
+        self.assertGreater(job.updated, timezone.now() - jobs.STALE_AFTER)
+
+    def test_article_jobs_need_a_journal(self):
+        parameters = dict(self.parameters, journal_id=None)
+        with self.assertRaises(ValueError):
+            jobs.run_articles(parameters, StringIO(), mock.Mock())
+
+    def test_enqueue_rejects_an_invalid_journal_id(self):
+        staff = helpers.create_user('staff@example.org')
+        staff.is_staff = True
+        staff.save()
+        request = RequestFactory().post('/', {'journal_id': 'abc'})
+        request.user = staff
+        request.journal = None
+        with self.assertRaises(Http404):
+            views.report_job_enqueue(request, 'press')
+
+    def test_claimed_job_is_not_claimed_again(self):
+        job, _ = jobs.enqueue('review', self.parameters)
+        self.assertEqual(jobs.claim().pk, job.pk)
+        self.assertIsNone(jobs.claim())
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    REPORTING_CACHE_BACKGROUND_REFRESH=False,
+)
+class TestReportCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value):
+        self.calls.append(value)
+        return len(self.calls)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        expired = caching.cached(0)(self.compute)
+        self.assertEqual(expired('a'), 1)
+        # Expired at once: served stale while it is recomputed
+        self.assertEqual(expired('a'), 1)
+        self.assertEqual(expired('a'), 2)
+        self.assertEqual(len(self.calls), 3)
+
+    @override_settings(REPORTING_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        cached = caching.cached(300)(self.compute)
+        for value in ('a', 'b', 'c'):
+            cached(value)
+        self.assertEqual(len(cache.get(caching.REGISTRY_KEY)), 2)
+        cached('a')
+        self.assertEqual(self.calls, ['a', 'b', 'c', 'a'])
+
+    def test_concurrent_registrations_are_not_lost(self):
+        def register(index):
+            caching.register(
+                'key-{}'.format(index), time.time(), 'function', (index,),
+            )
+
+        threads = [
+            threading.Thread(target=register, args=(index,))
+            for index in range(20)
+        ]
+        with mock.patch.object(caching, 'WAIT_INTERVAL', 0.001):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(caching.registry()), 20)
+
+    def test_hits_stamp_their_use_without_reading_the_registry(self):
+        cached = caching.cached(300)(self.compute)
+        cached('a')
+        key, = caching.stored_entries()
+        cache.set(caching.used_key(key), time.time() - 600, None)
+        with mock.patch.object(
+            caching, 'stored_entries', side_effect=AssertionError,
+        ):
+            cached('a')
+        self.assertGreater(caching.registry()[key]['used'], time.time() - 60)
+
+    def test_registry_keeps_a_short_label_of_the_parameters(self):
+        caching.register('key', time.time(), 'function', ('x' * 10000,))
+        entry = caching.stored_entries()['key']
+        self.assertLessEqual(
+            len(entry['parameters']), caching.LABEL_LENGTH + 3,
+        )
+
+    @override_settings(REPORTING_PARALLEL_WORKERS=2)
+    def test_warmed_parallel_press_report_is_found(self):
+        helpers.create_press()
+        helpers.create_journals()
+        journals = jm.Journal.objects.filter(is_remote=False).order_by('code')
+        today = date(2024, 5, 15)
+        start_date, end_date = (
+            logic.get_first_day(today), logic.get_last_day(today),
+        )
+        self.assertFalse(
+            logic.press_report_cached(journals, start_date, end_date),
+        )
+        for task in warming.tasks(today):
+            if task.label.startswith('press report'):
+                task.run()
+        self.assertTrue(
+            logic.press_report_cached(journals, start_date, end_date),
+        )
+
+    def test_equivalent_arguments_share_an_entry(self):
+        cached = caching.cached(300, key=lambda value: caching.date_key(value))(
+            self.compute,
+        )
+        cached('2024-01-01')
+        cached(date(2024, 1, 1))
+        cached(value=datetime(2024, 1, 1))
+        self.assertEqual(len(self.calls), 1)
+        name = '{}.compute'.format(self.compute.__module__)
+        self.assertEqual(caching.stats()[name], (2, 1))
+
+    def test_warm_recomputes_fresh_entries(self):
+        cached = caching.cached(300)(self.compute)
+        cached('a')
+        self.assertTrue(cached.warm('a'))
+        self.assertEqual(cached('a'), 2)
+
+
+class TestParallel(TestCase):
+    @override_settings(REPORTING_PARALLEL_WORKERS=4)
+    def test_results_keep_the_order_of_units(self):
+        def slow_first(unit):
+            time.sleep(0.05 if unit == 0 else 0)
+            return unit * 2
+
+        self.assertEqual(
+            parallel.map_units(slow_first, range(6)),
+            [0, 2, 4, 6, 8, 10],
+        )
+
+
+class TestReportingRouter(TestCase):
+    @override_settings(
+        DATABASES=dict(settings.DATABASES, replica=settings.DATABASES['default']),
+        REPORTING_DATABASE='replica',
+    )
+    def test_only_reporting_reads_use_the_replica(self):
+        router = routers.ReportingRouter()
+        self.assertIsNone(router.db_for_read(sm_models.Article))
+        with routers.reading():
+            self.assertEqual(router.db_for_read(sm_models.Article), 'replica')
+            self.assertIsNone(router.db_for_write(sm_models.Article))
+            self.assertIsNone(router.db_for_read(models.ReportJob))
+            self.assertIsNone(router.db_for_read(Session))
+
+
+class TestSampling(TestCase):
+    def test_estimates_scale_the_sample_and_add_exact_counts(self):
+        estimate = sampling.Estimate(10, 0.01, exact=5)
+        self.assertEqual(estimate.value, 1005)
+        self.assertEqual(estimate.margin, 617)
+
+    def test_groups_missing_from_the_sample_keep_a_margin(self):
+        estimates = sampling.Estimates(0.01)
+        self.assertEqual(estimates[(1, 'view')].value, 0)
+        self.assertGreater(estimates[(1, 'view')].margin, 0)
+
+
+    @override_settings(REPORTING_SAMPLE_PERCENT=100, REPORTING_TIMEZONE='UTC')
+    def test_full_sample_counts_every_access(self):
+        helpers.create_press()
+        journal, _ = helpers.create_journals()
+        article = helpers.create_article(journal)
+        for accessed, galley_type in [
+            (datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc), 'pdf'),
+            (datetime(2024, 2, 1, 0, 30, tzinfo=dt_timezone.utc), 'pdf'),
+            (datetime(2024, 2, 10, tzinfo=dt_timezone.utc), None),
+        ]:
+            access = mm.ArticleAccess.objects.create(
+                article=article,
+                type='view',
+                identifier='a',
+                galley_type=galley_type,
+            )
+            mm.ArticleAccess.objects.filter(pk=access.pk).update(
+                accessed=accessed,
+            )
+
+        estimates = sampling.sample(
+            ['journal', 'type'],
+            datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 2, 29, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(estimates[(journal.pk, 'view')].value, 3)
+        self.assertEqual(estimates[(journal.pk, 'view')].margin, 0)
+
+        preview = sampling.usage_by_month_preview(
+            jm.Journal.objects.filter(pk=journal.pk),
+            date(2024, 1, 1),
+            date(2024, 2, 1),
+        )
+        self.assertEqual(preview.columns, ['2024-01', '2024-02'])
+        self.assertEqual(
+            [estimate.value for estimate in preview.rows[0][1]], [1, 1],
+        )
+
+
+class TestSketches(TestCase):
+    def test_merged_sketches_estimate_the_union(self):
+        first, second = sketches.HyperLogLog(), sketches.HyperLogLog()
+        for value in range(3000):
+            first.add(value)
+        for value in range(2000, 5000):
+            second.add(value)
+        merged = sketches.HyperLogLog.from_bytes(first.to_bytes())
+        merged.merge(second.to_bytes())
+        self.assertAlmostEqual(merged.count(), 5000, delta=500)
+
+    def test_small_sketches_are_stored_sparse(self):
+        sketch = sketches.HyperLogLog()
+        for value in range(10):
+            sketch.add(value)
+        data = sketch.to_bytes()
+        self.assertEqual(data[0], sketches.SPARSE)
+        self.assertEqual(sketches.HyperLogLog.from_bytes(data).count(), 10)
+
+
+class TestLeaderboards(TestCase):
+    def test_heap_keeps_the_top_k(self):
+        heap = []
+        for article_id in range(1, 201):
+            leaderboards.push(heap, article_id % 100, article_id)
+        top = leaderboards.ranked(heap)
+        self.assertEqual(len(top), leaderboards.K)
+        self.assertEqual(top[:3], [(99, 99), (199, 99), (98, 98)])
+        self.assertEqual(top[-1], (175, 75))
+
+
+class TestDashboard(TestCase):
+    @override_settings(REPORTING_DASHBOARD_TIMEOUT=0.2)
+    def test_slow_sections_do_not_block_the_others(self):
+        sections = {
+            name: lambda *args, name=name: name for name in dashboard.SECTIONS
+        }
+        sections['countries'] = lambda *args: time.sleep(1)
+        with mock.patch.dict(dashboard.SECTIONS, sections):
+            started = time.monotonic()
+            data = async_to_sync(dashboard.gather)(
+                None, '2024-01-01', '2024-01-31',
+            )
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(data['timed_out'], ['countries'])
+        self.assertIsNone(data['countries'])
+        self.assertEqual(data['licenses'], 'licenses')
+
+
+class TestIndexAdvisor(TestCase):
+    def setUp(self):
+        self.press = helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+
+    def test_every_report_can_be_explained(self):
+        querysets = generate_metrics_indexes.report_querysets(
+            timezone.make_aware(datetime(2024, 1, 1)),
+            timezone.make_aware(datetime(2024, 12, 31)),
+        )
+        for report, queryset in querysets.items():
+            self.assertIsInstance(queryset, QuerySet, report)
+
+
+class TestGenerateReportingData(TestCase):
+    def generate(self):
+        call_command(
+            'generate_reporting_data',
+            journals=1, articles=2, accesses=10, users=2, months=1,
+            stdout=StringIO(),
+        )
+
+    def test_existing_prefix_is_refused(self):
+        helpers.create_press()
+        self.generate()
+        with self.assertRaisesMessage(CommandError, 'prefix BMK'):
+            self.generate()
+
+    def test_historical_dates_restores_fields(self):
+        added = synthetic.model_field(pm.ProductionAssignment, 'assigned')
+        plain = synthetic.model_field(models.ReportExecution, 'started')
+        with synthetic.historical_dates(added, plain):
+            self.assertFalse(added.auto_now_add)
+        self.assertTrue(added.auto_now_add)
+        self.assertFalse(plain.auto_now_add)
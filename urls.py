@@ -66,9 +66,37 @@ urlpatterns = [
     re_path(r'^repository/metrics/$',
         views.report_preprints_metrics,
         name='report_preprints_metrics'),
+    re_path(r'^counter/(?P<report_id>TR_J1|TR_J3|IR)/$',
+        views.report_counter,
+        name='reporting_counter'),
+    re_path(r'^jobs/$',
+        views.report_jobs,
+        name='reporting_jobs'),
+    re_path(r'^jobs/(?P<report>[a-z_]+)/enqueue/$',
+        views.report_job_enqueue,
+        name='reporting_job_enqueue'),
+    re_path(r'^jobs/(?P<job_id>\d+)/download/$',
+        views.report_job_download,
+        name='reporting_job_download'),
+    re_path(r'^instrumentation/$',
+        views.report_instrumentation,
+        name='reporting_instrumentation'),
     re_path(
         r'^api/geo/$',
         views.geographical_data,
         name='api_geographical_data'
     ),
+    re_path(r'^leaderboards/$',
+        views.report_leaderboards,
+        name='reporting_leaderboards'),
+    re_path(
+        r'^api/leaderboards/(?P<period>week|month|year)/$',
+        views.leaderboard_data,
+        name='api_leaderboard_data'
+    ),
+    re_path(
+        r'^api/dashboard/$',
+        views.dashboard_data,
+        name='api_dashboard_data'
+    ),
 ]
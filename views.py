@@ -1,4 +1,6 @@
-from django.http import HttpResponse
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import (
     get_object_or_404,
     Http404,
@@ -9,10 +11,10 @@ from django.shortcuts import (
 from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
 
+from asgiref.sync import sync_to_async
 from rest_framework import response
 from rest_framework.decorators import api_view, permission_classes
 
-from core import models as core_models
 from journal import models
 from production import models as pm
 from security.decorators import editor_user_required, is_repository_manager
@@ -23,7 +25,23 @@ from api import permissions as api_permissions
 from utils import plugins
 from repository import models as repository_models
 
-from plugins.reporting import forms, logic, serializers
+from plugins.reporting import (
+    comparison,
+    cost,
+    counter,
+    dashboard,
+    forms,
+    instrumentation,
+    jobs,
+    leaderboards,
+    logic,
+    parallel,
+    sampling,
+    serializers,
+    snapshots,
+)
+from plugins.reporting.decorators import report_watermark
+from plugins.reporting.models import ReportJob
 
 
 @editor_user_required
@@ -59,6 +77,11 @@ def index(request):
 
 
 @editor_user_required
+@instrumentation.report('articles')
+@report_watermark('articles', [
+    logic.ACCESS_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+    logic.SNAPSHOT_WATERMARK,
+])
 def report_articles(request, journal_id):
     """
     Displays views and downloads for each article in a journal.
@@ -72,31 +95,73 @@ def report_articles(request, journal_id):
         raise Http404
 
     start_date, end_date = logic.get_start_and_end_date(request)
-    journals = logic.press_journal_report_data(
-        journals,
-        start_date,
-        end_date,
-    )
-    articles = logic.get_articles(journals.first(), start_date, end_date)
     date_form = forms.DateForm(
         initial={'start_date': start_date, 'end_date': end_date}
     )
-    if request.POST:
-        return logic.export_article_csv(articles, journals.first())
-
     template = 'reporting/report_articles.html'
     context = {
-        'journal': journals.first(),
-        'articles': articles,
         'start_date': start_date,
         'end_date': end_date,
         'date_form': date_form,
+        'standard_periods': snapshots.standard_periods(),
     }
 
-    return render(request, template, context)
+    if request.GET.get('compare') in comparison.COMPARISONS:
+        return render_comparison(
+            request, journals.first().name, journals.first(), (
+                lambda: comparison.articles_comparison(
+                    journals.first(), start_date, end_date,
+                    request.GET['compare'],
+                )
+            ), context,
+        )
+
+    snapshot = snapshots.find('articles', journal_id, start_date, end_date)
+    if snapshot and not request.POST:
+        context.update(snapshots.context(snapshot))
+        return instrumentation.render(request, template, context)
+
+    if request.GET.get('preview'):
+        return render_preview(request, journals.first().name, (
+            sampling.articles_preview(journals.first(), start_date, end_date)
+        ))
+
+    estimate = cost.check(start_date, end_date, journals.first())
+    if estimate:
+        context.update({
+            'estimate': estimate,
+            'job_report': 'articles',
+            'journal': journals.first(),
+        })
+        return instrumentation.render(
+            request, 'reporting/report_too_large.html', context,
+        )
+
+    journals = logic.press_journal_report_data(
+        journals,
+        start_date,
+        end_date,
+    )
+    articles = logic.get_articles(journals.first(), start_date, end_date)
+    if request.POST:
+        return logic.export_article_csv(articles, journals.first())
+
+    context['journal'] = journals.first()
+    context['articles'] = articles
+    context['unique_visitors'], context['unique_items'] = (
+        counter.annotate_article_uniques(
+            articles, journals.first(), start_date, end_date,
+        )
+    )
+
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('journal_usage_by_month')
+@report_watermark('usage_by_month', [
+    logic.ACCESS_WATERMARK, logic.JOURNAL_WATERMARK,
+])
 def report_journal_usage_by_month(request):
     """
     Presents a table of usage information by month between two supplied months.
@@ -111,6 +176,25 @@ def report_journal_usage_by_month(request):
         }
     )
 
+    if request.GET.get('preview'):
+        return render_preview(request, 'Journal Usage by Month', (
+            sampling.usage_by_month_preview(
+                models.Journal.objects.filter(
+                    is_remote=False, hide_from_press=False,
+                ),
+                timezone.datetime(
+                    int(date_parts['start_month_y']),
+                    int(date_parts['start_month_m']),
+                    1,
+                ).date(),
+                timezone.datetime(
+                    int(date_parts['end_month_y']),
+                    int(date_parts['end_month_m']),
+                    1,
+                ).date(),
+            )
+        ))
+
     data, dates, max_, min_ = logic.journal_usage_by_month_data(date_parts)
 
     if request.POST:
@@ -125,10 +209,14 @@ def report_journal_usage_by_month(request):
         "minimum": min_,
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('production')
+@report_watermark('production', [
+    logic.PRODUCTION_WATERMARK, logic.ARTICLE_WATERMARK,
+])
 def report_production(request):
     """
     Presents information about lead times for production assignents
@@ -175,10 +263,14 @@ def report_production(request):
         'time_to_completion': logic.average(all_completion_times)
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('geo')
+@report_watermark('geo', [
+    logic.ACCESS_WATERMARK, logic.ARTICLE_WATERMARK, logic.SNAPSHOT_WATERMARK,
+])
 def report_geo(request, journal_id=None):
     if journal_id:
         journal = get_object_or_404(models.Journal, pk=journal_id)
@@ -190,6 +282,26 @@ def report_geo(request, journal_id=None):
     date_form = forms.DateForm(
         initial={'start_date': start_date, 'end_date': end_date}
     )
+    template = 'reporting/report_geo.html'
+    context = {
+        'journal': journal,
+        'start_date': start_date,
+        'end_date': end_date,
+        'date_form': date_form,
+        'standard_periods': snapshots.standard_periods(),
+    }
+
+    snapshot = snapshots.find(
+        'geo', journal.pk if journal else None, start_date, end_date,
+    )
+    if snapshot and not request.POST:
+        context.update(snapshots.context(snapshot))
+        return instrumentation.render(request, template, context)
+
+    if request.GET.get('preview'):
+        return render_preview(request, 'Geographical Spread', (
+            sampling.geo_preview(journal, start_date, end_date)
+        ))
 
     countries = logic.acessses_by_country(
         journal,
@@ -200,20 +312,15 @@ def report_geo(request, journal_id=None):
     if request.POST:
         return logic.export_country_csv(countries)
 
-    template = 'reporting/report_geo.html'
-    context = {
-        'journal': journal,
-        'countries': countries,
-        'start_date': start_date,
-        'end_date': end_date,
-        'date_form': date_form,
-    }
+    context['countries'] = countries
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @api_view(['GET'])
 @permission_classes((api_permissions.IsEditor, ))
+@instrumentation.report('geographical_data')
+@report_watermark('api_geo', [logic.ACCESS_WATERMARK, logic.ARTICLE_WATERMARK])
 def geographical_data(request):
     start_date, end_date = logic.get_start_and_end_date(request)
 
@@ -233,17 +340,57 @@ def geographical_data(request):
 
 
 @editor_user_required
+@instrumentation.report('press')
+@report_watermark('press', [
+    logic.ACCESS_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+    logic.USER_WATERMARK, logic.SNAPSHOT_WATERMARK,
+])
 def press(request):
     start_date, end_date = logic.get_start_and_end_date(request)
     date_form = forms.DateForm(
         initial={'start_date': start_date, 'end_date': end_date}
     )
+    template = 'reporting/press.html'
+    context = {
+        'date_form': date_form,
+        'standard_periods': snapshots.standard_periods(),
+    }
 
     journals = models.Journal.objects.filter(
         is_remote=False,
     ).order_by('code')
 
-    journals = logic.press_journal_report_data(
+    if request.GET.get('compare') in comparison.COMPARISONS:
+        return render_comparison(request, 'Press Report', None, (
+            lambda: comparison.press_comparison(
+                journals, start_date, end_date, request.GET['compare'],
+            )
+        ), context)
+
+    snapshot = snapshots.find('press', None, start_date, end_date)
+    if snapshot and not request.POST:
+        context.update(snapshots.context(snapshot))
+        return instrumentation.render(request, template, context)
+
+    if request.GET.get('preview'):
+        return render_preview(request, 'Press Report', (
+            sampling.press_preview(journals, start_date, end_date)
+        ))
+
+    cached = logic.press_report_cached(journals, start_date, end_date)
+    estimate = None if cached else cost.check(start_date, end_date)
+    if estimate:
+        context.update({
+            'estimate': estimate,
+            'job_report': 'press',
+            'start_date': start_date,
+            'end_date': end_date,
+        })
+        return instrumentation.render(
+            request, 'reporting/report_too_large.html', context,
+        )
+
+    journals = logic.press_report(
         journals,
         start_date,
         end_date,
@@ -252,16 +399,17 @@ def press(request):
     if request.POST:
         return logic.export_press_csv(journals)
 
-    template = 'reporting/press.html'
-    context = {
-        'date_form': date_form,
-        'journals': journals,
-    }
+    context['journals'] = journals
+    context['unique_visitors'], context['unique_items'] = (
+        counter.annotate_journal_uniques(journals, start_date, end_date)
+    )
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('review')
+@report_watermark('review', [logic.REVIEW_WATERMARK, logic.ARTICLE_WATERMARK])
 def report_review(request, journal_id=None):
     start_date, end_date = logic.get_start_and_end_date(request)
     date_form = forms.DateForm(
@@ -297,10 +445,14 @@ def report_review(request, journal_id=None):
         'review_stats': review_stats,
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('citations')
+@report_watermark('citations', [
+    logic.CITATION_WATERMARK, logic.ARTICLE_WATERMARK,
+])
 def report_citations(request):
     year = logic.get_year(request)
     all_time = request.GET.get('all_time', False)
@@ -344,17 +496,19 @@ def report_citations(request):
         'all_time': all_time,
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('all_citations')
+@report_watermark('all_citations', [
+    logic.CITATION_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+])
 def report_all_citations(request):
     journals = jm.Journal.objects.filter(hide_from_press=False)
 
-    total_counter = 0
-    for journal in journals:
-        logic.get_journal_citations(journal=journal)
-        total_counter = total_counter + journal.citation_count
+    parallel.map_units(logic.get_journal_citations, journals)
+    total_counter = sum(journal.citation_count for journal in journals)
 
     if request.POST:
         return logic.export_journal_level_citations(journals)
@@ -365,10 +519,14 @@ def report_all_citations(request):
         'total_counter': total_counter,
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('journal_citations')
+@report_watermark('journal_citations', [
+    logic.CITATION_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+])
 def report_journal_citations(request, journal_id):
     journal = get_object_or_404(jm.Journal, pk=journal_id)
     articles = logic.get_journal_citations(journal)
@@ -382,10 +540,14 @@ def report_journal_citations(request, journal_id):
         'articles': articles,
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('article_citing_works')
+@report_watermark('article_citing_works', [
+    logic.CITATION_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+])
 def report_article_citing_works(request, journal_id, article_id):
     journal = get_object_or_404(jm.Journal, pk=journal_id)
     article = get_object_or_404(sm.Article, pk=article_id)
@@ -401,10 +563,11 @@ def report_article_citing_works(request, journal_id, article_id):
         'links': article.articlelink_set.all(),
     }
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @staff_member_required
+@instrumentation.report('book_citations')
 def report_book_citations(request):
     # Check if the books plugin exists or not.
     if not plugins.check_plugin_exists('books'):
@@ -432,7 +595,7 @@ def report_book_citations(request):
         'books': books,
         'all_book_links': all_book_links,
     }
-    return render(
+    return instrumentation.render(
         request,
         template,
         context,
@@ -440,6 +603,7 @@ def report_book_citations(request):
 
 
 @staff_member_required
+@instrumentation.report('book_citing_works')
 def report_book_citing_works(request, book_id):
     """
     Displays citing works for a given book.
@@ -464,7 +628,7 @@ def report_book_citing_works(request, book_id):
         'book': book,
         'links': links,
     }
-    return render(
+    return instrumentation.render(
         request,
         template,
         context,
@@ -472,6 +636,7 @@ def report_book_citing_works(request, book_id):
 
 
 @editor_user_required
+@instrumentation.report('crossref_dois')
 def report_crossref_dois(request, journal_id=None):
     """ A view that returns a report for Crossref mapping DOIs to URLS in tsv
     :param journal_id: A journal ID to filter the DOI identifiers by
@@ -488,6 +653,7 @@ def report_crossref_dois(request, journal_id=None):
 
 
 @editor_user_required
+@instrumentation.report('crossref_dois_crosscheck')
 def report_crossref_dois_crosscheck(request, journal_id=None):
     """ A view that returns a report for Crosscheck mapping DOIs to URLS in tsv
     :param journal_id: A journal ID to filter the DOI identifiers by
@@ -506,6 +672,10 @@ def report_crossref_dois_crosscheck(request, journal_id=None):
 
 
 @editor_user_required
+@instrumentation.report('licenses')
+@report_watermark('licenses', [
+    logic.ARTICLE_WATERMARK, logic.SNAPSHOT_WATERMARK,
+])
 def report_licenses(request):
     """
     Displays License information per journal and across all journals
@@ -518,21 +688,26 @@ def report_licenses(request):
     date_form = forms.DateForm(
         initial={'start_date': start_date, 'end_date': end_date}
     )
-
-    data = logic.license_report(start_date, end_date)
-
     template = 'reporting/report_licenses.html'
     context = {
         'start_date': start_date,
         'end_date': end_date,
         'date_form': date_form,
-        'data': data,
+        'standard_periods': snapshots.standard_periods(),
     }
 
-    return render(request, template, context)
+    snapshot = snapshots.find('licenses', None, start_date, end_date)
+    if snapshot:
+        context.update(snapshots.context(snapshot))
+    else:
+        context['data'] = logic.license_report(start_date, end_date)
+
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('workflow')
+@report_watermark('workflow', [logic.ARTICLE_WATERMARK])
 def report_workflow(request):
     """
     Shows average times for:
@@ -578,16 +753,11 @@ def report_workflow(request):
         'averages': averages,
     }
 
-    return render(request, template, context)
-
-
-AUTHOR_REPORT_HEADERS = [
-        "Author Name", "Author Email", "Author Affiliation",
-        "Article ID", "Article Title", "Date Published",
-]
+    return instrumentation.render(request, template, context)
 
 
 @editor_user_required
+@instrumentation.report('authors')
 def report_authors(request):
     start_date, end_date = logic.get_start_and_end_date(request)
     date_form = forms.DateForm(
@@ -596,37 +766,30 @@ def report_authors(request):
     row_generator = None
 
     if request.GET:
-        accounts = core_models.Account.objects.filter(
-            authors__date_published__gte=start_date,
-            authors__date_published__lte=end_date,
+        accounts = logic.author_report_accounts(
+            start_date, end_date, request.journal,
         )
-        if request.journal:
-            accounts = accounts.filter(authors__journal=request.journal)
-
         # This is a fairly expensive report, avoid memoizing entire set
-        row_generator = (
-            (
-                account.full_name(), account.email, account.affiliation(),
-                article.id, article.title, article.date_published
-            )
-            for account in accounts
-            for article in account.published_articles()
-        )
+        row_generator = logic.author_rows(accounts)
         if "csv" in request.GET:
             return logic.stream_csv(
-                AUTHOR_REPORT_HEADERS, row_generator, "author_report.csv")
+                logic.AUTHOR_REPORT_HEADERS,
+                row_generator,
+                "author_report.csv",
+            )
     context = {
-        "headers": AUTHOR_REPORT_HEADERS,
+        "headers": logic.AUTHOR_REPORT_HEADERS,
         "rows": row_generator,
         "date_form": date_form,
     }
 
     template = 'reporting/report_authors.html'
 
-    return render(request, template, context)
+    return instrumentation.render(request, template, context)
 
 
 @is_repository_manager
+@instrumentation.report('preprints_metrics')
 def report_preprints_metrics(request):
     form = forms.DateRangeForm(
         start_date=request.GET.get('start_date'),
@@ -654,8 +817,305 @@ def report_preprints_metrics(request):
         'preprints': preprints,
         'form': form,
     }
-    return render(
+    return instrumentation.render(
         request,
         template,
         context,
-    )
\ No newline at end of file
+    )
+
+
+@staff_member_required
+def report_instrumentation(request):
+    """
+    Summarises the recorded timings of the reports, slowest first.
+    :param request: HttpRequest object
+    :return: HttpResponse
+    """
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 7
+    days = min(max(days, 1), instrumentation.retention_days())
+    per_report, slowest = logic.instrumentation_summary(
+        timezone.now() - timezone.timedelta(days=days),
+    )
+
+    template = 'reporting/report_instrumentation.html'
+    context = {
+        'days': days,
+        'per_report': per_report,
+        'slowest': slowest,
+    }
+
+    return render(request, template, context)
+
+
+@editor_user_required
+@instrumentation.report('leaderboards')
+def report_leaderboards(request):
+    """
+    Lists the most accessed articles of a journal or the press over a
+    rolling period, from the stored leaderboards.
+    :param request: HttpRequest object
+    :return: HttpResponse
+    """
+    period = request.GET.get('period', 'month')
+    if period not in leaderboards.PERIODS:
+        raise Http404
+    if request.journal:
+        journal = request.journal
+    elif request.GET.get('journal'):
+        journal = get_object_or_404(jm.Journal, pk=request.GET['journal'])
+    else:
+        journal = None
+
+    template = 'reporting/report_leaderboards.html'
+    context = {
+        'period': period,
+        'periods': leaderboards.PERIODS,
+        'journal': journal,
+        'journals': jm.Journal.objects.filter(hide_from_press=False),
+        'entries': leaderboards.leaderboard(period, journal),
+    }
+
+    return instrumentation.render(request, template, context)
+
+
+@api_view(['GET'])
+@permission_classes((api_permissions.IsEditor, ))
+@instrumentation.report('leaderboard_data')
+def leaderboard_data(request, period):
+    serializer = serializers.LeaderboardEntrySerializer(
+        leaderboards.leaderboard(period, request.journal),
+        many=True,
+    )
+    return response.Response(
+        data=serializer.data,
+    )
+
+
+async def dashboard_data(request):
+    """
+    Returns the headline numbers of several reports as JSON, computing the
+    independent sections concurrently.
+    :param request: HttpRequest object
+    :return: JsonResponse
+    """
+    allowed = await sync_to_async(
+        api_permissions.IsEditor().has_permission,
+    )(request, None)
+    if not allowed:
+        raise PermissionDenied
+    start_date, end_date = logic.get_start_and_end_date(request)
+    data = await dashboard.gather(request.journal, start_date, end_date)
+    return JsonResponse(data)
+
+
+@editor_user_required
+@instrumentation.report('counter')
+@report_watermark('counter', [
+    logic.ACCESS_WATERMARK, logic.ARTICLE_WATERMARK, logic.JOURNAL_WATERMARK,
+])
+def report_counter(request, report_id):
+    """
+    Serves a COUNTER Release 5 report as TSV, or as JSON with ?format=json.
+    :param request: HttpRequest object
+    :param report_id: str, one of counter.REPORTS
+    :return: StreamingHttpResponse
+    """
+    report = counter.REPORTS.get(report_id)
+    if not report:
+        raise Http404
+    start_month, end_month, date_parts = logic.get_start_and_end_months(
+        request,
+    )
+    try:
+        first_month = timezone.datetime(
+            int(date_parts['start_month_y']), int(date_parts['start_month_m']), 1,
+        ).date()
+        last_month = timezone.datetime(
+            int(date_parts['end_month_y']), int(date_parts['end_month_m']), 1,
+        ).date()
+    except ValueError:
+        raise Http404
+    if last_month < first_month:
+        raise Http404
+
+    journals = models.Journal.objects.all()
+    if request.journal:
+        journals = journals.filter(pk=request.journal.pk)
+
+    if request.GET.get('format') == 'json':
+        stream = counter.stream_json
+    else:
+        stream = counter.stream_tsv
+    return stream(report, journals, first_month, last_month, request.press.name)
+
+
+@editor_user_required
+def report_job_enqueue(request, report):
+    """
+    Queues an expensive report to be run by the run_report_jobs worker.
+    :param request: HttpRequest object
+    :param report: str, one of jobs.REPORTS
+    :return: HttpRedirect
+    """
+    if report not in jobs.REPORTS or not request.POST:
+        raise Http404
+
+    start_date, end_date = logic.get_start_and_end_date(request)
+    if request.journal:
+        journal = request.journal
+    elif request.POST.get('journal_id'):
+        try:
+            journal_id = int(request.POST['journal_id'])
+        except ValueError:
+            raise Http404
+        journal = get_object_or_404(jm.Journal, pk=journal_id)
+        # Editors may only report on the journals they edit
+        if not request.user.check_role(journal, 'editor'):
+            raise PermissionDenied
+    else:
+        journal = None
+    if report == 'articles' and journal is None:
+        raise Http404
+    parameters = {
+        'start_date': request.POST.get('start_date', str(start_date)),
+        'end_date': request.POST.get('end_date', str(end_date)),
+        'journal_id': journal.pk if journal else None,
+        'crosscheck': 'crosscheck' in request.POST,
+    }
+    if report in ('press', 'articles'):
+        estimate = cost.check(
+            parameters['start_date'],
+            parameters['end_date'],
+            parameters['journal_id'],
+        )
+        if estimate and estimate.refused:
+            messages.add_message(
+                request,
+                messages.ERROR,
+                'This range is too large to report on, choose a shorter one.',
+            )
+            return redirect(reverse('reporting_jobs'))
+    job, created = jobs.enqueue(report, parameters, request.user)
+    if created:
+        messages.add_message(
+            request,
+            messages.SUCCESS,
+            '{} queued, it can be downloaded here once it is complete.'.format(
+                jobs.REPORTS[report].label,
+            ),
+        )
+    else:
+        messages.add_message(
+            request,
+            messages.INFO,
+            'An identical {} is already queued.'.format(
+                jobs.REPORTS[report].label,
+            ),
+        )
+    return redirect(reverse('reporting_jobs'))
+
+
+@editor_user_required
+def report_jobs(request):
+    """
+    Lists queued, running and finished background report jobs.
+    :param request: HttpRequest object
+    :return: HttpResponse
+    """
+    job_list = list(visible_jobs(request)[:100])
+    for job in job_list:
+        report = jobs.REPORTS.get(job.report)
+        job.label = report.label if report else job.report
+    template = 'reporting/report_jobs.html'
+    context = {
+        'jobs': job_list,
+        'active': any(
+            job.status in (job.PENDING, job.RUNNING) for job in job_list
+        ),
+    }
+    return render(request, template, context)
+
+
+@editor_user_required
+def report_job_download(request, job_id):
+    """
+    Serves the result file of a complete background report job.
+    :param request: HttpRequest object
+    :param job_id: int, pk of a ReportJob
+    :return: FileResponse
+    """
+    job = get_object_or_404(
+        visible_jobs(request),
+        pk=job_id,
+        status=ReportJob.COMPLETE,
+    )
+    try:
+        result = open(job.file_path, 'rb')
+    except OSError:
+        raise Http404
+    return FileResponse(result, as_attachment=True, filename=job.filename)
+
+
+def render_preview(request, title, preview):
+    """ Renders a sampling.Preview, linking back to the exact report"""
+    exact = request.GET.copy()
+    exact.pop('preview', None)
+    context = {
+        'title': title,
+        'preview': preview,
+        'exact_url': '{}?{}'.format(request.path, exact.urlencode()),
+    }
+    return instrumentation.render(
+        request, 'reporting/report_preview.html', context,
+    )
+
+
+def render_comparison(request, title, journal, compare, context):
+    """ Renders, or exports on POST, a comparison.Comparison, unless either
+    of its ranges is too large to report on live
+    :param compare: a callable returning the Comparison
+    """
+    start_date, end_date = logic.get_start_and_end_date(request)
+    _, _, prior_start, prior_end = comparison.prior_range(
+        start_date, end_date, request.GET['compare'],
+    )
+    estimate = (
+        cost.check(start_date, end_date, journal)
+        or cost.check(prior_start, prior_end, journal)
+    )
+    if estimate:
+        context.update({
+            'estimate': estimate,
+            'journal': journal,
+            'start_date': start_date,
+            'end_date': end_date,
+        })
+        return instrumentation.render(
+            request, 'reporting/report_too_large.html', context,
+        )
+
+    result = compare()
+    if request.POST:
+        return logic.export_csv(result.csv_rows())
+
+    single = request.GET.copy()
+    single.pop('compare', None)
+    context.update({
+        'title': title,
+        'comparison': result,
+        'report_url': '{}?{}'.format(request.path, single.urlencode()),
+    })
+    return instrumentation.render(
+        request, 'reporting/report_comparison.html', context,
+    )
+
+
+def visible_jobs(request):
+    """ The jobs a user can see: all of them for staff, otherwise their own"""
+    job_list = ReportJob.objects.all()
+    if not request.user.is_staff:
+        job_list = job_list.filter(requested_by=request.user)
+    return job_list
@@ -0,0 +1,160 @@
+"""
+Warming of the reporting cache.
+
+The warm_reporting_cache command computes the cached reporting functions for
+the press, for every journal and for the default ranges of the report views:
+the current month, the months of the current year and the current citation
+year. The arguments are built the way the views build them, so that the
+views find the warmed entries under the same keys.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import time
+
+from django.db import connections
+
+from journal import models as jm
+from submission import models as sm
+from utils.logger import get_logger
+
+from plugins.reporting import logic, routers
+
+logger = get_logger(__name__)
+
+
+class Task(object):
+    def __init__(self, label, function, *args):
+        self.label = label
+        self.function = function
+        self.args = args
+
+    def run(self):
+        with routers.reading():
+            return self.function.warm(*self.args)
+
+
+def tasks(today=None):
+    """ Returns the Tasks warming the default ranges of the report views"""
+    today = today or date.today()
+    start_date = logic.get_first_day(today)
+    end_date = logic.get_last_day(today)
+    date_parts = {
+        'start_month_y': str(today.year),
+        'start_month_m': '01',
+        'end_month_y': str(today.year),
+        'end_month_m': today.strftime('%m'),
+    }
+    journals = list(jm.Journal.objects.filter(is_remote=False).order_by('code'))
+    # Under the keys press_report() uses, a single one or one per journal
+    units = logic.press_report_units(
+        jm.Journal.objects.filter(is_remote=False).order_by('code'),
+    )
+
+    warming = [
+        Task(
+            'press report {} of {}'.format(index + 1, len(units)),
+            logic.press_journal_report_data,
+            unit,
+            start_date,
+            end_date,
+        ) for index, unit in enumerate(units)
+    ] + [
+        Task(
+            'usage by month',
+            logic.journal_usage_by_month_data,
+            date_parts,
+        ),
+        Task(
+            'press peer review',
+            logic.peer_review_data,
+            sm.Article.objects.all(),
+            start_date,
+            end_date,
+        ),
+        Task(
+            'press peer review stats',
+            logic.peer_review_stats,
+            start_date,
+            end_date,
+            None,
+        ),
+        Task(
+            'press geographical spread',
+            logic.country_usage_by_month,
+            None,
+            start_date,
+            end_date,
+        ),
+        Task('citations', logic.citation_data, today.year),
+    ]
+    for journal in journals:
+        warming += [
+            Task(
+                '{} articles'.format(journal.code),
+                logic.press_journal_report_data,
+                jm.Journal.objects.filter(id=journal.pk),
+                start_date,
+                end_date,
+            ),
+            Task(
+                '{} peer review'.format(journal.code),
+                logic.peer_review_data,
+                sm.Article.objects.filter(journal=journal),
+                start_date,
+                end_date,
+            ),
+            Task(
+                '{} peer review stats'.format(journal.code),
+                logic.peer_review_stats,
+                start_date,
+                end_date,
+                journal,
+            ),
+            Task(
+                '{} geographical spread'.format(journal.code),
+                logic.country_usage_by_month,
+                journal,
+                start_date,
+                end_date,
+            ),
+        ]
+    return warming
+
+
+def warm(parallelism=1, budget=None, today=None, log=None):
+    """ Runs the warming tasks
+    :param parallelism: int, the number of tasks run at once
+    :param budget: optional seconds after which no further task is started
+    :param today: optional date the default ranges are relative to
+    :param log: optional callable receiving progress messages
+    :return: a tuple of (warmed, skipped) task counts
+    """
+    log = log or (lambda message: None)
+    deadline = time.monotonic() + budget if budget else None
+
+    def run(task):
+        if deadline and time.monotonic() > deadline:
+            return None
+        started = time.perf_counter()
+        try:
+            if not task.run():
+                log('Skipped {}, already being computed'.format(task.label))
+                return False
+        except Exception:
+            logger.exception('Could not warm %s', task.label)
+            return False
+        finally:
+            # Each thread has its own connections
+            connections.close_all()
+        log('Warmed {} in {:.1f}s'.format(
+            task.label, time.perf_counter() - started,
+        ))
+        return True
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        results = list(executor.map(run, tasks(today)))
+
+    out_of_time = results.count(None)
+    if out_of_time:
+        log('Out of time, {} tasks not started'.format(out_of_time))
+    return results.count(True), len(results) - results.count(True)